@@ -121,6 +121,14 @@ The base **stack** definition provides the normal object accessor methods. It sh
     AstroObject.base.BaseStack
     :members:
 
+.. autoclass::
+    AstroObject.base.StackWriter
+    :members:
+
+.. autoclass::
+    AstroObject.base.IOFuture
+    :members:
+
 
 """
 
@@ -131,15 +139,20 @@ import pyfits as pf
 # Standard Python Modules
 import logging
 import os
-import time
+import sys
 import copy
 import collections
+import heapq
+import itertools
+import hashlib
+import tempfile
+import threading
 
 from abc import ABCMeta, abstractmethod
 
 # Submodules from this system
-from .util import getVersion, make_decorator, validate_filename, set_trace_errors
-from .file import DefaultFileClasses, File
+from .util import getVersion, make_decorator, validate_filename, set_trace_errors, monotonic
+from .file import DefaultFileClasses, File, sniff, section_slices, section_header, header_cards, STRUCTURAL_KEYWORDS
 
 __all__ = ["BaseStack", "BaseFrame", "AnalyticMixin", "NoHDUMixin", "HDUHeaderMixin", "NoDataMixin", "Mixin"]
 
@@ -171,6 +184,21 @@ class BaseFrame(Mixin):
     """
     
     __metaclass__ = ABCMeta
+    
+    __save_types__ = None
+    """Types of raw data which :meth:`__save__` might accept, or ``None`` for any type. Checked by :meth:`BaseStack.save` before :meth:`__save__` is called."""
+    
+    __save_ndim__ = None
+    """Array dimensions which :meth:`__save__` might accept, or ``None`` for any number of dimensions."""
+    
+    __save_kinds__ = None
+    """A string of ``numpy`` dtype kind characters (e.g. ``'iuf'``) which :meth:`__save__` might accept, or ``None`` for any kind."""
+    
+    __read_types__ = None
+    """HDU classes which :meth:`__read__` might accept, or ``None`` for any HDU. Checked by :meth:`BaseStack.read` before :meth:`__read__` is called."""
+    
+    __read_naxis__ = None
+    """Values of the ``NAXIS`` keyword which :meth:`__read__` might accept, or ``None`` for any number of axes."""
         
     def __init__(self, data=None, label=None, header=None, metadata=None, **kwargs):
         super(BaseFrame, self).__init__(**kwargs)
@@ -179,7 +207,7 @@ class BaseFrame(Mixin):
         self._label = label # A label for this frame, for selection in parent object
         self.header = pf.core.Header() # Header object for HDU header items
         self.metadata = metadata # An optional metadata dictionary
-        self.time = time.clock() # An object representing the time this object was created
+        self.time = monotonic() # An object representing the time this object was created
         self._valid = None
         
         if self.metadata == None:
@@ -203,6 +231,50 @@ class BaseFrame(Mixin):
         """The name for this frame, an immutable property."""
         return self._label
         
+    def __setattr__(self, name, value):
+        """Replacing a frame's data or header marks the frame as dirty, and clears its cached :attr:`content_hash`."""
+        if name in ('data', 'header'):
+            self.__dict__['_data_digest'] = None
+            self.__dict__['_dirty'] = True
+        super(BaseFrame, self).__setattr__(name, value)
+        
+    def touch(self):
+        """Mark this frame as changed, so that :attr:`content_hash` is recomputed. Frames whose ``__call__`` returns their data for changing in place, such as :class:`~AstroObject.image.ImageFrame`, call this themselves. For other frames, call this after modifying the data in place."""
+        self.__dict__['_data_digest'] = None
+        self.__dict__['_dirty'] = True
+        
+    @property
+    def dirty(self):
+        """Whether this frame has been changed since it was last written by :meth:`BaseStack.write`. Frames are changed by replacing their data or header, or by calling :meth:`touch`. Image frames are also changed when their data is fetched for writing by calling the frame."""
+        return bool(self.__dict__.get('_dirty', True))
+        
+    @property
+    def content_hash(self):
+        """A hex digest of this frame's data and header, or ``None`` if the frame's data can't be hashed. The digest of the data is computed on first use, and cached until the data is replaced or :meth:`touch` is called. The header is hashed every time.
+        
+        .. note:: Modifying the data array in place, through an array which wasn't fetched by calling an :class:`~AstroObject.image.ImageFrame`, does not clear the cache. Call :meth:`touch` after doing so.
+        
+        """
+        digest = self.__dict__.get('_data_digest', None)
+        if digest is None:
+            try:
+                data = self.__data__()
+            except (NotImplementedError, TypeError, AttributeError):
+                return None
+            if isinstance(data, np.ndarray):
+                data = np.ascontiguousarray(np.asarray(data))
+                digest = hashlib.sha1("%s%r" % (data.dtype.str, data.shape))
+                digest.update(data.reshape(-1).view(np.uint8))
+            else:
+                digest = hashlib.sha1(repr(data))
+            digest = digest.hexdigest()
+            self.__dict__['_data_digest'] = digest
+        if isinstance(self.header, pf.Header):
+            header = self.header.tostring()
+        else:
+            header = repr(sorted(dict(self.header or {}).items()))
+        return hashlib.sha1(digest + header).hexdigest()
+        
     def copy(self, label=None):
         """Return a re-labeled copy of this object."""
         if label == None:
@@ -229,6 +301,10 @@ class BaseFrame(Mixin):
         """
         msg = u"Abstract Data Structure %s was called, but cannot return data!" % self
         raise NotImplementedError(msg)
+        
+    def __data__(self, **kwargs):
+        """Return the data within this frame for reading only. Frames which copy their data before it is changed (see :meth:`image.ImageFrame.view`) override this method to skip the copy. The default calls :meth:`__call__`."""
+        return self(**kwargs)
 
     def __repr__(self):
         """Returns String Representation of this frame object. Will display the class name and the label. This method does not need to be overwritten by subclasses.
@@ -257,6 +333,24 @@ class BaseFrame(Mixin):
                 self._valid = True
         return self._valid
     
+    def __export__(self):
+        """Return this frame's data and header, for file types which don't use pyfits HDUs (see :attr:`~AstroObject.file.File.__canarrays__`). This is the format-neutral counterpart to :meth:`hdu`. Frames read from such files are created with :meth:`__save__`, and the header is then applied to the frame.
+        
+        :raises: :exc:`NotImplementedError` when the frame's data is not a ``numpy`` array.
+        :returns: A tuple of the data array and an ordered dictionary of header keywords. The header includes the ``LABEL`` and ``OBJECT`` keywords, but not the FITS structural keywords or commentary cards.
+        
+        """
+        data = self.__data__()
+        if not isinstance(data, np.ndarray):
+            msg = u"%s cannot export data of type %s" % (self, type(data))
+            raise NotImplementedError(msg)
+        header = collections.OrderedDict([('LABEL', str(self.label)), ('OBJECT', str(self.label))])
+        for key, value in self.header.items():
+            key = key.upper()
+            if key not in header and key not in STRUCTURAL_KEYWORDS and not key.startswith('NAXIS'):
+                header[key] = value
+        return data, header
+        
     def hdu(self, primary=False):
         """Retruns a Header-Data Unit PyFits object. The abstract case generates empty HDUs, which contain no data.
         
@@ -323,6 +417,26 @@ class BaseFrame(Mixin):
         msg = u"Abstract Data Structure %s cannot be used for plotting!" % (self)
         raise NotImplementedError(msg)
     
+    @classmethod
+    def __accepts__(cls, data):
+        """Cheaply check whether this class could save *data*, before any frame is constructed. :meth:`BaseStack.save` only calls :meth:`__save__` for classes which accept the data. Subclasses should override this for constraints which are not captured by :attr:`__save_types__`, :attr:`__save_ndim__` and :attr:`__save_kinds__`, such as the shape of the data. It should never raise an error.
+        
+        :param data: Data to be saved, in raw form.
+        :returns: ``True`` if :meth:`__save__` might succeed.
+        
+        """
+        return True
+    
+    @classmethod
+    def __reads__(cls, HDU):
+        """Cheaply check whether this class could read *HDU*, without touching the HDU data. :meth:`BaseStack.read` only calls :meth:`__read__` for classes which accept the HDU. When a class overrides this method it is called for every HDU, so it should only look at the header. It should never raise an error.
+        
+        :param HDU: The HDU to be read.
+        :returns: ``True`` if :meth:`__read__` might succeed.
+        
+        """
+        return True
+    
     @classmethod
     @abstractmethod    
     def __save__(cls, data, label):
@@ -432,6 +546,8 @@ class NoDataMixin(Mixin):
     Due to the validity of empty HDUs, it is possible to have an object which doesn't contain data, but can still produce HDUs.
     """
     
+    __save_types__ = ()
+    
     @semiabstractmethod(u"Cannot call %s.%s() as this frame cannot contain data.")
     def __call__(self):
         """Return data"""
@@ -463,6 +579,8 @@ class NoHDUMixin(Mixin):
     This mixin allows the developer to not implement :meth:`~BaseFrame.__getheader__`, :meth:`~BaseFrame.__setheader__`, :meth:`~BaseFrame.__hdu__`, and :meth:`~BaseFrame.__read__`.
     """
     
+    __read_types__ = ()
+    
     @semiabstractmethod(u"Cannot call %s.%s() as this frame cannot read HDUs.")
     def __getheader__(self):
         pass
@@ -501,6 +619,222 @@ class AnalyticMixin(NoHDUMixin, NoDataMixin):
         pass
     
 
+def _section_hdu(HDU, section):
+    """Return a new HDU holding only *section* of an image HDU's data, read with :attr:`pyfits.ImageHDU.section` where possible so that the rest of the data is never loaded. The offset of the section is recorded in the IRAF ``LTVn`` and ``LTMn_n`` keywords of the new header. HDUs which are not images, or have no data, are returned unchanged.
+    
+    :param HDU: The HDU to take a section of.
+    :param tuple section: A tuple of slices, in ``numpy`` axis order. Slices must have a step of 1.
+    :returns: A new HDU of the same type.
+    
+    """
+    naxis = HDU.header.get('NAXIS', 0)
+    if not isinstance(HDU, (pf.ImageHDU, pf.PrimaryHDU)) or naxis == 0:
+        return HDU
+    shape = tuple(HDU.header.get('NAXIS%d' % axis, 0) for axis in range(naxis, 0, -1))
+    section, starts = section_slices(shape, section)
+    if hasattr(HDU, 'section'):
+        data = HDU.section[section]
+    else:
+        data = HDU.data[section]
+    header = HDU.header.copy()
+    # Section data is already scaled, so the scaling keywords no longer apply.
+    for keyword in ('BSCALE', 'BZERO', 'BLANK'):
+        if keyword in header:
+            del header[keyword]
+    section_header(header, starts)
+    LOG.log(2, u"Read section %r of HDU with shape %r" % (section, shape))
+    return type(HDU)(data=np.asarray(data), header=header)
+    
+
+class LazyFrame(object):
+    """A placeholder for a frame which has been found in a file, but whose data has not been decoded yet. These are created by :meth:`BaseStack.read` with ``lazy=True``, and hold only the frame label, the HDU header and the position of the HDU in its file. The parent stack replaces the placeholder with a real frame the first time it is accessed through :meth:`BaseStack.frame` or :meth:`BaseStack.data`.
+    
+    :param string label: The label for the eventual frame.
+    :param HDUList: The open HDUList containing this frame's HDU.
+    :param int index: The index of the HDU in *HDUList*.
+    :param string filename: The name of the source file, used in messages.
+    :param tuple section: A section of the HDU's data to load, see :meth:`BaseStack.read`.
+    
+    """
+    def __init__(self, label, HDUList, index, filename=None, section=None):
+        super(LazyFrame, self).__init__()
+        self._label = label
+        self.HDUList = HDUList
+        self.index = index
+        self.filename = filename
+        self.section = section
+        self._HDU = None
+        self.header = HDUList[index].header
+        self.time = monotonic()
+        
+    @property
+    def label(self):
+        """The name for this frame, an immutable property."""
+        return self._label
+        
+    @property
+    def HDU(self):
+        """The HDU for this placeholder, cut down to :attr:`section` if one was requested."""
+        if self._HDU is None:
+            self._HDU = self.HDUList[self.index]
+            if self.section is not None:
+                self._HDU = _section_hdu(self._HDU, self.section)
+        return self._HDU
+        
+    def copy(self, label=None):
+        """Return a re-labeled copy of this placeholder."""
+        _new_frame = copy.copy(self)
+        if label != None:
+            _new_frame._label = label
+        return _new_frame
+        
+    def __repr__(self):
+        """Returns String Representation of this placeholder."""
+        return "<\'%s\' labeled \'%s\'>" % (self.__class__.__name__, self.label)
+        
+    def load(self, dataClasses):
+        """Decode the HDU for this placeholder into the first of *dataClasses* which can read it, and return the new frame.
+        
+        :param list dataClasses: The data classes to try, in order.
+        :raises: :exc:`TypeError` when no data class can read the HDU.
+        :returns: :class:`BaseFrame`
+        
+        """
+        HDU = self.HDU
+        for dataClass in dataClasses:
+            try:
+                Object = dataClass.__read__(HDU, self.label)
+                Object.__getheader__(HDU)
+            except NotImplementedError as AE:
+                LOG.log(2, u"Cannot read as %s: %s" % (dataClass, AE))
+            else:
+                # The frame keeps its place in the stack's history.
+                Object.time = self.time
+                LOG.log(2, u"Loaded %s from HDU %d of %s" % (Object, self.index, self.filename))
+                return Object
+        raise TypeError(u"HDU %d of %s cannot be read as %s" % (self.index, self.filename, dataClasses))
+    
+
+class StackWriter(object):
+    """Writes frames from a stack to a file as they are produced, rather than all at once. Create one with :meth:`BaseStack.writer`. The first frame written becomes the primary HDU, and each later frame is appended as an extension. For file types which can append (see :attr:`~AstroObject.file.File.__canappend__`), each frame is on disk as soon as :meth:`write` returns, so long-running jobs don't need to keep every frame in memory.
+    
+    Writers are context managers::
+        
+        with stack.writer("Output.fits", clobber=True) as writer:
+            for i in range(100):
+                stack.save(simulate(i), "Frame%d" % i)
+                writer.write()
+                stack.remove("Frame%d" % i)
+    
+    A writer can also be held open across :class:`~AstroObject.simulator.Simulator` stages, by creating it in an early stage, calling :meth:`write` in each stage which produces frames, and calling :meth:`close` in the last stage. Frames written before a failure remain in the file.
+    
+    :param BaseStack stack: The stack to write frames from.
+    :param FileWriter filewriter: The file writer to send HDUs to.
+    
+    """
+    def __init__(self, stack, filewriter):
+        super(StackWriter, self).__init__()
+        self.stack = stack
+        self.filewriter = filewriter
+        self.frames = []
+        
+    @property
+    def closed(self):
+        """Whether this writer has been closed."""
+        return self.filewriter.closed
+        
+    def write(self, *framenames):
+        """Write the named frames to the file, in order. If no framenames are given, write the selected frame.
+        
+        :param framenames: The frames to write.
+        :returns: list of the framenames written.
+        
+        """
+        framenames = list(framenames)
+        if len(framenames) < 1:
+            framenames = [self.stack.framename]
+        for framename in framenames:
+            primary = self.filewriter.count == 0
+            self.filewriter.append(self.stack[framename].hdu(primary=primary))
+            self.frames.append(framename)
+            LOG.log(2, u"Wrote frame %s to %s" % (framename, self.filewriter.file.name))
+        return framenames
+        
+    def close(self):
+        """Finish writing the file. Closing a writer more than once has no effect."""
+        if not self.closed:
+            self.filewriter.close()
+            LOG.log(5, u"Wrote frames %s to %s" % (self.frames, self.filewriter.file.name))
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+
+_IO_POOL = None
+_IO_LOCK = threading.Lock()
+
+def _io_pool():
+    """Return the thread pool used by :meth:`BaseStack.write_async` and :meth:`BaseStack.read_async`. The pool has a single thread, which is shared by every stack and started on first use, so asynchronous operations run in the order they are submitted and stacks which are never closed don't leave threads behind."""
+    global _IO_POOL
+    with _IO_LOCK:
+        if _IO_POOL is None:
+            from multiprocessing.pool import ThreadPool
+            _IO_POOL = ThreadPool(1)
+    return _IO_POOL
+    
+
+class IOFuture(object):
+    """The pending result of :meth:`BaseStack.write_async` or :meth:`BaseStack.read_async`. The operation runs on the shared I/O thread. Call :meth:`result` to wait for it and get its return value.
+    
+    :param AsyncResult asyncresult: The pool result, which returns ``(value, exc_info)``.
+    :param callback: A function applied to the value in the calling thread, when :meth:`result` is first called.
+    
+    """
+    def __init__(self, asyncresult, callback=None):
+        super(IOFuture, self).__init__()
+        self._async = asyncresult
+        self._callback = callback
+        self._done = False
+        self._value = None
+        self._exc_info = None
+        
+    @property
+    def done(self):
+        """Whether :meth:`result` has collected the result of this operation."""
+        return self._done
+        
+    def ready(self):
+        """Whether the I/O operation has finished."""
+        return self._done or self._async.ready()
+        
+    def wait(self, timeout=None):
+        """Wait for the I/O operation to finish, or for *timeout* seconds."""
+        if not self._done:
+            self._async.wait(timeout)
+        
+    def result(self, timeout=None):
+        """Wait for the I/O operation and return its result. Errors raised by the operation are re-raised here, with their original traceback.
+        
+        :param float timeout: The number of seconds to wait. If the operation hasn't finished by then, :exc:`multiprocessing.TimeoutError` is raised.
+        
+        """
+        if not self._done:
+            value, self._exc_info = self._async.get(timeout)
+            self._done = True
+            if self._exc_info is None and self._callback is not None:
+                try:
+                    value = self._callback(value)
+                except Exception:
+                    self._exc_info = sys.exc_info()
+            self._value = value
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._value
+    
+
 class BaseStack(collections.MutableMapping):
     """This object tracks a number of data frames. The :attr:`Filename` is the default filename to use when reading and writing, and the :attr:`dataClass` argument accepts a list of new data classes to be used with this object. New data classes should conform to the data class standard.
     
@@ -523,12 +857,19 @@ class BaseStack(collections.MutableMapping):
     def __init__(self, filename=None, dataClasses=None, fileClasses=DefaultFileClasses, **kwargs):
         super(BaseStack, self).__init__(**kwargs)
         # Image data variables.
-        self._frames = {}            # Storage for all of the images
+        self._frames = collections.OrderedDict() # Storage for all of the images, oldest save first
+        self._recency = []           # Heap of (-time, -save number, framename), newest frame first
+        self._saves = 0
+        self._pending = []           # Futures for asynchronous reads and writes, oldest first
+        self._written = {}           # Frames and content hashes of files written incrementally, by filename
         self._framename = None       # The active frame name
         self.filename = filename     # The filename to use for file loading and writing
         self.clobber = False
         self.name = False
         self._dataClasses = []
+        self._saveDispatch = {}      # Cache of candidate save classes by (type, ndim, dtype.kind)
+        self._readDispatch = {}      # Cache of candidate read classes by (HDU type, NAXIS)
+        self._dispatchClasses = []
         
         if isinstance(dataClasses, list):
             self._dataClasses += dataClasses
@@ -545,15 +886,22 @@ class BaseStack(collections.MutableMapping):
             raise NotImplementedError(u"Instantiating %s without any valid file classes!" % self)
         
         canstream = []
+        self._fileExtensions = {}    # File class for each extension, the first class listed wins
+        self._fileNames = {}         # File class for each class name
         for fileClass in self._fileClasses:
             if not issubclass(fileClass,File):
                 raise TypeError("File class %s invalid!" % fileClass)
             if fileClass.__canstream__:
                 canstream += [fileClass]
+            for extension in fileClass.__extensions__:
+                self._fileExtensions.setdefault(extension.lower(), fileClass)
+            self._fileNames.setdefault(fileClass.__name__, fileClass)
         if len(canstream) == 1:
             self._can_load_stream = True
+            self._streamClass = canstream[0]
         else:
             self._can_load_stream = False
+            self._streamClass = None
         
     def __repr__(self):
         """String representation of this object.
@@ -684,13 +1032,67 @@ class BaseStack(collections.MutableMapping):
     def add_data_class(self,data_class):
         """Insert a data class into the list of acceptable data classes for this object."""
         self._dataClasses += [data_class]
+        self._saveDispatch = {}
+        self._readDispatch = {}
+    
+    def _check_dispatch(self):
+        """Reset the save and read dispatch caches if the data classes have changed."""
+        if self._dispatchClasses != self._dataClasses:
+            self._saveDispatch = {}
+            self._readDispatch = {}
+            self._dispatchClasses = list(self._dataClasses)
+    
+    def _save_classes(self, data):
+        """Return the data classes which could save *data*, in order. Classes are first filtered by the type, dimensions and dtype kind of the data, using their :attr:`~BaseFrame.__save_types__`, :attr:`~BaseFrame.__save_ndim__` and :attr:`~BaseFrame.__save_kinds__` attributes. That result is cached for each combination of (type, ndim, dtype.kind). The remaining classes are then checked with :meth:`~BaseFrame.__accepts__`."""
+        self._check_dispatch()
+        ndim = getattr(data, 'ndim', None)
+        kind = getattr(getattr(data, 'dtype', None), 'kind', None)
+        key = (type(data), ndim, kind)
+        if key not in self._saveDispatch:
+            candidates = []
+            for dataClass in self._dataClasses:
+                types = getattr(dataClass, '__save_types__', None)
+                ndims = getattr(dataClass, '__save_ndim__', None)
+                kinds = getattr(dataClass, '__save_kinds__', None)
+                if types is not None and not issubclass(type(data), tuple(types)):
+                    continue
+                if ndims is not None and ndim not in ndims:
+                    continue
+                if kinds is not None and (kind is None or kind not in kinds):
+                    continue
+                candidates += [dataClass]
+            LOG.log(2, u"Save candidates for %r: %s" % (key, candidates))
+            self._saveDispatch[key] = candidates
+        return [ dataClass for dataClass in self._saveDispatch[key] if getattr(dataClass, '__accepts__', lambda data: True)(data) ]
+    
+    def _read_classes(self, HDU):
+        """Return the data classes which could read *HDU*, in order. Classes are filtered by their :attr:`~BaseFrame.__read_types__` and :attr:`~BaseFrame.__read_naxis__` attributes, and that result is cached for each combination of HDU type and ``NAXIS``. The remaining classes which override :meth:`~BaseFrame.__reads__` are then asked about this HDU. Only the HDU header is used, so no data is decoded for classes which can't read the HDU."""
+        self._check_dispatch()
+        naxis = HDU.header.get('NAXIS', 0)
+        key = (type(HDU), naxis)
+        if key not in self._readDispatch:
+            candidates = []
+            for dataClass in self._dataClasses:
+                types = getattr(dataClass, '__read_types__', None)
+                naxes = getattr(dataClass, '__read_naxis__', None)
+                if types is not None and not issubclass(type(HDU), tuple(types)):
+                    continue
+                if naxes is not None and naxis not in naxes:
+                    continue
+                reads = getattr(dataClass, '__reads__', None)
+                if getattr(reads, '__func__', None) is BaseFrame.__reads__.__func__:
+                    reads = None
+                candidates += [(dataClass, reads)]
+            LOG.log(2, u"Read candidates for %r: %s" % (key, [ dataClass for dataClass, reads in candidates ]))
+            self._readDispatch[key] = candidates
+        return [ dataClass for dataClass, reads in self._readDispatch[key] if reads is None or reads(HDU) ]
         
     ###############################
     # Basic Object Mode Functions #
     ###############################
     @set_trace_errors(KeyError,TypeError)
     def save(self, data, framename=None, clobber=False, select=True):
-        """Saves the given data to this object. If the data is an instance of one of the acceptable :attr:`dataClasses` then this method will simply save the data. Otherwise, it will attempt to cast the data into one of the acceptable :attr:`dataClasses` using their :meth:`__save__` mehtod.
+        """Saves the given data to this object. If the data is an instance of one of the acceptable :attr:`dataClasses` then this method will simply save the data. Otherwise, it will attempt to cast the data into one of the acceptable :attr:`dataClasses` using their :meth:`__save__` mehtod. Only the classes which could accept the data (see :meth:`~BaseFrame.__accepts__`) are tried, so a save normally constructs a single frame.
         
         :param data: Data, typed like one of the data classes, or data which could initialize one of those classes.
         :param string framename: The label name to use for this data.
@@ -701,10 +1103,22 @@ class BaseStack(collections.MutableMapping):
         :returns string: Label of the saved frame.
         
         """
+        framename, Object = self._cast(data, framename)
+        if framename in self and not (clobber or self.clobber):
+            raise KeyError(u"Cannot Duplicate State Name: \'%s\' Use this.remove(\'%s\') or clobber=True" % (framename, framename))
+        self._store(framename, Object)
+        LOG.log(5, u"Saved frame %s" % Object)
+        # Activate the saved frame as the current frame
+        if select:
+            self._select(framename)
+        return framename
+    
+    def _cast(self, data, framename=None):
+        """Cast *data* into a frame for this stack, without saving it. Returns the framename and the frame."""
         # If we were passed raw data, and the dataClass can accept it, then go for it!
-        if not isinstance(data, tuple(self._dataClasses)):
+        if not isinstance(data, tuple(self._dataClasses) + (LazyFrame,)):
             Object = None
-            for dataClass in self._dataClasses:
+            for dataClass in self._save_classes(data):
                 try:
                     Object = dataClass.__save__(data, framename)
                 except NotImplementedError as AE:
@@ -722,27 +1136,69 @@ class BaseStack(collections.MutableMapping):
             framename = Object.label
         else:
             assert Object.label == framename, u"Object label improperly set by constructor"
-            
-        if framename in self and not (clobber or self.clobber):
-            raise KeyError(u"Cannot Duplicate State Name: \'%s\' Use this.remove(\'%s\') or clobber=True" % (framename, framename))
-        elif framename in self._frames:
+        return framename, Object
+        
+    def _store(self, framename, Object):
+        """Store a frame in this stack, overwriting any existing frame with the same name."""
+        if framename in self._frames:
             LOG.log(2, u"Overwiting the frame %s" % framename)
-        # Save the actual frame
+            del self._frames[framename]
         self._frames[framename] = Object
-        LOG.log(5, u"Saved frame %s" % Object)
-        # Activate the saved frame as the current frame
-        if select:
-            self._select(framename)
-        return framename
+        self._push_recency(framename, Object)
+    
+    @set_trace_errors(KeyError,TypeError)
+    def save_many(self, frames, clobber=False, select=True):
+        """Saves many frames to this object at once. Each item is cast into a frame as in :meth:`save`. All of the frames are checked before any are saved, so if one frame cannot be cast, or would overwrite an existing frame, none are saved. Selection and logging happen once for the whole batch.
+        
+        :param frames: A mapping of framenames to data, or an iterable whose items are either frames (which carry their own labels) or ``(framename, data)`` pairs.
+        :param bool clobber: Whether to overwrite existing frames or raise an error.
+        :param bool select: Select the last saved frame as the default reading frame.
+        :raises: :exc:`TypeError` when some data cannot be cast as any dataClass
+        :raises: :exc:`KeyError` when the data would overwrite an existing frame.
+        :returns list: Labels of the saved frames, in order.
+        
+        ::
+            
+            >>> obj.save_many({"A": np.zeros((10,10)), "B": np.ones((10,10))})
+            ['A', 'B']
+            
+        """
+        if isinstance(frames, collections.Mapping):
+            frames = frames.iteritems()
+        clobber = clobber or self.clobber
+        Objects = collections.OrderedDict()
+        for item in frames:
+            if isinstance(item, tuple) and len(item) == 2 and isinstance(item[0], (str, unicode)):
+                framename, data = item
+            else:
+                framename, data = None, item
+            framename, Object = self._cast(data, framename)
+            if not clobber and (framename in self or framename in Objects):
+                raise KeyError(u"Cannot Duplicate State Name: \'%s\' Use this.remove(\'%s\') or clobber=True" % (framename, framename))
+            Objects.pop(framename, None)
+            Objects[framename] = Object
+        for framename, Object in Objects.iteritems():
+            self._store(framename, Object)
+        LOG.log(5, u"%s: Saved %d frames" % (self, len(Objects)))
+        if select and len(Objects):
+            self._select(next(reversed(Objects)))
+        return Objects.keys()
     
     @set_trace_errors(KeyError)
-    def data(self, framename=None, **kwargs):
+    def data(self, framename=None, copy=True, **kwargs):
         """Returns the raw data for the current frame. This is done through the :meth:`FITSFrame.__call__` method, which should return basic data in as raw a form as possible. The purpose of this call is to allow the user get at the most recent piece of data as easily as possible.
         
         :param string framename: the name of the frame to be retrieved.
+        :param bool copy: Whether to return a copy of the data. With ``copy=False`` a read-only view of the frame's data is returned instead, which avoids copying the whole frame for slices, shapes or statistics. Default ``True``.
         :param kwargs: arguments to be passed to the data call.
         :returns: np.array of called data
         
+        ::
+            
+            >>> obj.data(copy=False).shape
+            (1000, 1000)
+            
+        
         .. Warning::
             I have not finished examining some issues with referencing vs. copying data that comes out of this call. Be aware that manipulating some objects produced here may actually manipulate the version saved in the Object. The current implementation which protects this call relies on the numpy copy command, ``np.copy(frame())``, which might fail when used with data objects that do not return numpy arrays.
         """
@@ -750,7 +1206,12 @@ class BaseStack(collections.MutableMapping):
         if not framename:
             framename = self.framename
         if framename != None and framename in self:
-            return np.copy(self._frames[framename](**kwargs))
+            data = self.frame(framename).__data__(**kwargs)
+            if copy:
+                return np.copy(data)
+            data = np.asanyarray(data).view()
+            data.flags.writeable = False
+            return data
         else:
             self._key_error(framename)
     
@@ -778,7 +1239,11 @@ class BaseStack(collections.MutableMapping):
         if not framename:
             framename = self.framename
         if framename != None and framename in self:
-            return self._frames[framename]
+            Object = self._frames[framename]
+            if isinstance(Object, LazyFrame):
+                Object = Object.load(self._read_classes(Object.HDU))
+                self._frames[framename] = Object
+            return Object
         else:
             self._key_error(framename)
     
@@ -827,22 +1292,43 @@ class BaseStack(collections.MutableMapping):
             msg = u"%s: Frame %r does not exist. Frames: %s" % (self, framename, self.list())
         raise KeyError(msg)
     
+    def _push_recency(self, framename, Object):
+        """Record a newly saved frame in the recency heap used by :meth:`_default_frame`."""
+        self._saves += 1
+        if len(self._recency) > 2 * len(self._frames) + 16:
+            # Drop entries for frames which have since been removed or replaced.
+            self._recency = [ entry for entry in self._recency if self._recent(entry) ]
+            heapq.heapify(self._recency)
+        heapq.heappush(self._recency, (-getattr(Object, 'time', 0.0), -self._saves, framename))
+        
+    def _recent(self, entry):
+        """Whether a recency heap entry still refers to a frame in this stack."""
+        negtime, order, framename = entry
+        return framename in self._frames and getattr(self._frames[framename], 'time', 0.0) == -negtime
+    
     def _default_frame(self, frames=None):
         """Returns the default frame name. If the currently selected frame exists, it's frame name will return. If not, the system will search for the newest frame. If no frames exist, this function will return None.
         
+        Frames are tracked in a heap ordered by their creation time, so without *frames* this lookup takes constant time (amortized over removed frames).
+        
         :param tuple frames: Tuple of frame names from which to select the default. If not given, will use all frames.
         :returns: string framename
         
         """
-        if frames == None:
-            frames = self.list()
-        if self._framename is not None and self._framename in frames:
+        if frames is not None:
+            frames = list(frames)
+            if self._framename is not None and self._framename in frames:
+                return self._framename
+            if [] == frames:
+                return None
+            return max(frames, key=lambda name: getattr(self._frames[name], 'time', 0.0))
+        if self._framename is not None and self._framename in self._frames:
             return self._framename
-        if [] == frames:
-            return None
-        Ages = [ time.clock() - self.frame(name).time for name in frames ]
-        youngest = frames[np.argmin(Ages)]
-        return youngest
+        while self._recency:
+            if self._recent(self._recency[0]):
+                return self._recency[0][2]
+            heapq.heappop(self._recency)
+        return None
     
     def clear(self, delete=False):
         """Clears all frames from this object. Returns an empty list representing the currently known frames.
@@ -855,7 +1341,8 @@ class BaseStack(collections.MutableMapping):
             for frame in self._frames.keys():
                 del self._frames[frame]
             del self._frames
-        self._frames = {}
+        self._frames = collections.OrderedDict()
+        self._recency = []
         self._framename = self._default_frame()
         LOG.log(5, u"%s: Cleared all frames. Remaining: %s" % (self, self.list()))
         return self.list()
@@ -869,15 +1356,15 @@ class BaseStack(collections.MutableMapping):
         :returns: list of frames remaining.
         
         """
-        newStates = {}
         for framename in framenames:
             if framename not in self:
                 self._key_error(framename)
-            newStates[framename] = self[framename]
+        kept = set(framenames)
+        newStates = collections.OrderedDict((framename, frame) for framename, frame in self._frames.iteritems() if framename in kept)
         LOG.log(5, u"%s: Kept frames %s" % (self, list(framenames)))
         if kwargs.get('delete', False):
             for frame in self.keys():
-                if frame not in framenames:
+                if frame not in kept:
                     del self._frames[frame]
             del self._frames
         self._frames = newStates
@@ -910,22 +1397,89 @@ class BaseStack(collections.MutableMapping):
         LOG.log(5, u"%s: Removed frames %s" % (self, removed))
         return self.list()
     
+    @set_trace_errors(KeyError)
+    def remove_many(self, framenames, clobber=False, delete=False):
+        """Removes many frames from the object at once. Unlike :meth:`remove`, every framename is checked before any frame is removed, and the default frame is only recomputed once.
+        
+        :param framenames: An iterable of framenames to be deleted.
+        :param bool clobber: Whether to ignore framenames which do not exist, rather than raising a :exc:`KeyError`.
+        :param bool delete: whether to explicitly delete stages.
+        :returns: list of frames remaining.
+        
+        """
+        framenames = list(framenames)
+        missing = [ framename for framename in framenames if framename not in self._frames ]
+        if missing and not clobber:
+            self._key_error(missing[0])
+        removed = 0
+        for framename in framenames:
+            if framename in self._frames:
+                if delete:
+                    del self._frames[framename]
+                else:
+                    self._frames.pop(framename)
+                removed += 1
+        self._framename = self._default_frame()
+        LOG.log(5, u"%s: Removed %d frames" % (self, removed))
+        return self.list()
+    
+    def map_frames(self, function, framenames=None, workers=None, save=False):
+        """Apply *function* to many frames, optionally in parallel. The function is called with each frame object, as returned by :meth:`frame`, and should not modify this stack.
+        
+        :param function: A function which accepts a single frame.
+        :param framenames: The frames to operate on. If ``None``, use all frames.
+        :param int workers: The number of threads to use. ``None`` or ``1`` runs the function in the calling thread. Threads help when the function spends its time in ``numpy`` or I/O, which release the interpreter lock.
+        :param bool save: Whether to save each result back to this stack under its original framename, replacing the original frame. The results are saved with :meth:`save_many`, and the current selection is not changed.
+        :returns: An ordered dictionary of framenames to results.
+        
+        ::
+            
+            >>> obj.map_frames(lambda frame: frame().mean())
+            OrderedDict([('A', 0.0), ('B', 1.0)])
+            
+        """
+        if framenames is None:
+            framenames = self.list()
+        # Frames are resolved here, as loading a lazy frame modifies the stack.
+        frames = [ self.frame(framename) for framename in framenames ]
+        if workers is not None and workers > 1 and len(frames) > 1:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(min(workers, len(frames)))
+            try:
+                results = pool.map(function, frames)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = map(function, frames)
+        results = collections.OrderedDict(zip(framenames, results))
+        LOG.log(5, u"%s: Mapped %s over %d frames" % (self, getattr(function, '__name__', function), len(results)))
+        if save:
+            self.save_many(results, clobber=True, select=False)
+        return results
+    
     def _setup_file(self, filename = None, filetype = None):
-        """Sets up a file object for reading or writing, given a file-like object and optionally a filetype."""
+        """Sets up a file object for reading or writing, given a file-like object and optionally a filetype. Filenames are matched to a file class by their extension, using an index built when the stack is created. Streams, and files with unknown extensions, are matched by their first few bytes (see :func:`~AstroObject.file.sniff`)."""
         if filename is None:
             filename = self.filename
         
-        if isinstance(filename,file) and filetype is None and not self._can_load_stream:
-            raise TypeError(u"Stack cannot read streams without explicit file type.")
-        elif isinstance(filename,file) and filetype is not None:
-            if isinstance(filetype,tuple(self._fileClasses)):
+        if filetype is not None and isinstance(filename,(file,str,unicode)):
+            if filetype in self._fileClasses or isinstance(filetype,tuple(self._fileClasses)):
                 fileClasses = [filetype]
-            elif filetype in [ fc.__name__ for fc in self._fileClasses ]:
-                fileClasses = [{fc.__name__:fc for fc in self._fileClasses}[filetype]]
+            elif filetype in self._fileNames:
+                fileClasses = [self._fileNames[filetype]]
             else:
                 raise TypeError(u"Cannot understand File Type %r" % filetype)
+        elif isinstance(filename,file):
+            fileClass = sniff(filename, self._fileClasses) or self._streamClass
+            if fileClass is None:
+                raise TypeError(u"Stack cannot read streams without explicit file type.")
+            fileClasses = [fileClass]
         elif isinstance(filename,(str,unicode)):
-            fileClasses = self._fileClasses
+            fileClass = self._fileExtensions.get(os.path.splitext(filename)[1].lower())
+            if fileClass is None:
+                fileClass = sniff(filename, self._fileClasses)
+            fileClasses = [fileClass] if fileClass is not None else []
         else:
             raise TypeError(u"Cannot understand filename %r" % filename)    
         
@@ -943,7 +1497,7 @@ class BaseStack(collections.MutableMapping):
         
     
     @set_trace_errors(TypeError)
-    def write(self, filename=None, frames=None, primaryFrame=None, clobber=False, singleFrame=False, filetype = None):
+    def write(self, filename=None, frames=None, primaryFrame=None, clobber=False, singleFrame=False, filetype = None, workers=None, incremental=False):
         """Writes a FITS file for this object. Generally, the FITS file will include all frames curretnly available in the system. If you specify ``frames`` then only those frames will be used. ``primaryFrame`` should be the frame of the front HDU. When not specified, the latest frame will be used. It uses the :attr:`dataClasses` :meth:`FITSFrame.__hdu__` method to return a valid HDU object for each Frame.
         
         :param string filename: the name of the file for saving.
@@ -951,11 +1505,17 @@ class BaseStack(collections.MutableMapping):
         :param string primaryFrame: The frame to become the front of the FITS file. If none, uses :meth:`_default_frame`
         :param bool clobber: Whether to overwrite the destination file or not.
         :param bool singleFrame: Whether to save only a single frame.
+        :param int workers: The number of threads used to build HDUs. When given, HDUs are built in a pipeline and streamed to the file in order as they are finished (see :meth:`~AstroObject.file.File.stream`), rather than building the whole HDUList first. ``workers=1`` streams without threads. Default ``None`` builds the HDUList in memory. File types which write raw arrays (see :attr:`~AstroObject.file.File.__canarrays__`) skip building HDUs, and are given *workers* instead, e.g. to compress ``.gz`` text files in parallel.
+        :param bool incremental: Whether to skip frames which are unchanged since this stack last wrote the file. For file types which can append (see :attr:`~AstroObject.file.File.__canappend__`), when every frame already in the file has the same :attr:`~BaseFrame.content_hash`, only the new frames are appended. Otherwise the whole file is written. The file must not have been changed by anything else since it was written.
         :returns: Tuple of (PrimaryFrame, Frames, Filename)
         
         ::  
             >>> obj.write(filename="Test.fits")
             ('MainFrame',['OtherFrame-1','OtherFrame-2'],'Test.fits')
+            >>> obj.write(filename="Test.fits", clobber=True, workers=4)
+            ('MainFrame',['OtherFrame-1','OtherFrame-2'],'Test.fits')
+            >>> obj.write(filename="Checkpoint.fits", clobber=True, incremental=True)
+            ('MainFrame',['OtherFrame-1','OtherFrame-2'],'Checkpoint.fits')
         
         """
         if not frames:
@@ -975,98 +1535,446 @@ class BaseStack(collections.MutableMapping):
         
         # Move the stack trace up one notch
         FileObject = self._setup_file(filename=filename,filetype=filetype)
+        framenames = [primaryFrame] + frames
         
-        PrimaryHDU = self[primaryFrame].hdu(primary=True)
-        HDUs = [self[frame].hdu(primary=False) for frame in frames]
-        HDUList = pf.HDUList([PrimaryHDU]+HDUs)
-        FileObject.write(HDUList, clobber=clobber)
-        LOG.log(5, u"Wrote frame %s (primary) and frames %s to FITS file %s" % (primaryFrame, frames, filename))
+        if incremental:
+            hashes = [ self[framename].content_hash for framename in framenames ]
+            if self._write_incremental(FileObject, framenames, hashes):
+                return primaryFrame, frames, filename
+        
+        self._write_frames(FileObject, primaryFrame, frames, clobber, workers)
+        LOG.log(5, u"Wrote frame %s (primary) and frames %s to file %s" % (primaryFrame, frames, filename))
+        for framename in framenames:
+            self[framename]._dirty = False
+        if incremental:
+            self._written[FileObject.name] = (zip(framenames, hashes), self._file_state(FileObject))
         return primaryFrame, frames, filename
+        
+    def _file_state(self, FileObject):
+        """Return the size and modification time of a file, or ``None`` if it is a stream or doesn't exist."""
+        if not isinstance(FileObject.name, (str, unicode)) or not os.path.exists(FileObject.name):
+            return None
+        stat = os.stat(FileObject.name)
+        return (stat.st_size, stat.st_mtime)
+        
+    def _write_incremental(self, FileObject, framenames, hashes):
+        """Append the frames in *framenames* which are not yet in a file previously written by :meth:`write` with ``incremental=True``. Returns ``False``, without writing anything, if the file can't be updated this way and must be written in full."""
+        written, state = self._written.get(FileObject.name, ([], None))
+        if not FileObject.__canappend__ or state is None or state != self._file_state(FileObject):
+            return False
+        current = zip(framenames, hashes)
+        if len(written) > len(current) or current[:len(written)] != written or None in hashes:
+            return False
+        new = framenames[len(written):]
+        if new:
+            with FileObject.writer(append=True) as writer:
+                for framename in new:
+                    writer.append(self[framename].hdu(primary=False))
+        for framename in framenames:
+            self[framename]._dirty = False
+        self._written[FileObject.name] = (current, self._file_state(FileObject))
+        LOG.log(5, u"Skipped %d unchanged frames and appended frames %s to file %s" % (len(written), new, FileObject.name))
+        return True
+        
+    def _write_frames(self, FileObject, primaryFrame, frames, clobber=False, workers=None):
+        """Write the primary frame and other frames to a file. See :meth:`write`."""
+        if FileObject.__canarrays__:
+            arrays = self._export_arrays([primaryFrame] + frames)
+            if arrays is not None:
+                FileObject.write_arrays(arrays, clobber=clobber, workers=workers)
+                return
+        
+        PrimaryHDU = self[primaryFrame].hdu(primary=True)
+        if workers is None:
+            HDUs = [self[frame].hdu(primary=False) for frame in frames]
+            HDUList = pf.HDUList([PrimaryHDU]+HDUs)
+            FileObject.write(HDUList, clobber=clobber)
+        else:
+            # Frames are resolved here, as loading a lazy frame modifies the stack.
+            HDUs = self._build_hdus([self[frame] for frame in frames], workers)
+            FileObject.stream(itertools.chain([PrimaryHDU], HDUs), clobber=clobber)
 
+    def writer(self, filename=None, clobber=False, fsync=False, filetype=None):
+        """Return a :class:`StackWriter` which writes frames to a file as they are produced. The first frame written becomes the primary HDU.
+        
+        :param string filename: the name of the file for saving.
+        :param bool clobber: Whether to overwrite the destination file or not.
+        :param bool fsync: Whether to flush each frame to disk as it is written.
+        :returns: :class:`StackWriter`
+        
+        ::
+            
+            >>> with obj.writer("Test.fits") as writer:
+            ...     writer.write("MainFrame")
+            ...     writer.write("OtherFrame-1", "OtherFrame-2")
+            
+        """
+        FileObject = self._setup_file(filename=filename,filetype=filetype)
+        return StackWriter(self, FileObject.writer(clobber=clobber, fsync=fsync))
+    
+    def _submit(self, function, callback=None, **kwargs):
+        """Run *function* on the I/O thread, returning an :class:`IOFuture`. There is a single I/O thread (see :func:`_io_pool`), so operations run in the order they are submitted."""
+        def run():
+            try:
+                return function(**kwargs), None
+            except Exception:
+                return None, sys.exc_info()
+        future = IOFuture(_io_pool().apply_async(run), callback=callback)
+        self._pending = [ pending for pending in self._pending if not pending.done ] + [future]
+        return future
+        
+    def _snapshot(self, framenames):
+        """Return a new stack of the same class, with its own state, holding copies of the named frames. Arrays and headers held by the frames are copied, so the snapshot is unaffected by later changes to this stack. Use :meth:`_written_snapshot` to copy the results of writing the snapshot back to this stack."""
+        snapshot = self.__class__.__new__(self.__class__)
+        BaseStack.__init__(snapshot, filename=self.filename, dataClasses=list(self._dataClasses), fileClasses=list(self._fileClasses))
+        snapshot.clobber = self.clobber
+        snapshot.name = self.name
+        snapshot._written = dict(self._written)
+        snapshot._token = object()
+        for framename in framenames:
+            if framename in snapshot._frames:
+                continue
+            Source = self[framename]
+            Object = copy.copy(Source)
+            for key, value in vars(Object).items():
+                if isinstance(value, np.ndarray) or isinstance(value, pf.Header):
+                    setattr(Object, key, value.copy())
+            if Source.dirty:
+                # Replaced by True if the frame is changed before the snapshot is written.
+                Source.__dict__['_dirty'] = snapshot._token
+            snapshot._store(framename, Object)
+        return snapshot
+        
+    def _written_snapshot(self, snapshot):
+        """Mark the frames of this stack which were written by *snapshot* as clean, unless they have changed since the snapshot was taken, and keep the record of incremental writes made by the snapshot."""
+        for framename, Object in snapshot._frames.items():
+            Source = self._frames.get(framename, None)
+            if Source is not None and Source.__dict__.get('_dirty', None) is snapshot._token and not Object.dirty:
+                Source.__dict__['_dirty'] = False
+        self._written.update(snapshot._written)
+        
+    def write_async(self, filename=None, frames=None, primaryFrame=None, clobber=False, singleFrame=False, filetype=None, workers=None, incremental=False):
+        """Write frames to a file on the I/O thread, returning an :class:`IOFuture` for the result of :meth:`write`. The frames are copied before this method returns, so the stack can be changed, and frame data modified in place, while the write is in progress. The parameters are the same as for :meth:`write`. With *incremental*, the record of what was written is copied back to this stack when :meth:`IOFuture.result` or :meth:`flush` is called.
+        
+        ::
+            
+            >>> future = obj.write_async("Stage1.fits", clobber=True)
+            >>> obj.save(next_stage(obj.data()), "Stage2")
+            >>> future.result()
+            ('MainFrame', [], 'Stage1.fits')
+            
+        """
+        if not frames:
+            frames = self.list()
+        frames = list(frames)
+        if not primaryFrame:
+            primaryFrame = self._default_frame(frames)
+        snapshot = self._snapshot([primaryFrame] + ([] if singleFrame else frames))
+        def written(result):
+            self._written_snapshot(snapshot)
+            return result
+        return self._submit(snapshot.write, callback=written, filename=filename, frames=frames, primaryFrame=primaryFrame, clobber=clobber, singleFrame=singleFrame, filetype=filetype, workers=workers, incremental=incremental)
+        
+    def read_async(self, filename=None, framename=None, filetype=None, clobber=False, select=True, memmap=None, frames=None, section=None):
+        """Read a file on the I/O thread, returning an :class:`IOFuture`. The file is opened and decoded on the I/O thread, but the frames are only saved to this stack, in the calling thread, when :meth:`IOFuture.result` or :meth:`flush` is called. The result is the list of labels read, as for :meth:`read`, whose parameters are the same.
+        
+        """
+        def save(decoded):
+            Labels, Objects = decoded
+            self.save_many(Objects, clobber=clobber, select=select)
+            LOG.log(5, u"Saved frames %s" % Labels)
+            return Labels
+        return self._submit(self._decode, callback=save, filename=filename, framename=framename, filetype=filetype, memmap=memmap, frames=frames, section=section)
+        
+    def flush(self):
+        """Wait for every pending :meth:`write_async` and :meth:`read_async` to finish, in the order they were started, and save the frames from pending reads to this stack. The first error from a pending operation is raised once every operation has finished."""
+        pending, self._pending = self._pending, []
+        exc_info = None
+        for future in pending:
+            try:
+                future.result()
+            except Exception:
+                if exc_info is None:
+                    exc_info = sys.exc_info()
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        
+    def close(self):
+        """Wait for pending asynchronous reads and writes with :meth:`flush`. The I/O thread is shared by every stack, so it is left running."""
+        self.flush()
+        
+    def _export_arrays(self, framenames):
+        """Export the named frames as ``(label, array, header)`` triples with :meth:`BaseFrame.__export__`, for file types which don't need pyfits HDUs. Returns ``None`` if any frame can't be exported."""
+        arrays = []
+        for framename in framenames:
+            try:
+                data, header = self[framename].__export__()
+            except (NotImplementedError, TypeError) as AE:
+                LOG.log(2, u"Cannot export frame %s directly: %s" % (framename, AE))
+                return None
+            arrays.append((framename, data, header))
+        return arrays
+        
+    def _build_hdus(self, frames, workers=1):
+        """Yield an extension HDU for each frame, in order. With more than one worker, HDUs are built on a thread pool, keeping at most two HDUs per worker in flight so that memory use stays bounded."""
+        if workers <= 1 or len(frames) <= 1:
+            for frame in frames:
+                yield frame.hdu(primary=False)
+            return
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(workers)
+        pending = collections.deque()
+        frames = iter(frames)
+        try:
+            for frame in itertools.islice(frames, 2 * workers):
+                pending.append(pool.apply_async(frame.hdu, (), {'primary':False}))
+            while pending:
+                HDU = pending.popleft().get()
+                for frame in itertools.islice(frames, 1):
+                    pending.append(pool.apply_async(frame.hdu, (), {'primary':False}))
+                yield HDU
+        finally:
+            pool.terminate()
+            pool.join()
+    
     @set_trace_errors(TypeError,IOError)
-    def read(self, filename=None, framename=None, filetype=None, clobber=False, select=True):
+    def read(self, filename=None, framename=None, filetype=None, clobber=False, select=True, memmap=None, lazy=False, frames=None, section=None):
         """This reader takes a FITS file, and trys to render each HDU within that FITS file as a frame in this Object. As such, it might read multiple frames. This method will return a list of Frames that it read. It uses the :attr:`dataClasses` :meth:`FITSFrame.__read__` method to return a valid Frame object for each HDU.
         
         :param string|stream filename: The file or filestream to read from. Should be supported by :mod:`~AstroObject.file`.
         :param string framename: The framename to use (overrides the filename-as-framename, but not the 'LABEL' FITS keyword.)
         :param bool clobber: Whether to overwrite existing frames. Default ``False``.
         :param bool select: Whether to make the imported frames the selected ones. Default ``True``.
+        :param bool memmap: Whether to memory-map the frame data, for file types which support it. Memory-mapped frames are only read from disk as their pixels are accessed, which keeps very large files out of memory. Default ``None`` uses the file type's default.
+        :param bool lazy: Whether to defer decoding HDU data. Lazy reads create a :class:`LazyFrame` for each HDU, holding only its header, and decode the data on the first call to :meth:`frame` or :meth:`data` for that frame. Default ``False``.
+        :param list frames: Labels of the frames to read. HDUs with any other label are skipped without decoding their data. Default ``None`` reads every frame.
+        :param tuple section: A tuple of slices (in ``numpy`` axis order) selecting a region of each image HDU to read. Only that region is read from disk, and its offset is recorded in the IRAF ``LTVn`` header keywords so that it can be written back with :meth:`~AstroObject.image.ImageStack.write_region`. Default ``None`` reads the whole image.
         
         ::
             
             >>> obj = BaseStack()
             >>> obj.read("SomeImage.fits")
             ["SomeImage", "SomeImage-1", "SomeImage-2"]
+            >>> obj.read("SomeImage.fits", lazy=True, frames=["SomeImage-2"], clobber=True)
+            ["SomeImage-2"]
             
+        Each HDU is classified from its header (see :meth:`~BaseFrame.__reads__`), so only data classes which could read it are tried.
+        
+        .. Note:: Lazy frames keep their file open until they are loaded. HDUs which no data class accepts are skipped, but if decoding the data fails when a lazy frame is loaded, a :exc:`TypeError` is raised at that point instead.
         """
+        Labels, Objects = self._decode(filename, framename=framename, filetype=filetype, memmap=memmap, lazy=lazy, frames=frames, section=section)
+        self.save_many(Objects, clobber=clobber, select=select)
+        LOG.log(5, u"Saved frames %s" % Labels)
+        return Labels
+        
+    def _decode(self, filename=None, framename=None, filetype=None, memmap=None, lazy=False, frames=None, section=None):
+        """Open a file and decode its HDUs into frames, without saving them to this stack. Returns a list of labels and a list of frames. See :meth:`read` for the parameters."""
         FileObject = self._setup_file(filename=filename,filetype=filetype)
-        HDUList = FileObject.open()
+        basename = os.path.basename(FileObject.name)
+        if FileObject.__canarrays__ and not lazy and section is None:
+            # Raw array files can skip pyfits entirely, if our frames can save the arrays.
+            arrays = FileObject.open_arrays(memmap=memmap, frames=frames)
+            decoded = self._decode_arrays(arrays, basename, framename=framename, frames=frames)
+            if decoded is not None:
+                return decoded
+            HDUList = pf.HDUList()
+            for label, data, header in arrays:
+                HDUList.append(pf.ImageHDU(data))
+                for key, value in header_cards(header):
+                    HDUList[-1].header.update(key, value)
+                if label is not None:
+                    HDUList[-1].header.update('label', label)
+        elif FileObject.__canselect__ and (frames is not None or section is not None):
+            # The file reads only the requested frames and pixels itself.
+            HDUList = FileObject.open(memmap=memmap, frames=frames, section=section)
+            section = None
+        else:
+            HDUList = FileObject.open(memmap=memmap)
         Read = 0
         Labels = []
-        for HDU in HDUList:    
+        Objects = []
+        Skipped = []
+        for index, HDU in enumerate(HDUList):
             Object = None # Target variable
-            # Iterate through our potential data classes
-            for dataClass in self._dataClasses:
+            skip = False
+            if section is not None and not lazy:
+                HDU = _section_hdu(HDU, section)
+            # Iterate through the data classes which could read this HDU
+            for dataClass in self._read_classes(HDU):
                 try:
-                    label = dataClass.__getlabel__(HDU,os.path.basename(FileObject.name),framename)
-                    if label in Labels:
+                    label = dataClass.__getlabel__(HDU,basename,framename)
+                    if label in Labels + Skipped:
                         # We don't allow repeat loading of labels
-                        label = label + "-%d" % Read
+                        label = label + "-%d" % (Read + len(Skipped))
                         LOG.log(2, u"Incrementing label for multi-frame images: %s" % label)
                     label = unicode(label)
-                    Object = dataClass.__read__(HDU, label)
-                    Object.__getheader__(HDU)
+                    if frames is not None and label not in frames:
+                        LOG.log(2, u"Skipping HDU %d labeled %s, not requested" % (index, label))
+                        Skipped += [label]
+                        skip = True
+                        break
+                    if lazy:
+                        Object = LazyFrame(label, HDUList, index, filename=basename, section=section)
+                    else:
+                        Object = dataClass.__read__(HDU, label)
+                        Object.__getheader__(HDU)
                 except NotImplementedError as AE:
                     LOG.log(2, u"Cannot read as %s: %s" % (dataClass, AE))
                 else:
                     break
-            if Object == None:
+            if skip:
+                continue
+            elif Object == None:
                 LOG.log(8, u"Skipping HDU %s, cannot save as valid type " % HDU)
             else:
                 Read += 1
                 Labels += [label]
-                self.save(Object, clobber=clobber, select=select)
+                Objects += [Object]
         if not Read:
             msg = u"No HDUs were saved from FITS file %s to %s" % (filename, self)
             raise ValueError(msg)
-        
-        LOG.log(5, u"Saved frames %s" % Labels)
-        return Labels
+        return Labels, Objects
     
-    def readAtFile(self, atfile, framename=None, clobber=False, select=True):
+    def _decode_arrays(self, arrays, basename, framename=None, frames=None):
+        """Cast raw ``(label, array, header)`` triples from :meth:`~AstroObject.file.File.open_arrays` into frames, labeling them as :meth:`_decode` would. Returns a list of labels and a list of frames, or ``None`` if any array can't be saved directly by this stack's frame classes."""
+        Labels = []
+        Objects = []
+        Skipped = []
+        for index, (label, data, header) in enumerate(arrays):
+            if isinstance(framename,(str,unicode)):
+                label = framename
+            elif label is None:
+                label = basename
+            if label in Labels + Skipped:
+                label = label + "-%d" % (len(Labels) + len(Skipped))
+            label = unicode(label)
+            if frames is not None and label not in frames:
+                Skipped += [label]
+                continue
+            try:
+                label, Object = self._cast(data, label)
+            except TypeError as TE:
+                LOG.log(2, u"Cannot save array %d from %s directly: %s" % (index, basename, TE))
+                return None
+            for key, value in header_cards(header):
+                Object.header.update(key, value)
+            Labels += [label]
+            Objects += [Object]
+        if not Objects:
+            msg = u"No arrays were saved from file %s to %s" % (basename, self)
+            raise ValueError(msg)
+        return Labels, Objects
+        
+    def readAtFile(self, atfile, framename=None, clobber=False, select=True, memmap=None, workers=None):
         """Read an atfile into this object. The name of the atfile can include a starting "@" which is stripped. The file is then loaded, and each line is assumed to contain a single fully-qualified part-name.
         
         :param string atfile: The @file to read from. Filename can start with ``@`` which will be stripped, automatically.
         :param string framename: The framename to use (overrides the filename-as-framename, but not the 'LABEL' FITS keyword.)
         :param bool clobber: Whether to overwrite existing frames. Default ``False``.
         :param bool select: Whether to make the imported frames the selected ones. Default ``True``.
+        :param bool memmap: Whether to memory-map the frame data. See :meth:`read`.
+        :param int workers: The number of threads used to open and decode files. ``None`` or ``1`` reads each file in turn.
+        
+        With several workers, files are opened and decoded in parallel, but their frames are saved to this stack one file at a time, in the order of the @file. Labels, label collisions and the selected frame are therefore the same as for a sequential read. If a file fails to read, the files before it are saved and the error is raised.
         
         """
         filename = atfile.lstrip("@")
-        labels = []
         with open(filename, 'r') as stream:
-            for line in stream:
-                labels += self.read(line.rstrip(" \n\t"), framename=framename, clobber=clobber, select=select)
+            filenames = [ line.strip(" \n\t") for line in stream ]
+        filenames = [ name for name in filenames if name ]
+        def decode(name):
+            try:
+                return self._decode(name, framename=framename, memmap=memmap), None
+            except Exception:
+                return None, sys.exc_info()
+        if workers is not None and workers > 1 and len(filenames) > 1:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(min(workers, len(filenames)))
+            try:
+                decoded = pool.imap(decode, filenames)
+                labels = self._merge_decoded(decoded, clobber=clobber, select=select)
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            labels = self._merge_decoded((decode(name) for name in filenames), clobber=clobber, select=select)
+        LOG.log(5, u"%s: Read %d frames from %d files in %s" % (self, len(labels), len(filenames), atfile))
+        return labels
+        
+    def _merge_decoded(self, decoded, clobber=False, select=True):
+        """Save the results of :meth:`_decode` to this stack in order, re-raising the first error."""
+        labels = []
+        for result, exc_info in decoded:
+            if exc_info is not None:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            Labels, Objects = result
+            self.save_many(Objects, clobber=clobber, select=select)
+            labels += Labels
         return labels
     
+    def share(self, frames=None, directory=None):
+        """Write frames to a new shared-memory file (see :mod:`~AstroObject.file.shm`), and return the name of its descriptor. The data is written once to a memory-backed directory, and other processes can map it without copying, with :meth:`attach` or with :mod:`numpy` alone. Call :func:`~AstroObject.file.shm.release` with the descriptor to free the memory.
+        
+        :param list frames: The frames to share. If ``None``, share all frames.
+        :param string directory: The directory for the shared files. Default ``None`` uses :func:`~AstroObject.file.shm.shm_directory`.
+        :returns: The filename of the ``.shm`` descriptor.
+        
+        ::
+            
+            >>> descriptor = obj.share(["MainFrame"])
+            >>> other = BaseStack()
+            >>> other.attach(descriptor)
+            ['MainFrame']
+            
+        """
+        from .file.shm import SharedMemoryFile, shm_directory, release
+        if directory is None:
+            directory = shm_directory()
+        fd, filename = tempfile.mkstemp(suffix='.shm', prefix='%s-' % self.__class__.__name__, dir=directory)
+        os.close(fd)
+        try:
+            self.write(filename, frames=list(frames) if frames else None, clobber=True, filetype=SharedMemoryFile)
+        except:
+            release(filename)
+            raise
+        LOG.log(5, u"%s: Shared frames in %s" % (self, filename))
+        return filename
+        
+    def attach(self, filename, framename=None, clobber=False, select=True, frames=None):
+        """Read the frames from a shared-memory descriptor made by :meth:`share`. The frame data is memory-mapped, so it is not copied until it is modified.
+        
+        :param string filename: The ``.shm`` descriptor to read.
+        :param string framename: The framename to use, as for :meth:`read`.
+        :param bool clobber: Whether to overwrite existing frames. Default ``False``.
+        :param bool select: Whether to make the attached frames the selected ones. Default ``True``.
+        :param list frames: Labels of the frames to attach. Default ``None`` attaches every frame.
+        :returns: A list of the labels read.
+        
+        """
+        from .file.shm import SharedMemoryFile
+        return self.read(filename, framename=framename, filetype=SharedMemoryFile, clobber=clobber, select=select, memmap=True, frames=frames)
+    
     @classmethod
-    def fromAtFile(self, filename, framename=None):
+    def fromAtFile(cls, atfile, framename=None, memmap=None, workers=None):
         """Return a new object create from an @file. This method is a factory shortcut for :meth:`readAtFile`.
         
-        :param string filename: The @file to be read into the object. Should be supported by :mod:`~AstroObject.file`.
+        :param string atfile: The @file to be read into the object. Should be supported by :mod:`~AstroObject.file`.
         :param string framename: The framename to use (overrides the filename-as-framename, but not the 'LABEL' FITS keyword.)
+        :param bool memmap: Whether to memory-map the frame data. See :meth:`read`.
+        :param int workers: The number of threads used to read files. See :meth:`readAtFile`.
         
         """
         Object = cls()
-        Object.readAtFile(atfile, framename=framename)
+        Object.readAtFile(atfile, framename=framename, memmap=memmap, workers=workers)
         return Object
       
     @classmethod  
-    def fromFile(cls, filename, framename=None):
+    def fromFile(cls, filename, framename=None, memmap=None):
         """Retrun a new object created from a filename. This method is a shortcut factory for :meth:`read`.
         
         :param string filename: The file to be read into the object. T
         :param string framename: The framename to use (overrides the filename-as-framename, but not the 'LABEL' FITS keyword.)
+        :param bool memmap: Whether to memory-map the frame data. See :meth:`read`.
         
         
         ::
@@ -1078,7 +1986,7 @@ class BaseStack(collections.MutableMapping):
         
         """
         Object = cls()
-        Object.read(filename, framename=framename)
+        Object.read(filename, framename=framename, memmap=memmap)
         return Object
 
 class FrameStack(BaseStack):
@@ -17,6 +17,10 @@ This module provides the support in AstroObject for arbitrary file format input
     File
     :members:
     
+.. autoclass::
+    FileWriter
+    :members:
+    
     
 .. automodule::
     AstroObject.file.fits
@@ -27,6 +31,12 @@ This module provides the support in AstroObject for arbitrary file format input
 .. automodule::
     AstroObject.file.npy
     
+.. automodule::
+    AstroObject.file.hdf5
+    
+.. automodule::
+    AstroObject.file.shm
+    
 .. automodule::
     AstroObject.file.fileset
 
@@ -35,6 +45,81 @@ This module provides the support in AstroObject for arbitrary file format input
 import os
 from abc import ABCMeta, abstractmethod, abstractproperty
 
+STRUCTURAL_KEYWORDS = frozenset(['SIMPLE', 'XTENSION', 'BITPIX', 'NAXIS', 'EXTEND', 'PCOUNT', 'GCOUNT', 'BSCALE', 'BZERO', 'BLANK', 'COMMENT', 'HISTORY', ''])
+"""Header keywords which describe the layout of an HDU, or are commentary. These are not carried between frames and non-FITS file formats. ``NAXISn`` keywords are structural as well."""
+
+COMMENTARY_KEYWORDS = frozenset(['COMMENT', 'HISTORY'])
+"""Header keywords which can appear on many cards. File types which keep them store the values of every card as a list (see :func:`header_cards`)."""
+
+MAGIC_LENGTH = 16
+"""The number of bytes read from the start of a file by :func:`sniff`."""
+
+def sniff(thefile, fileClasses):
+    """Return the first of *fileClasses* whose :attr:`~File.__magic__` bytes match the start of *thefile*, or ``None`` if none match or the file can't be read. Streams are returned to their original position.
+    
+    :param string|stream thefile: The filename, or readable file stream, to check.
+    :param list fileClasses: The :class:`File` classes to check, in order.
+    
+    """
+    try:
+        if isinstance(thefile, (str, unicode)):
+            if not os.path.isfile(thefile):
+                return None
+            with open(thefile, 'rb') as stream:
+                head = stream.read(MAGIC_LENGTH)
+        else:
+            position = thefile.tell()
+            head = thefile.read(MAGIC_LENGTH)
+            thefile.seek(position)
+    except (IOError, OSError, ValueError, AttributeError):
+        return None
+    for fileClass in fileClasses:
+        for magic in fileClass.__magic__:
+            if head.startswith(magic):
+                return fileClass
+    return None
+    
+def section_slices(shape, section):
+    """Expand *section* into a tuple with one contiguous slice for each axis of an array with *shape*. Returns the slices and the start of each slice.
+    
+    :param tuple shape: The shape of the array, in ``numpy`` axis order.
+    :param tuple section: A tuple of slices. Missing trailing axes are read in full.
+    :raises: :exc:`TypeError` if the section contains something other than slices, :exc:`ValueError` if a slice has a step other than 1.
+    
+    """
+    if not isinstance(section, tuple):
+        section = (section,)
+    section = section + (slice(None),) * (len(shape) - len(section))
+    slices, starts = [], []
+    for axis, (item, length) in enumerate(zip(section, shape)):
+        if not isinstance(item, slice):
+            raise TypeError(u"Sections must be a tuple of slices, got %r" % (section,))
+        start, stop, step = item.indices(length)
+        if step != 1:
+            raise ValueError(u"Sections must be contiguous, got step %d on axis %d" % (step, axis))
+        slices.append(slice(start, max(start, stop)))
+        starts.append(start)
+    return tuple(slices), starts
+    
+def section_header(header, starts):
+    """Record the offset of a section in *header*, using the IRAF ``LTVn`` and ``LTMn_n`` keywords. *starts* gives the start of the section along each axis, in ``numpy`` axis order."""
+    naxis = len(starts)
+    for axis, start in enumerate(starts):
+        fitsaxis = naxis - axis
+        header.update('LTV%d' % fitsaxis, header.get('LTV%d' % fitsaxis, 0.0) - start)
+        header.update('LTM%d_%d' % (fitsaxis, fitsaxis), header.get('LTM%d_%d' % (fitsaxis, fitsaxis), 1.0))
+    return header
+    
+def header_cards(header):
+    """Return the ``(keyword, value)`` cards of a header read with :meth:`File.open_arrays`, in order. Keywords whose value is a list, such as ``COMMENT`` and ``HISTORY`` (see :data:`COMMENTARY_KEYWORDS`), give one card for each item."""
+    cards = []
+    for key, value in header.items():
+        if isinstance(value, list):
+            cards += [ (key, item) for item in value ]
+        else:
+            cards += [(key, value)]
+    return cards
+
 class File(object):
     """A generic file object meant to facilitate writing and reading HDULists from a particular type of file. This abstract base class should be used as a template for other file writing objects."""
     
@@ -43,9 +128,21 @@ class File(object):
     __extensions__ = []
     """Extensions which can be used for this file type."""
     
+    __magic__ = ()
+    """Byte strings which can start a file of this type, used by :func:`sniff` to recognize files and streams whose names don't have one of the :attr:`__extensions__`."""
+    
     __canstream__ = False
     """Whether this file type can accept streams."""
     
+    __canappend__ = False
+    """Whether this file type can write HDUs one at a time, appending each to the end of the file. File types which can append should return a :class:`FileWriter` subclass from :meth:`writer`."""
+    
+    __canselect__ = False
+    """Whether this file type can read part of a file. File types which can select should accept ``frames`` (a list of labels) and ``section`` (a tuple of slices) keywords in :meth:`open`, and return only those HDUs and pixels."""
+    
+    __canarrays__ = False
+    """Whether this file type holds only raw arrays and simple headers, and provides :meth:`open_arrays` and :meth:`write_arrays`. Stacks read and write such files without building a pyfits HDU for each frame, when their frames support :meth:`~AstroObject.base.BaseFrame.__export__` and can be saved from raw arrays."""
+    
     @abstractmethod
     def write(self, stack, clobber=False):
         """Write this file using the HDUList provided.
@@ -56,11 +153,57 @@ class File(object):
         """
         raise NotImplementedError
         
+    def stream(self, hdus, clobber=False):
+        """Write this file from an iterable of HDUs, primary HDU first. File types which can write one HDU at a time should override this method so that the HDUs do not all need to be held in memory. By default, the HDUs are collected into an HDUList and passed to :meth:`write`.
+        
+        :param hdus: An iterable of pyfits HDUs, starting with the primary HDU.
+        :param bool clobber: Whether to overwrite the file on output
+        
+        """
+        with self.writer(clobber=clobber) as writer:
+            for HDU in hdus:
+                writer.append(HDU)
+        
+    def writer(self, clobber=False, fsync=False, append=False):
+        """Return a :class:`FileWriter` which writes this file one HDU at a time.
+        
+        :param bool clobber: Whether to overwrite the file on output
+        :param bool fsync: Whether to flush each HDU to disk as it is written, for file types which can append.
+        :param bool append: Whether to add HDUs to the end of the existing file, rather than starting a new file. Only file types which can append (see :attr:`__canappend__`) support this.
+        
+        """
+        if append:
+            raise NotImplementedError(u"File type %s can't append to existing files." % self.__class__.__name__)
+        return FileWriter(self, clobber=clobber, fsync=fsync)
+        
     @abstractmethod
-    def open(self):
-        """Open this file and return an HDUList."""
+    def open(self, memmap=None):
+        """Open this file and return an HDUList.
+        
+        :param bool memmap: Whether to memory-map the file's data, where the format supports it. ``None`` uses the format's default.
+        
+        """
         raise NotImplementedError
     
+    def open_arrays(self, memmap=None, frames=None):
+        """Open this file and return a list of ``(label, array, header)`` triples, without creating pyfits HDUs. *label* is ``None`` for arrays which were not written with a label, and *header* is a dictionary of header keywords. Keywords which appear on many cards have a list of values, so use :func:`header_cards` to apply the header. Only file types with :attr:`__canarrays__` provide this method.
+        
+        :param bool memmap: Whether to memory-map the arrays, where the format supports it.
+        :param list frames: Labels of the arrays to read. Unlabeled arrays are always read. ``None`` reads every array.
+        
+        """
+        raise NotImplementedError(u"File type %s can't read raw arrays." % self.__class__.__name__)
+        
+    def write_arrays(self, arrays, clobber=False, workers=None):
+        """Write a list of ``(label, array, header)`` triples to this file, without creating pyfits HDUs. The first triple takes the place of the primary HDU. Only file types with :attr:`__canarrays__` provide this method.
+        
+        :param list arrays: The ``(label, array, header)`` triples to write, where *header* is a dictionary of header keywords.
+        :param bool clobber: Whether to overwrite the file on output
+        :param int workers: The number of threads the file type may use while writing. File types which can't use threads ignore it.
+        
+        """
+        raise NotImplementedError(u"File type %s can't write raw arrays." % self.__class__.__name__)
+    
     def validate(self, thefile):
         """Raise an :exc:`NotImplementedError` if the filename is not acceptalbe to this file type. Else return true.
         
@@ -69,18 +212,20 @@ class File(object):
         :returns: True for valid extensions.
         :var __extensions__: The internal array of acceptable extensions.
         
+        Files and streams without a valid extension are still accepted if their first bytes match this file type's :attr:`__magic__`.
+        
         """
         if isinstance(thefile,file):
             if hasattr(thefile,'name'):
                 self.name = thefile.name
                 basename, extension = os.path.splitext(self.name)
-                if extension.lower() not in self.__extensions__:
+                if extension.lower() not in self.__extensions__ and not sniff(thefile, [type(self)]):
                     msg = "File stream name '%s' does not have a valid extension. (Use %r)" % (self.name, self.__extensions__)
                     raise NotImplementedError(msg)                
             else:
                 self.name = "<UNDEFINED STREAM>"
             if thefile.closed:
-                msg = "Cannot use Stream %s as it is closed." % name
+                msg = "Cannot use Stream %s as it is closed." % self.name
                 raise NotImplementedError(msg)
             if not self.__canstream__:
                 msg = "File type %s cannot use file streams." % self.__class__.__name__
@@ -88,7 +233,7 @@ class File(object):
             return True
         elif isinstance(thefile,(str,unicode)):
             filename, extension = os.path.splitext(thefile)
-            if extension.lower() not in self.__extensions__:
+            if extension.lower() not in self.__extensions__ and not (self.__magic__ and sniff(thefile, [type(self)])):
                 msg = "Filename '%s' does not have a valid extension. (Use %r)" % (thefile, self.__extensions__)
                 raise NotImplementedError(msg)
             self.name = thefile
@@ -97,10 +242,62 @@ class File(object):
             raise TypeError("Unkown File Type %s" % type(thefile))
         
         
+class FileWriter(object):
+    """Writes a file one HDU at a time, starting with the primary HDU. This base writer keeps the HDUs in memory and writes them all with :meth:`File.write` when it is closed. File types which can append (see :attr:`File.__canappend__`) provide writers which put each HDU on disk as it is appended.
+    
+    Writers are context managers, and are closed when the context exits::
+        
+        with FITSFile("Output.fits").writer(clobber=True) as writer:
+            writer.append(PrimaryHDU)
+            writer.append(OtherHDU)
+        
+    :param File fileobject: The file to write.
+    :param bool clobber: Whether to overwrite the file on output
+    :param bool fsync: Whether to flush each HDU to disk as it is written, where supported.
+    :param bool append: Whether to add HDUs to the end of an existing file, where supported.
+    
+    """
+    def __init__(self, fileobject, clobber=False, fsync=False, append=False):
+        super(FileWriter, self).__init__()
+        self.file = fileobject
+        self.clobber = clobber
+        self.fsync = fsync
+        self.append_to = append
+        self.count = 0
+        self.closed = False
+        self._hdus = []
+        
+    def append(self, HDU):
+        """Add an HDU to the end of this file. The first HDU appended should be a primary HDU."""
+        if self.closed:
+            raise IOError("Cannot append to closed writer for %s" % self.file.name)
+        self._hdus.append(HDU)
+        self.count += 1
+        
+    def close(self):
+        """Finish writing this file. Closing a writer more than once has no effect."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._hdus:
+            import pyfits as pf
+            self.file.write(pf.HDUList(self._hdus), clobber=self.clobber)
+        self._hdus = []
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        
+        
+        
         
 from .fits import FITSFile
 from .npy import NumpyFile, NumpyZipFile
 from .plaintext import NumpyTextFile, AstroObjectTextFile
+from .hdf5 import HDF5File
+from .shm import SharedMemoryFile
 
-DefaultFileClasses = [ FITSFile, NumpyFile, NumpyZipFile, NumpyTextFile, AstroObjectTextFile ]
+DefaultFileClasses = [ FITSFile, NumpyFile, NumpyZipFile, NumpyTextFile, AstroObjectTextFile, HDF5File, SharedMemoryFile ]
         
\ No newline at end of file
@@ -32,6 +32,20 @@ A fileset which uses temporary directories for the fileset. Can use the system t
     :inherited-members:
 
 
+:class:`FileSetDatabase` – Persistance Databases
+*************************************************
+Persistant filesets record the modification time of each file in a database in the fileset directory. The database type is chosen from the extension of the database filename, or with the ``database`` keyword. :class:`SQLiteDatabase` is the default. It writes only the files which changed since the last write, in a single transaction. :class:`YAMLDatabase` rewrites a YAML file on every change, and is kept for compatibility with filesets persisted by earlier versions.
+
+.. autoclass::
+    AstroObject.file.fileset.FileSetDatabase
+    :members:
+
+.. autoclass::
+    AstroObject.file.fileset.SQLiteDatabase
+
+.. autoclass::
+    AstroObject.file.fileset.YAMLDatabase
+
 :class:`HashedFileSet` – Hahsed File Set
 ****************************************
 A fileset that uses an SHA1 hash to set the name of the directory for use. Files are saved in ``base/hash`` directories. The hash can be updated, which will move the entire fileset to a new ``base/hash`` directory location.
@@ -52,11 +66,133 @@ import tempfile
 import hashlib
 import shutil
 import collections
+import contextlib
+import sqlite3
 
 from ..config import Configuration
 
 __log__ = logging.getLogger(__name__)
 
+class FileSetDatabase(object):
+    """A persistance database for a :class:`FileSet`, which records the modification time of each registered file, the creation date of the fileset, and whether it is open. This base class defines the interface for database types.
+    
+    :param string filename: The database filename.
+    
+    """
+    
+    __extensions__ = []
+    """Database filename extensions which select this database type."""
+    
+    def __init__(self, filename):
+        super(FileSetDatabase, self).__init__()
+        self.filename = filename
+        
+    @property
+    def exists(self):
+        """Whether the database file exists."""
+        return os.path.exists(self.filename)
+        
+    def load(self):
+        """Load the database. Returns a tuple of a dictionary of modification times by filename, the creation date string (or ``None``), and whether the fileset was open."""
+        raise NotImplementedError
+        
+    def save(self, files, changes, date, isopen):
+        """Write the fileset to the database.
+        
+        :param files: The modification times of all registered files, by filename.
+        :param changes: The files which changed since the last write, with their new modification times, or ``None`` for files which were removed. If ``changes`` is ``None``, the whole database is rewritten.
+        :param string date: The creation date of the fileset.
+        :param bool isopen: Whether the fileset is open.
+        
+        """
+        raise NotImplementedError
+        
+    def close(self):
+        """Release any resources held by this database. The database can still be used afterwards."""
+        pass
+        
+    def remove(self):
+        """Close and delete the database file."""
+        self.close()
+        if self.exists:
+            os.remove(self.filename)
+    
+class YAMLDatabase(FileSetDatabase):
+    """A database kept as a YAML file. Every write rewrites the whole file."""
+    
+    __extensions__ = [ '.yml', '.yaml' ]
+    
+    date_key = "==DATE"
+    open_key = "==OPEN"
+    
+    def load(self):
+        """Load the database. See :meth:`FileSetDatabase.load`."""
+        files = Configuration({})
+        files.load(self.filename)
+        date = files.pop(self.date_key,None)
+        isopen = files.pop(self.open_key,False)
+        return dict(files.items()), date, isopen
+        
+    def save(self, files, changes, date, isopen):
+        """Write the whole database. See :meth:`FileSetDatabase.save`."""
+        store = Configuration(dict(files.items()))
+        store.name = "FileSet-db"
+        store[self.date_key] = date
+        store[self.open_key] = isopen
+        store.save(self.filename)
+    
+class SQLiteDatabase(FileSetDatabase):
+    """A database kept as an :mod:`sqlite3` table. Writes only change the rows for files which changed, and each write is a single transaction, so the database is never left partly written."""
+    
+    __extensions__ = [ '.sqlite', '.db' ]
+    
+    def __init__(self, filename):
+        super(SQLiteDatabase, self).__init__(filename)
+        self._connection = None
+        
+    @property
+    def connection(self):
+        """The open :mod:`sqlite3` connection, which creates the database and its tables if necessary."""
+        if self._connection is None:
+            # Filesets serialize their own access, so the connection may be used from any thread.
+            self._connection = sqlite3.connect(self.filename,check_same_thread=False)
+            with self._connection:
+                self._connection.execute("CREATE TABLE IF NOT EXISTS files (filekey TEXT PRIMARY KEY, mtime REAL NOT NULL)")
+                self._connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        return self._connection
+        
+    def load(self):
+        """Load the database. See :meth:`FileSetDatabase.load`."""
+        files = dict(self.connection.execute("SELECT filekey, mtime FROM files"))
+        meta = dict(self.connection.execute("SELECT key, value FROM meta"))
+        return files, meta.get('date',None), meta.get('open','0') == '1'
+        
+    def save(self, files, changes, date, isopen):
+        """Write the changed files in a single transaction. See :meth:`FileSetDatabase.save`."""
+        with self.connection as connection:
+            if changes is None:
+                connection.execute("DELETE FROM files")
+                connection.executemany("INSERT INTO files VALUES (?, ?)", files.items())
+            else:
+                connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?)", [ (key, mtime) for key, mtime in changes.items() if mtime is not None ])
+                connection.executemany("DELETE FROM files WHERE filekey = ?", [ (key,) for key, mtime in changes.items() if mtime is None ])
+            connection.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [ ('date', date), ('open', '1' if isopen else '0') ])
+        
+    def close(self):
+        """Close the :mod:`sqlite3` connection."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+    
+DATABASES = [ SQLiteDatabase, YAMLDatabase ]
+"""Database types, in order of preference. The first type whose :attr:`~FileSetDatabase.__extensions__` match the database filename is used."""
+
+DEFAULT_DBFILEBASE = ".AOFSdb.sqlite"
+"""The default database filename for filesets."""
+
+LEGACY_DBFILEBASE = ".AOFSdb.yml"
+"""The database filename used by earlier versions. Filesets using the default database load this file if they have no database of their own."""
+
 class FileSet(collections.MutableSet):
     """A set of files to be monitored. The set of files must all be contained in a single parent directory. The file set will monitor the registered files for changes and modifications, and will notify (using :exc:`IOError`) the program if the fileset attempts to close with remianing modifications.
     
@@ -66,11 +202,12 @@ class FileSet(collections.MutableSet):
     :param bool persist: Whether this fileset should try to persist across instantiations.
     :param bool autodiscover: Whether this fileset should check the directory for new files automatically, and register those files.
     :keyword string timeformat: The format string for the :mod:`datetime` module to use when writing/reading from the database. There is no reason to need to change this default, but it is supported just in case.
-    :keyword string dbfilebase: The base name of the persistance database. By default it is ``.AOFSdb.yml``. If this filename *could* conflict with other files you might add to the file-set, you might want to change it to a non-conflicting filename. Files should have the ``.yml,.yaml`` extension.
+    :keyword string dbfilebase: The base name of the persistance database. By default it is ``.AOFSdb.sqlite``. If this filename *could* conflict with other files you might add to the file-set, you might want to change it to a non-conflicting filename. The extension selects the database type (see :data:`DATABASES`), ``.sqlite,.db`` for :class:`SQLiteDatabase` or ``.yml,.yaml`` for :class:`YAMLDatabase`. Other extensions use :class:`YAMLDatabase`.
+    :keyword database: The :class:`FileSetDatabase` class to use, overriding the extension of ``dbfilebase``.
     
     **Persistance**:
     
-    Persistant filesets will remember thier state using a database file between application instances. If the fileset is supposed to persist, it will write a database file to the fileset directory. The database file records the currently known modification times for each registered file. The database file will be automatically loaded when the fielset is created, or the directory is changed (with :meth:`move`). The database will also be automatically written whenever changes occur. 
+    Persistant filesets will remember thier state using a database file between application instances. If the fileset is supposed to persist, it will write a database file to the fileset directory. The database file records the currently known modification times for each registered file. The database file will be automatically loaded when the fielset is created, or the directory is changed (with :meth:`move`). The database will also be automatically written whenever changes occur. To make many changes with a single write, use :meth:`batch`.
     
     If the load on the program is too heavy due to constant file-set access and modification, you can toggle the persistance mode using the :attr:`persist` attribute. The database is only ever loaded when the fileset is initialized. 
     
@@ -83,15 +220,18 @@ class FileSet(collections.MutableSet):
     **Closed vs. Open Filesets**:
     Closed filesets are read-only filesets. If the fileset is closed, it will have a directory, but files cannot be registered or unregistered. Calling the :meth:`close` will normally close **and** delete the fileset, unless ``clean=False`` is passed to the close method. 
     """ 
-    def __init__(self, base, name="", isopen=True, persist=False, autodiscover=True, timeformat="%Y-%m-%dT%H:%M:%S", dbfilebase=".AOFSdb.yml"):
+    def __init__(self, base, name="", isopen=True, persist=False, autodiscover=True, timeformat="%Y-%m-%dT%H:%M:%S", dbfilebase=DEFAULT_DBFILEBASE, database=None):
         super(FileSet, self).__init__()
         # Start both mode variables as false for initialization process.
-        self._date_key = "==DATE"
-        self._open_key = "==OPEN"
         self._persistance_value = persist
         self._autodiscover_value = autodiscover
         self._timeformat = timeformat
         self._dbfilebase = dbfilebase
+        self._database = database or self._database_class(dbfilebase)
+        self._db = None
+        self._changes = None
+        self._batch_depth = 0
+        self._batch_open = None
         self._createtime = datetime.now()
         self._files = Configuration({})
         self._files.name = "%s-db" % self.__class__.__name__
@@ -113,6 +253,15 @@ class FileSet(collections.MutableSet):
         self._persistance_value = value
         self._persist()
     
+    @staticmethod
+    def _database_class(dbfilebase):
+        """Return the :class:`FileSetDatabase` type for a database filename, from its extension. Filenames with any other extension use :class:`YAMLDatabase`, the format of earlier versions."""
+        extension = os.path.splitext(dbfilebase)[1].lower()
+        for database in DATABASES:
+            if extension in database.__extensions__:
+                return database
+        return YAMLDatabase
+    
     @property
     def autodiscover(self): #: = True
         """Enable or disable autodiscovery of new files in this fileset. Must be (bool)."""
@@ -159,31 +308,90 @@ class FileSet(collections.MutableSet):
         if self.open:
             self.close(check=False)
     
+    @contextlib.contextmanager
+    def batch(self):
+        """Make many changes to this fileset with a single write to the persistance database. Changes made inside the context are written in one transaction when the outermost batch exits, even if it exits with an error, so the database always matches the fileset. Batches can be nested.
+        
+        ::
+            
+            with fileset.batch():
+                for filename in filenames:
+                    fileset.register(filename)
+            
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            exc_info = sys.exc_info()
+            try:
+                self._end_batch()
+            except Exception as e:
+                # The error from inside the batch is more useful than one from writing the database.
+                self.log.warning("Could not write the database after an error in a batch: %s" % e)
+            raise exc_info[0], exc_info[1], exc_info[2]
+        else:
+            self._end_batch()
+        
+    def _end_batch(self):
+        """Leave a :meth:`batch`, writing the database if this was the outermost batch."""
+        self._batch_depth -= 1
+        if self._batch_depth == 0 and self._batch_open is not None:
+            isopen, self._batch_open = self._batch_open, None
+            self._persist(isopen=isopen)
+    
+    def _set_mtime(self,filekey,mtime):
+        """Record the modification time of a registered file, noting the change for the next write to the database."""
+        self._files[filekey] = mtime
+        if self._changes is not None:
+            self._changes[filekey] = mtime
+        
+    def _forget(self,filekey):
+        """Remove a file from the registry, noting the change for the next write to the database."""
+        del self._files[filekey]
+        if self._changes is not None:
+            self._changes[filekey] = None
+        
     def _persist(self,isopen=True):
-        """Write the persistance database to the database file in the fileset directory."""
+        """Write the persistance database to the database file in the fileset directory. Inside a :meth:`batch`, the write is deferred until the batch exits."""
         if not self.persist:
+            # Changes aren't tracked without persistance, so the next write must be complete.
+            self._changes = None
+            return
+        if self._batch_depth:
+            self._batch_open = isopen
             return
-        self._files[self._date_key] = self._createtime.strftime(self._timeformat)
-        self._files[self._open_key] = isopen
-        self._files.save(self._dbfilename)
-        del self._files[self._date_key]
-        del self._files[self._open_key]
+        self._db.save(self._files, self._changes, self._createtime.strftime(self._timeformat), isopen)
+        self._changes = {}
         
     def _reload(self):
         """Reload the persistance databse to this object. 
         
         This method should only be called when the fileset is first instantiated. This is because the loading overwrites existing data about modification times, and will not preserve any calls to :meth:`update` made after object initialization. The reload function will preserve the registration of new files into the fileset.
         
+        Filesets using the default database load a database left by an earlier version (see :data:`LEGACY_DBFILEBASE`), if they don't have one of their own.
+        
         :returns bool: Whether the persistance database was reloaded successfully.
         """
-        if os.path.exists(self._dbfilename) and self.persist:
-            self._files.load(self._dbfilename)
-            self._createtime = datetime.strptime(self._files.pop(self._date_key,self._createtime.strftime(self._timeformat)),self._timeformat)
-            if self._files.pop(self._open_key,False):
-                raise IOError("Fileset is already open, not opening co-incident file sets: %s" % self._directory)
-            os.remove(self._dbfilename)
-            return True
-        return False
+        if not self.persist:
+            return False
+        database = self._db
+        legacy = os.path.join(self.directory,LEGACY_DBFILEBASE)
+        if not database.exists and self._dbfilebase == DEFAULT_DBFILEBASE and os.path.exists(legacy):
+            database = YAMLDatabase(legacy)
+        if not database.exists:
+            return False
+        files, date, isopen = database.load()
+        for filekey, mtime in files.items():
+            self._files[filekey] = mtime
+        if date is not None:
+            self._createtime = datetime.strptime(date,self._timeformat)
+        if isopen:
+            database.close()
+            raise IOError("Fileset is already open, not opening co-incident file sets: %s" % self._directory)
+        database.remove()
+        self._changes = None
+        return True
         
     def _get_cpath(self,filename):
         """Return the cache object-like filepath for the requested filepath. This helps ensure that calls to register, etc. will not fail."""
@@ -207,8 +415,18 @@ class FileSet(collections.MutableSet):
             base = os.path.join(base,"")    
         self._directory = os.path.normpath(base)
         self._dbfilename = os.path.join(self.directory,self._dbfilebase)
+        if self._db is not None:
+            self._db.close()
+        self._db = self._database(self._dbfilename)
+        # A new directory needs a complete database.
+        self._changes = None
         self._reload()
         
+    def _is_database(self,filepath):
+        """Whether a path is the persistance database, or one of the temporary files a database keeps beside it."""
+        filepath = self._get_cpath(filepath)
+        return filepath == self._dbfilename or filepath.startswith(self._dbfilename + "-")
+        
     def _autodiscover_files(self):
         """Automatically discover files that are in this fileset using :func:`os.walk`. Automatically discovered files are registered with the fileset.
         
@@ -219,7 +437,7 @@ class FileSet(collections.MutableSet):
         for root, dirs, files in os.walk(self.directory):
             for filepath in files:
                 fullpath = os.path.join(root,filepath)
-                if fullpath not in self and self._get_cpath(fullpath) != self._dbfilename:
+                if fullpath not in self and not self._is_database(fullpath):
                     self.add(fullpath)
         self._autodiscovery_in_progress = False
     
@@ -249,8 +467,6 @@ class FileSet(collections.MutableSet):
             if os.path.exists(filepath) and not filepath == self._dbfilename:
                 if os.stat(filepath).st_mtime > self._files[filekey]:
                     modified += [filekey]
-        if len(modified) > 0:
-            self._persist()
         return modified
         
     @property
@@ -262,7 +478,8 @@ class FileSet(collections.MutableSet):
             filepath = self._get_cpath(filekey)
             if not os.path.exists(filepath):
                 deleted += [filekey]
-                self._files[filekey] = 0.0
+                if self._files[filekey] != 0.0:
+                    self._set_mtime(filekey,0.0)
         if len(deleted) > 0:
             self._persist()
         return deleted
@@ -308,13 +525,13 @@ class FileSet(collections.MutableSet):
             filekey = self._get_bpath(filename)
             if filekey in self._files:
                 raise KeyError("Filepath %s already exists in fileset." % filename)
-            if fullpath == self._dbfilename:
+            if self._is_database(fullpath):
                 raise KeyError("Cannot add DB to database.")
             if os.path.exists(fullpath):
-                self._files[filekey] = os.stat(fullpath).st_mtime
+                self._set_mtime(filekey,os.stat(fullpath).st_mtime)
                 self.log.debug("Registered %s as existing file" % filekey)
             else:
-                self._files[filekey] = 0.0
+                self._set_mtime(filekey,0.0)
                 self.log.debug("Registered %s as non-existant file" % filekey)
         self._persist()
         return self._files.keys()
@@ -360,7 +577,7 @@ class FileSet(collections.MutableSet):
             filekey = self._get_bpath(filepath)
             if filepath in self._open_files:
                 self.close_fd(filepath)
-            del self._files[filekey]
+            self._forget(filekey)
             if os.path.exists(filepath):
                 os.remove(filepath)
         self._persist()
@@ -380,9 +597,9 @@ class FileSet(collections.MutableSet):
             if filepath not in self:
                 raise KeyError("Cannot update unregistered file!")
             if os.path.exists(filepath):
-                self._files[filekey] = os.stat(filepath).st_mtime
+                self._set_mtime(filekey,os.stat(filepath).st_mtime)
             else:
-                self._files[filekey] = 0.0
+                self._set_mtime(filekey,0.0)
         self._persist()
         return self._files.keys()
     
@@ -484,14 +701,16 @@ class FileSet(collections.MutableSet):
             
         if clean and check:
             self.delete(*self.files)
-            if os.path.exists(self._dbfilename):
-                os.remove(self._dbfilename)
+            self._db.remove()
             try:
                 os.rmdir(self.directory)
             except OSError:
                 self.log.warning("Directory was not deleted, as it isn't empty.")
         elif clean and not check:
+            self._db.close()
             shutil.rmtree(self.directory)
+        else:
+            self._db.close()
         self.log.log(2,"File Set closed with directory %s" % self._directory)
         self._open = False
         
@@ -505,7 +724,7 @@ class TempFileSet(FileSet):
     :param bool persist: Whether this fileset should try to persist across instantiations. Persistance is not supported in operating system temporary directories.
     :keyword bool autodiscover: Whether this fileset should check the directory for new files automatically, and register those files.
     :keyword string timeformat: The format string for the :mod:`datetime` module to use when writing/reading from the database. There is no reason to need to change this default, but it is supported just in case.
-    :keyword string dbfilebase: The base name of the persistance database. By default it is ``.AOFSdb.yml``. If this filename *could* conflict with other files you might add to the file-set, you might want to change it to a non-conflicting filename. Files should have the ``.yml,.yaml`` extension.
+    :keyword string dbfilebase: The base name of the persistance database. By default it is ``.AOFSdb.sqlite``. If this filename *could* conflict with other files you might add to the file-set, you might want to change it to a non-conflicting filename. The extension selects the database type, see :class:`FileSet`.
     
     **Persistance**:
     
@@ -557,7 +776,7 @@ class HashedFileSet(FileSet):
     :keyword bool persist: Whether this fileset should try to persist across instantiations.
     :keyword bool autodiscover: Whether this fileset should check the directory for new files automatically, and register those files.
     :keyword string timeformat: The format string for the :mod:`datetime` module to use when writing/reading from the database. There is no reason to need to change this default, but it is supported just in case.
-    :keyword string dbfilebase: The base name of the persistance database. By default it is ``.AOFSdb.yml``. If this filename *could* conflict with other files you might add to the file-set, you might want to change it to a non-conflicting filename. Files should have the ``.yml,.yaml`` extension.
+    :keyword string dbfilebase: The base name of the persistance database. By default it is ``.AOFSdb.sqlite``. If this filename *could* conflict with other files you might add to the file-set, you might want to change it to a non-conflicting filename. The extension selects the database type, see :class:`FileSet`.
     
     **Persistance**:
     
@@ -17,6 +17,10 @@ This module provides a simple extraction layer class for FITS file writing. FITS
     :members:
     :inherited-members:
 
+.. autoclass::
+    FITSFileWriter
+    :members:
+
 """
 
 
@@ -25,7 +29,7 @@ import pyfits as pf
 import collections
 import warnings
 
-from . import File
+from . import File, FileWriter
 
 class FITSFile(File):
     """A fits file implementation which simply passes ``HDUs`` through to the :mod:`pyfits` API.
@@ -50,7 +54,9 @@ class FITSFile(File):
         self.file = thefile
              
     __extensions__ = ['.fit','.fits']
+    __magic__ = ( "SIMPLE  =", )
     __canstream__ = True
+    __canappend__ = True
     
     def write(self, stack, clobber=False):
         """Write a stack to this file.
@@ -63,7 +69,51 @@ class FITSFile(File):
             warnings.simplefilter("ignore")
             stack.writeto(self.file, clobber = clobber)
         
-    def open(self):
-        """Open this file and return the HDUList."""
-        return pf.open(self.file,ignore_missing_end=True)
-        
\ No newline at end of file
+    def writer(self, clobber=False, fsync=False, append=False):
+        """Return a :class:`FITSFileWriter`, which writes the primary HDU first and then appends each extension to the end of the file as it is produced. Only one HDU is held in memory at a time. File streams can't be appended to, so they use a buffering :class:`~AstroObject.file.FileWriter`.
+        
+        :param bool clobber: Whether to overwrite the destination file.
+        :param bool fsync: Whether to flush each HDU to disk with :func:`os.fsync` as it is written.
+        :param bool append: Whether to append extensions to the existing file, rather than writing a new primary HDU.
+        
+        """
+        if isinstance(self.file,file):
+            return super(FITSFile, self).writer(clobber=clobber, fsync=fsync, append=append)
+        return FITSFileWriter(self, clobber=clobber, fsync=fsync, append=append)
+        
+    def open(self, memmap=None):
+        """Open this file and return the HDUList.
+        
+        :param bool memmap: Whether to memory-map the HDU data. Memory-mapped data is read from disk only when the pixels are accessed, and modifications are kept in memory (the mapping is copy-on-write). ``None`` uses the :mod:`pyfits` default.
+        
+        """
+        return pf.open(self.file,ignore_missing_end=True,memmap=memmap)
+        
+class FITSFileWriter(FileWriter):
+    """Writes a FITS file one HDU at a time. The first HDU is written as the primary HDU of a new file, and each following HDU is appended to the end of the file with :func:`pyfits.append`, so HDUs do not accumulate in memory. With ``append=True``, every HDU is appended to the existing file."""
+    
+    def __init__(self, fileobject, clobber=False, fsync=False, append=False):
+        super(FITSFileWriter, self).__init__(fileobject, clobber=clobber, fsync=fsync, append=append)
+        if append:
+            HDUList = pf.open(self.file.file)
+            self.count = len(HDUList)
+            HDUList.close()
+        
+    def append(self, HDU):
+        """Write an HDU to the end of this file."""
+        if self.closed:
+            raise IOError("Cannot append to closed writer for %s" % self.file.name)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            if self.count == 0:
+                pf.HDUList([HDU]).writeto(self.file.file, clobber = self.clobber)
+            else:
+                pf.append(self.file.file, HDU.data, HDU.header, verify=False)
+        self.count += 1
+        if self.fsync:
+            with open(self.file.file, 'ab') as stream:
+                os.fsync(stream.fileno())
+        
+    def close(self):
+        """Finish writing this file. Each HDU is already on disk, so this only marks the writer as closed."""
+        self.closed = True
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+#
+#  hdf5.py
+#  AstroObject
+#
+#  Created by Alexander Rudy on 2012-05-08.
+#  Copyright 2012 Alexander Rudy. All rights reserved.
+#
+u"""
+:class:`file.hdf5.HDF5File` – Compressed multi-frame files with headers
+=======================================================================
+
+This module reads and writes HDF5 files with :mod:`h5py`. Each HDU is stored as a chunked, gzip-compressed dataset, with its full FITS header kept as an attribute, so HDF5 files can hold many frames without losing any metadata. Single frames, and regions of single frames, can be read without decompressing the rest of the file. :mod:`h5py` is only required when an HDF5 file is actually read or written.
+
+.. autoclass::
+    HDF5File
+    :members:
+    :inherited-members:
+
+.. autoclass::
+    HDF5FileWriter
+    :members:
+
+"""
+
+import os
+
+import numpy as np
+import pyfits as pf
+
+from . import File, FileWriter, section_slices, section_header
+
+HDUTYPES = { cls.__name__ : cls for cls in [ pf.PrimaryHDU, pf.ImageHDU, pf.BinTableHDU, pf.TableHDU ] }
+"""HDU types which are restored from the ``hdutype`` attribute of each HDF5 node."""
+
+def _h5py():
+    """Import and return :mod:`h5py`, raising a helpful :exc:`ImportError` if it is not installed."""
+    try:
+        import h5py
+    except ImportError as IE:
+        raise ImportError(u"HDF5 files require the h5py module: %s" % IE)
+    return h5py
+
+def _node_order(name):
+    """Sort key for the nodes of an HDF5 file, which orders ``HDU9999`` before ``HDU10000``. Nodes which are not named like HDUs sort last, by name."""
+    if name.startswith('HDU') and name[3:].isdigit():
+        return (0, int(name[3:]), name)
+    return (1, 0, name)
+
+class HDF5File(File):
+    """HDF5 file reading and writing, using :mod:`h5py`. Every HDU is stored as a node named ``HDU0000``, ``HDU0001``, etc. at the root of the file, in order. Nodes are read back in the numeric order of their names, so files with more than 10000 HDUs keep their order. Data is written to chunked datasets with the ``gzip`` and ``shuffle`` filters, and HDUs without data are written as empty groups. Each node has the attributes ``header`` (the FITS header as a string), ``hdutype`` and, where the HDU has one, ``label``.
+
+    =========== =======
+     extension   notes
+    =========== =======
+    ``.h5``
+    ``.hdf5``
+    ``.hdf``
+    =========== =======
+
+    :meth:`open` can read a subset of the frames, by label, and a section of each frame. Only the chunks which hold the requested pixels are decompressed. Since the data is compressed, it is never memory-mapped.
+
+    """
+    def __init__(self, filename=None):
+        super(HDF5File, self).__init__()
+        self.validate(filename)
+        self.filename = filename
+
+    __extensions__ = [ '.h5', '.hdf5', '.hdf' ]
+    __magic__ = ( "\x89HDF\r\n\x1a\n", )
+    __canappend__ = True
+    __canselect__ = True
+
+    compression = 'gzip'
+    """The :mod:`h5py` compression filter applied to each dataset."""
+
+    compression_opts = 4
+    """The compression level for ``gzip``."""
+
+    def write(self, stack, clobber=False):
+        """Write a stack to this file.
+
+        :param HDUList stack: An HDUList to write to a file.
+        :param bool clobber: Whether to overwrite the destination file.
+
+        """
+        with self.writer(clobber=clobber) as writer:
+            for HDU in stack:
+                writer.append(HDU)
+
+    def writer(self, clobber=False, fsync=False, append=False):
+        """Return a :class:`HDF5FileWriter`, which writes each HDU to the file as it is appended.
+
+        :param bool clobber: Whether to overwrite the destination file.
+        :param bool fsync: Whether to flush the file to disk after each HDU.
+        :param bool append: Whether to add HDUs after the nodes already in the file, rather than starting a new file.
+
+        """
+        return HDF5FileWriter(self, clobber=clobber, fsync=fsync, append=append)
+
+    def open(self, memmap=None, frames=None, section=None):
+        """Open this file and return the HDUList.
+
+        :param bool memmap: Ignored, compressed data can't be memory-mapped.
+        :param list frames: Labels of the frames to read. Nodes with any other label are not decompressed. Nodes without a label are always read. ``None`` reads every node.
+        :param tuple section: A tuple of slices, in ``numpy`` axis order, selecting a region of each image to read. The offset of the region is recorded in the IRAF ``LTVn`` header keywords. ``None`` reads whole images.
+
+        """
+        h5py = _h5py()
+        HDUList = pf.HDUList()
+        with h5py.File(self.filename, 'r') as stream:
+            for name in sorted(stream.keys(), key=_node_order):
+                node = stream[name]
+                label = node.attrs.get('label', None)
+                if frames is not None and label is not None and label not in frames:
+                    continue
+                header = pf.Header.fromstring(str(node.attrs['header']))
+                hdutype = HDUTYPES.get(str(node.attrs.get('hdutype', 'ImageHDU')), pf.ImageHDU)
+                if not isinstance(node, h5py.Dataset):
+                    data = None
+                elif section is not None and hdutype in (pf.PrimaryHDU, pf.ImageHDU) and node.ndim > 0:
+                    slices, starts = section_slices(node.shape, section)
+                    data = node[slices]
+                    section_header(header, starts)
+                else:
+                    data = node[()]
+                HDUList.append(hdutype(data=data, header=header))
+        return HDUList
+
+class HDF5FileWriter(FileWriter):
+    """Writes an HDF5 file one HDU at a time. The file is created when the first HDU is appended, and each HDU is compressed and written as it arrives, so HDUs do not accumulate in memory."""
+
+    def __init__(self, fileobject, clobber=False, fsync=False, append=False):
+        super(HDF5FileWriter, self).__init__(fileobject, clobber=clobber, fsync=fsync, append=append)
+        self._stream = None
+
+    def append(self, HDU):
+        """Write an HDU to the end of this file."""
+        if self.closed:
+            raise IOError("Cannot append to closed writer for %s" % self.file.name)
+        if self._stream is None and self.append_to:
+            self._stream = _h5py().File(self.file.filename, 'a')
+            self.count = len(self._stream.keys())
+        elif self._stream is None:
+            if not self.clobber and os.path.exists(self.file.filename):
+                raise IOError(u"Can't overwrite existing file.")
+            self._stream = _h5py().File(self.file.filename, 'w')
+        name = "HDU%04d" % self.count
+        header = HDU.header.copy()
+        # Data is stored after scaling, so the scaling keywords no longer apply.
+        for keyword in ('BSCALE', 'BZERO', 'BLANK'):
+            if keyword in header:
+                del header[keyword]
+        if HDU.data is None:
+            node = self._stream.create_group(name)
+        else:
+            data = np.asarray(HDU.data)
+            options = {}
+            if data.ndim > 0 and data.size > 0:
+                options = dict(chunks=True, shuffle=True, compression=self.file.compression, compression_opts=self.file.compression_opts)
+            node = self._stream.create_dataset(name, data=data, **options)
+        node.attrs['header'] = header.tostring()
+        node.attrs['hdutype'] = type(HDU).__name__
+        if 'label' in header:
+            node.attrs['label'] = str(header['label'])
+        self.count += 1
+        if self.fsync:
+            self._stream.flush()
+
+    def close(self):
+        """Finish writing this file, closing the underlying HDF5 file. Closing a writer more than once has no effect."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
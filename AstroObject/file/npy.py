@@ -32,9 +32,8 @@ import os
 import collections
 
 import numpy as np
-import pyfits as pf
 
-from . import File
+from . import File, section_slices, section_header
 
 class NumpyFile(File):
     """Simple numpy binary file writing using the :mod:`numpy` file facilities. Saves the raw data component to a binary :mod:`numpy` file.
@@ -53,7 +52,9 @@ class NumpyFile(File):
         self.file = filename
         
     __extensions__ = [ '.npy' ]
+    __magic__ = ( "\x93NUMPY", )
     __canstream__ = True
+    __canarrays__ = True
     
     def write(self,stack,clobber=False):
         """Write a stack to this file.
@@ -62,15 +63,30 @@ class NumpyFile(File):
         :param bool clobber: Whether to overwrite the destination file.
         
         """
-        if len(stack) > 1:
+        self.write_arrays([ (HDU.header.get('label',None), HDU.data, HDU.header) for HDU in stack ], clobber=clobber)
+        
+    def write_arrays(self, arrays, clobber=False, workers=None):
+        """Write a single ``(label, array, header)`` triple to this file. The label and header are not saved."""
+        if len(arrays) > 1:
             raise TypeError(u"Can't save multiple frames to stack.")
-        if not clobber and os.path.exists(self.filename):
+        if not clobber and isinstance(self.file, (str, unicode)) and os.path.exists(self.file):
             raise IOError(u"Can't overwrite existing file.")
-        np.save(self.file, stack[0].data)
+        np.save(self.file, arrays[0][1])
+        
+    def open(self, memmap=None):
+        """Open this file and return the HDUList.
+        
+        :param bool memmap: Whether to memory-map the array. Memory-mapped data is read from disk only when it is accessed, and modifications are kept in memory (the mapping is copy-on-write), as for FITS files. File streams are never memory-mapped.
         
-    def open(self):
-        """Open this file and return the HDUList."""
-        return pf.HDUList([pf.PrimaryHDU(np.load(self.file))])
+        """
+        import pyfits as pf
+        return pf.HDUList([ pf.PrimaryHDU(data) for label, data, header in self.open_arrays(memmap=memmap) ])
+        
+    def open_arrays(self, memmap=None, frames=None):
+        """Open this file and return a list with the single ``(None, array, {})`` triple it contains. See :meth:`open` for *memmap*."""
+        if memmap and isinstance(self.file, (str, unicode)):
+            return [(None, np.load(self.file, mmap_mode='c'), {})]
+        return [(None, np.load(self.file), {})]
 
 class NumpyZipFile(File):
     """Simple numpy binary file writing using the :mod:`numpy` file facilities. Saves the raw data component to a binary :mod:`numpy` file.
@@ -89,6 +105,9 @@ class NumpyZipFile(File):
         self.filename = filename
      
     __extensions__ = [ '.npz' ]
+    __magic__ = ( "PK\x03\x04", )
+    __canselect__ = True
+    __canarrays__ = True
     
     def write(self,stack,clobber=False):
         """Write a stack to this file.
@@ -97,24 +116,51 @@ class NumpyZipFile(File):
         :param bool clobber: Whether to overwrite the destination file.
         
         """
+        self.write_arrays([ (HDU.header.get('label',None), HDU.data, HDU.header) for HDU in stack ], clobber=clobber)
+        
+    def write_arrays(self, arrays, clobber=False, workers=None):
+        """Write a list of ``(label, array, header)`` triples to this file, using each label as the name of an archive member. Headers are not saved."""
         dirname, filename = os.path.split(self.filename)
         basename, extension = os.path.splitext(filename)
         
         if not clobber and os.path.exists(self.filename):
             raise IOError(u"Can't overwrite existing file.")
-        np.savez(self.filename,**{ frame.header.get('label',"%s-%02d" % (basename, fnum)): frame.data for fnum,frame in enumerate(stack) })
-
+        np.savez(self.filename,**{ label if label is not None else "%s-%02d" % (basename, fnum) : data for fnum, (label, data, header) in enumerate(arrays) })
         
+    def open(self, memmap=None, frames=None, section=None):
+        """Open this file and return the HDUList. Each member of the archive is decompressed only if it is requested.
         
-    def open(self):
-        """Open this file and return the HDUList."""
-        dirname, filename = os.path.split(self.filename)
-        basename, extension = os.path.splitext(filename)
-        zipfile = np.load(self.filename)
+        :param bool memmap: Ignored, members of the archive can't be memory-mapped.
+        :param list frames: Labels of the frames to read. ``None`` reads every frame. Members without a label are always read.
+        :param tuple section: A tuple of slices, in ``numpy`` axis order, selecting a region of each frame. The offset of the region is recorded in the IRAF ``LTVn`` header keywords.
+        
+        """
+        import pyfits as pf
         HDUList = pf.HDUList()
-        for fnum,label in enumerate(zipfile):
-            HDU = pf.ImageHDU(zipfile[label])
-            if label != "%s-%02d" % (basename, fnum):
+        for label, data, header in self.open_arrays(memmap=memmap, frames=frames):
+            header = pf.Header()
+            if section is not None and data.ndim > 0:
+                slices, starts = section_slices(data.shape, section)
+                data = data[slices]
+                section_header(header, starts)
+            HDU = pf.ImageHDU(data, header=header)
+            if label is not None:
                 HDU.header.update('label',label)
             HDUList.append(HDU)
         return HDUList
+        
+    def open_arrays(self, memmap=None, frames=None):
+        """Open this file and return a list of ``(label, array, {})`` triples. Members are decompressed one at a time, and members which are not in *frames* are never decompressed. See :meth:`open` for the parameters."""
+        dirname, filename = os.path.split(self.filename)
+        basename, extension = os.path.splitext(filename)
+        archive = np.load(self.filename)
+        try:
+            arrays = []
+            for fnum, name in enumerate(archive.files):
+                label = None if name == "%s-%02d" % (basename, fnum) else name
+                if label is not None and frames is not None and label not in frames:
+                    continue
+                arrays.append((label, archive[name], {}))
+        finally:
+            archive.close()
+        return arrays
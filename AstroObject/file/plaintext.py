@@ -10,7 +10,13 @@ u"""
 :class:`file.plaintext.NumpyTextFile` – Plain Text File writing
 ===============================================================
 
-This module handles writing simple text files. In :mod:`AstroObject`, simple text files have the extension ``.txt`` or ``.dat``. As well, since this module uses numpy to load and read text files, gzipped files can be read automatically as gzipped text files, with the ``.gz`` extension.
+This module handles writing simple text files. In :mod:`AstroObject`, simple text files have the extension ``.txt`` or ``.dat``. As well, gzipped files can be read and written as gzipped text files, with the ``.gz`` extension. Text is formatted and parsed in large blocks by :func:`write_text` and :func:`read_text`, which are much faster than :func:`numpy.savetxt` and :func:`numpy.loadtxt` for long arrays.
+
+.. autofunction::
+    write_text
+
+.. autofunction::
+    read_text
 
 .. autoclass::
     NumpyTextFile
@@ -30,11 +36,138 @@ This module writes plain-text files, but includes header information as text com
 """
 import os
 import collections
+import numbers
+import gzip
+import zlib
 
 import numpy as np
-import pyfits as pf
 
-from . import File
+from . import File, STRUCTURAL_KEYWORDS
+
+BLOCKSIZE = 2 ** 16
+"""The number of rows formatted, or the number of bytes of text parsed, at a time by the text reader and writer."""
+
+def _card(keyword, value):
+    """Format a header keyword and value as a FITS-style card image, without using :mod:`pyfits`."""
+    keyword = str(keyword).upper()
+    if keyword in ('COMMENT', 'HISTORY', ''):
+        return ("%-8s%s" % (keyword, value))[:80]
+    if isinstance(value, (bool, np.bool_)):
+        text = "%20s" % ("T" if value else "F")
+    elif isinstance(value, numbers.Number):
+        text = "%20s" % (repr(value) if isinstance(value, float) else value)
+    else:
+        text = "'%-8s'" % str(value).replace("'", "''")
+    return ("%-8s= %s" % (keyword, text))[:80]
+
+def _parse_card(line):
+    """Parse a FITS-style card image written by :func:`_card`, returning a ``(keyword, value)`` pair. Returns ``None`` for commentary cards and lines which are not cards."""
+    if len(line) < 10 or line[8:10] != "= ":
+        return None
+    keyword = line[:8].strip().upper()
+    text = line[10:].strip()
+    if text.startswith("'"):
+        end = 1
+        while True:
+            end = text.find("'", end)
+            if end < 0 or text[end+1:end+2] != "'":
+                break
+            end += 2
+        return keyword, text[1:end if end > 0 else None].replace("''", "'").rstrip()
+    text = text.split("/", 1)[0].strip()
+    if text in ("T", "F"):
+        return keyword, text == "T"
+    for kind in (int, float):
+        try:
+            return keyword, kind(text)
+        except ValueError:
+            pass
+    return keyword, text
+
+def _gzip_member(text):
+    """Compress *text* into a complete gzip member. Members can be compressed independently, and concatenated into a single gzip file."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(text) + compressor.flush()
+
+def _format_blocks(data, fmt='%.18e', delimiter=' ', blocksize=BLOCKSIZE):
+    """Yield the rows of *data* formatted as text, *blocksize* rows at a time. Each block is formatted with a single string operation, rather than one per row as in :func:`numpy.savetxt`."""
+    data = np.asarray(data)
+    if data.ndim < 2:
+        data = data.reshape((-1, 1))
+    rowformat = delimiter.join([fmt] * data.shape[1]) + "\n"
+    for start in range(0, data.shape[0], blocksize):
+        block = data[start:start+blocksize]
+        yield (rowformat * block.shape[0]) % tuple(block.ravel().tolist())
+
+def write_text(filename, data, header="", workers=None, blocksize=BLOCKSIZE):
+    """Write *data* to a text file in the format of :func:`numpy.savetxt`, preceded by the text *header*. Files ending in ``.gz`` are compressed. Each block of rows is compressed as a separate gzip member, so with *workers* the blocks are compressed in parallel threads.
+    
+    :param string filename: The file to write.
+    :param data: A one or two dimensional array.
+    :param string header: Text to write before the data.
+    :param int workers: The number of threads used to compress ``.gz`` files. ``None`` or ``1`` compresses in the calling thread.
+    :param int blocksize: The number of rows to format at a time.
+    
+    """
+    if np.iscomplexobj(data) or np.asarray(data).ndim > 2:
+        with (gzip.open(filename, 'wb') if filename.endswith('.gz') else open(filename, 'w')) as stream:
+            stream.write(header)
+            np.savetxt(stream, data)
+        return
+    blocks = _format_blocks(data, blocksize=blocksize)
+    if not filename.endswith('.gz'):
+        with open(filename, 'w') as stream:
+            stream.write(header)
+            for block in blocks:
+                stream.write(block)
+        return
+    pool = None
+    if workers is not None and workers > 1:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(workers)
+        members = pool.imap(_gzip_member, blocks)
+    else:
+        members = (_gzip_member(block) for block in blocks)
+    try:
+        with open(filename, 'wb') as stream:
+            if header:
+                stream.write(_gzip_member(header))
+            for member in members:
+                stream.write(member)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    
+def read_text(filename, unpack=False):
+    """Read a text file written by :func:`write_text` or :func:`numpy.savetxt`. Leading ``#`` comment lines are returned separately, and the data is parsed with :func:`numpy.fromstring` a block at a time. Files which this fast parser can't read, such as files with comments or blank lines among the data, are read with :func:`numpy.loadtxt` instead.
+    
+    :param string filename: The file to read. Files ending in ``.gz`` are decompressed.
+    :param bool unpack: Whether to transpose the data, as for :func:`numpy.loadtxt`.
+    :returns: The list of leading comment lines, without the ``#``, and the data array.
+    
+    """
+    comments = []
+    with (gzip.open(filename, 'rb') if filename.endswith('.gz') else open(filename, 'r')) as stream:
+        line = stream.readline()
+        while line.startswith("#"):
+            comments.append(line[1:].strip(" \n\r"))
+            line = stream.readline()
+        ncols = len(line.split())
+        blocks = [np.fromstring(line, sep=' ')]
+        nlines = 1
+        lines = stream.readlines(BLOCKSIZE)
+        while lines:
+            blocks.append(np.fromstring("".join(lines), sep=' '))
+            nlines += len(lines)
+            lines = stream.readlines(BLOCKSIZE)
+    data = np.concatenate(blocks)
+    if ncols == 0 or data.size != nlines * ncols:
+        data = np.loadtxt(filename)
+    else:
+        data = np.squeeze(data.reshape((nlines, ncols)))
+    if unpack:
+        data = data.T
+    return comments, data
 
 class NumpyTextFile(File):
     """Simple text file writing using the :mod:`numpy` text facilities. Text files write the raw data of the data component to the HDU to a simple text file.
@@ -56,23 +189,35 @@ class NumpyTextFile(File):
 
      
     __extensions__ = ['.txt','.dat','.gz']
+    __canarrays__ = True
     
-    def write(self,stack,clobber=False):
+    def write(self,stack,clobber=False,workers=None):
         """Write a stack to this file. The stack cannot have more than one HDU element. The text file will be a text representation of the HDU's data array, and will not contain any metadata information.
         
         :param HDUList stack: An HDUList to write to a file.
         :param bool clobber: Whether to overwrite the destination file.
+        :param int workers: The number of threads used to compress ``.gz`` files. See :func:`write_text`.
         
         """
-        if len(stack) > 1:
+        self.write_arrays([ (HDU.header.get('label',None), HDU.data, HDU.header) for HDU in stack ], clobber=clobber, workers=workers)
+        
+    def write_arrays(self, arrays, clobber=False, workers=None):
+        """Write a single ``(label, array, header)`` triple to this file. The label and header are not saved. *workers* is passed to :func:`write_text`."""
+        if len(arrays) > 1:
             raise TypeError(u"Can't save multiple frames to stack.")
         if not clobber and os.path.exists(self.filename):
             raise IOError(u"Can't overwrite existing file.")
-        np.savetxt(self.filename, stack[0].data.T)
+        write_text(self.filename, np.asarray(arrays[0][1]).T, workers=workers)
         
-    def open(self):
-        """Open this file and return the HDUList."""
-        return pf.HDUList([pf.PrimaryHDU(np.loadtxt(self.filename,unpack=True))])
+    def open(self, memmap=None):
+        """Open this file and return the HDUList. This format does not support memory-mapping, so *memmap* is ignored."""
+        import pyfits as pf
+        return pf.HDUList([ pf.PrimaryHDU(data) for label, data, header in self.open_arrays(memmap=memmap) ])
+        
+    def open_arrays(self, memmap=None, frames=None):
+        """Open this file and return a list with the single ``(None, array, {})`` triple it contains."""
+        comments, data = read_text(self.filename, unpack=True)
+        return [(None, data, {})]
 
 class AstroObjectTextFile(File):
     """Simple text file writing using the :mod:`numpy` text facilities. Text files write the raw data of the data component to the HDU to a simple text file.
@@ -90,25 +235,46 @@ class AstroObjectTextFile(File):
         self.filename = filename
     
     __extensions__ = [ ".aotxt", ".aodat" ]
+    __canarrays__ = True
     
-    def write(self,stack,clobber=False):
-        """Write a stack to this file. The stack cannot have more than one HDU element. The text file will be a text representation of the HDU's data array, and will not contain any metadata information.
+    def write(self,stack,clobber=False,workers=None):
+        """Write a stack to this file. The stack cannot have more than one HDU element. The text file will be a text representation of the HDU's data array, preceded by the HDU's header cards as comments.
         
         :param HDUList stack: An HDUList to write to a file.
         :param bool clobber: Whether to overwrite the destination file.
+        :param int workers: The number of threads used to compress ``.gz`` files. See :func:`write_text`.
         
         """
-        if len(stack) > 1:
+        self.write_arrays([ (HDU.header.get('label',None), HDU.data, HDU.header) for HDU in stack ], clobber=clobber, workers=workers)
+        
+    def write_arrays(self, arrays, clobber=False, workers=None):
+        """Write a single ``(label, array, header)`` triple to this file. The header is written as FITS-style cards in comments at the start of the file. *workers* is passed to :func:`write_text`."""
+        if len(arrays) > 1:
             raise TypeError(u"Can't save multiple frames to stack.")
         if not clobber and os.path.exists(self.filename):
             raise IOError(u"Can't overwrite existing file.")
-        header = "# " + "\n# ".join([str(card) for card in stack[0].header.ascardlist()]) + "\n# \n"
-        with open(self.filename,'w') as stream:
-            stream.write(header)
-            np.savetxt(stream, stack[0].data)
+        label, data, header = arrays[0]
+        header = "# " + "\n# ".join([ _card(key, value) for key, value in header.items() ]) + "\n# \n"
+        write_text(self.filename, data, header=header, workers=workers)
+        
+    def open(self, memmap=None):
+        """Open this file and return the HDUList, with the header cards from the file applied to the HDU. This format does not support memory-mapping, so *memmap* is ignored."""
+        import pyfits as pf
+        HDUList = pf.HDUList()
+        for label, data, header in self.open_arrays(memmap=memmap):
+            HDU = pf.PrimaryHDU(data)
+            for key, value in header.items():
+                HDU.header.update(key, value)
+            HDUList.append(HDU)
+        return HDUList
         
-    def open(self):
-        """Open this file and return the HDUList."""
-        return pf.HDUList([pf.PrimaryHDU(np.loadtxt(self.filename))])
+    def open_arrays(self, memmap=None, frames=None):
+        """Open this file and return a list with the single ``(label, array, header)`` triple it contains. The header is parsed from the cards at the start of the file, leaving out structural and commentary keywords. The label is taken from the ``LABEL`` card, if there is one."""
+        comments, data = read_text(self.filename)
+        header = collections.OrderedDict()
+        for line in comments:
+            card = _parse_card(line)
+            if card is not None and card[0] not in STRUCTURAL_KEYWORDS and not card[0].startswith('NAXIS'):
+                header[card[0]] = card[1]
+        return [(header.get('LABEL', None), data, header)]
 
-        
\ No newline at end of file
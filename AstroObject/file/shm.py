@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+#
+#  shm.py
+#  AstroObject
+#
+#  Created by Alexander Rudy on 2012-05-08.
+#  Copyright 2012 Alexander Rudy. All rights reserved.
+#
+u"""
+:class:`file.shm.SharedMemoryFile` – Frames shared through memory-backed files
+==============================================================================
+
+This module hands frames to other processes without encoding them as FITS. A shared-memory file is a small ``JSON`` descriptor (the ``.shm`` file), which lists the label, ``dtype``, shape and header keywords of each frame (with the values of repeated ``COMMENT`` and ``HISTORY`` cards as lists), and one ``.npy`` file for the data of each frame, next to the descriptor. When the files are put in a memory-backed directory (see :func:`shm_directory`), reading a frame maps the same memory pages that the writer filled, so no data is copied.
+
+Any process can read the frames with :mod:`numpy` alone::
+
+    import json, os
+    import numpy as np
+    with open(descriptor) as stream:
+        shared = json.load(stream)
+    for frame in shared['frames']:
+        data = np.load(os.path.join(os.path.dirname(descriptor), frame['data']), mmap_mode='r')
+
+
+Stacks create and read shared-memory files with :meth:`~AstroObject.base.BaseStack.share` and :meth:`~AstroObject.base.BaseStack.attach`.
+
+.. autoclass::
+    SharedMemoryFile
+    :members:
+    :inherited-members:
+
+.. autofunction::
+    shm_directory
+
+.. autofunction::
+    release
+
+"""
+
+import os
+import json
+import tempfile
+import collections
+
+import numpy as np
+
+from . import File, STRUCTURAL_KEYWORDS, COMMENTARY_KEYWORDS, section_slices, section_header, header_cards
+
+SHM_DIRECTORIES = [ '/dev/shm', '/run/shm' ]
+"""Memory-backed directories, in order of preference, used by :func:`shm_directory`."""
+
+FORMAT = "AOSHM"
+"""The ``format`` value at the start of every shared-memory descriptor."""
+
+def shm_directory():
+    """Return the first writable directory in :data:`SHM_DIRECTORIES`, or the system temporary directory if none is available. Files in a memory-backed directory are never written to disk, but they use memory until they are removed."""
+    for directory in SHM_DIRECTORIES:
+        if os.path.isdir(directory) and os.access(directory, os.W_OK):
+            return directory
+    return tempfile.gettempdir()
+
+def release(filename):
+    """Remove a shared-memory descriptor and the data files it lists. Processes which have already mapped the data keep their mappings, and the memory is returned when the last of them is closed.
+
+    :param string filename: The ``.shm`` descriptor to remove.
+
+    """
+    if not os.path.exists(filename):
+        return
+    try:
+        datafiles = SharedMemoryFile(filename)._datafiles()
+    except (IOError, ValueError, KeyError):
+        # Not a complete descriptor, so there are no data files to remove.
+        datafiles = []
+    for path in datafiles:
+        if os.path.exists(path):
+            os.remove(path)
+    os.remove(filename)
+
+def _header_items(header):
+    """Return the non-structural keywords of *header* as an ordered dictionary of values which can be written to ``JSON``. ``COMMENT`` and ``HISTORY`` cards are kept, as a list of the values of every card."""
+    items = collections.OrderedDict()
+    for key, value in header.items():
+        key = str(key).upper()
+        if key in COMMENTARY_KEYWORDS:
+            items.setdefault(key, []).append(str(value))
+            continue
+        if key in STRUCTURAL_KEYWORDS or key.startswith('NAXIS') or key in items:
+            continue
+        if isinstance(value, np.generic):
+            value = value.item()
+        if not isinstance(value, (bool, int, long, float, str, unicode)):
+            value = str(value)
+        items[key] = value
+    return items
+
+def _header_value(value):
+    """Return a header value read from ``JSON``, with ``unicode`` turned back into ``str`` where possible."""
+    if isinstance(value, list):
+        return [ _header_value(item) for item in value ]
+    if isinstance(value, unicode):
+        try:
+            return str(value)
+        except UnicodeEncodeError:
+            pass
+    return value
+
+class SharedMemoryFile(File):
+    """Frames shared through a ``JSON`` descriptor and one ``.npy`` file per frame. The data of each frame is written to ``<name>-0000.npy``, ``<name>-0001.npy``, etc. next to the descriptor. The descriptor is written last, and replaced in one step, so readers never see a partly written file.
+
+    =========== =======
+     extension   notes
+    =========== =======
+    ``.shm``
+    =========== =======
+
+    Data is memory-mapped by default. Mapped data is copy-on-write: changes made by the reader are kept in its own memory, and are not seen by other processes. :meth:`open` can read a subset of the frames, by label, and a section of each frame.
+
+    """
+    def __init__(self, filename=None):
+        super(SharedMemoryFile, self).__init__()
+        self.validate(filename)
+        self.filename = filename
+
+    __extensions__ = [ '.shm' ]
+    __magic__ = ( '{"format": "%s' % FORMAT[:3], )
+    __canselect__ = True
+    __canarrays__ = True
+
+    def _datafile(self, index):
+        """The data filename for the frame at *index*."""
+        basename, extension = os.path.splitext(os.path.basename(self.filename))
+        return "%s-%04d.npy" % (basename, index)
+
+    def _descriptor(self):
+        """Load the descriptor for this file."""
+        with open(self.filename, 'r') as stream:
+            descriptor = json.load(stream, object_pairs_hook=collections.OrderedDict)
+        if descriptor.get('format', None) != FORMAT:
+            raise IOError(u"File %s is not a shared-memory descriptor." % self.filename)
+        return descriptor
+
+    def _datafiles(self):
+        """The full paths of the data files listed in this descriptor."""
+        dirname = os.path.dirname(self.filename)
+        return [ os.path.join(dirname, frame['data']) for frame in self._descriptor()['frames'] ]
+
+    def write(self, stack, clobber=False):
+        """Write a stack to this file.
+
+        :param HDUList stack: An HDUList to write to a file.
+        :param bool clobber: Whether to overwrite the destination file.
+
+        """
+        self.write_arrays([ (HDU.header.get('label', None), HDU.data, HDU.header) for HDU in stack ], clobber=clobber)
+
+    def write_arrays(self, arrays, clobber=False, workers=None):
+        """Write a list of ``(label, array, header)`` triples to this file. Each array is copied once, directly into its memory-mapped data file.
+
+        Existing data files are removed rather than overwritten, so processes which have mapped them keep the old data.
+
+        """
+        if os.path.exists(self.filename):
+            if not clobber:
+                raise IOError(u"Can't overwrite existing file.")
+            release(self.filename)
+        dirname = os.path.dirname(self.filename)
+        frames = []
+        for index, (label, data, header) in enumerate(arrays):
+            data = np.asarray(data)
+            datafile = self._datafile(index)
+            if data.size:
+                mapped = np.lib.format.open_memmap(os.path.join(dirname, datafile), mode='w+', dtype=data.dtype, shape=data.shape)
+                mapped[...] = data
+                mapped.flush()
+                del mapped
+            else:
+                np.save(os.path.join(dirname, datafile), data)
+            frames.append(collections.OrderedDict([
+                ('label', None if label is None else unicode(label)),
+                ('data', datafile),
+                ('dtype', data.dtype.str),
+                ('shape', list(data.shape)),
+                ('header', _header_items(header or {})),
+            ]))
+        descriptor = collections.OrderedDict([('format', FORMAT), ('frames', frames)])
+        fd, partial = tempfile.mkstemp(suffix='.shm', dir=dirname or os.curdir)
+        with os.fdopen(fd, 'w') as stream:
+            json.dump(descriptor, stream)
+        os.rename(partial, self.filename)
+
+    def open(self, memmap=None, frames=None, section=None):
+        """Open this file and return the HDUList.
+
+        :param bool memmap: Whether to memory-map the data. ``None`` (the default) maps the data.
+        :param list frames: Labels of the frames to read. ``None`` reads every frame. Frames without a label are always read.
+        :param tuple section: A tuple of slices, in ``numpy`` axis order, selecting a region of each frame. The offset of the region is recorded in the IRAF ``LTVn`` header keywords.
+
+        """
+        import pyfits as pf
+        HDUList = pf.HDUList()
+        for label, data, header in self.open_arrays(memmap=memmap, frames=frames):
+            HDU = pf.ImageHDU(data) if len(HDUList) else pf.PrimaryHDU(data)
+            for key, value in header_cards(header):
+                HDU.header.update(key, value)
+            if section is not None and data.ndim > 0:
+                slices, starts = section_slices(data.shape, section)
+                HDU.data = data[slices]
+                section_header(HDU.header, starts)
+            if label is not None:
+                HDU.header.update('label', label)
+            HDUList.append(HDU)
+        return HDUList
+
+    def open_arrays(self, memmap=None, frames=None):
+        """Open this file and return a list of ``(label, array, header)`` triples. Frames which are not in *frames* are never opened. See :meth:`open` for the parameters.
+
+        :raises: :exc:`IOError` if a data file doesn't match the ``dtype`` and shape in the descriptor.
+
+        """
+        dirname = os.path.dirname(self.filename)
+        arrays = []
+        for frame in self._descriptor()['frames']:
+            label = frame['label']
+            if label is not None and frames is not None and label not in frames:
+                continue
+            datafile = os.path.join(dirname, frame['data'])
+            if (memmap or memmap is None) and np.prod(frame['shape']):
+                data = np.load(datafile, mmap_mode='c')
+            else:
+                data = np.load(datafile)
+            if data.dtype.str != frame['dtype'] or list(data.shape) != frame['shape']:
+                raise IOError(u"Data file %s does not match its descriptor %s" % (datafile, self.filename))
+            header = collections.OrderedDict((str(key), _header_value(value)) for key, value in frame['header'].items())
+            arrays.append((None if label is None else _header_value(label), data, header))
+        return arrays
+
@@ -88,6 +88,10 @@ class FITSFrame(HDUHeaderMixin,NoDataMixin,BaseFrame):
     :param metadata: dictionary of arbitrary metadata
     
     """
+    
+    __read_types__ = (pf.PrimaryHDU,pf.ImageHDU)
+    __read_naxis__ = (0,)
+    
     def __init__(self, data=None, label=None, header=None, metadata=None, **kwargs):
         super(FITSFrame, self).__init__(data=data, label=label, header=header, metadata=metadata,**kwargs)
     
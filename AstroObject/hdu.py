@@ -67,6 +67,9 @@ class HDUFrame(HDUHeaderMixin,BaseFrame,pf.ImageHDU):
     """
     __metaclass__ = classmaker()
     
+    __save_types__ = (np.ndarray,)
+    __read_types__ = (pf.ImageHDU,pf.PrimaryHDU)
+    
     def __init__(self, data=None, label=None, header=None, metadata=None, **kwargs):
         #self.data = data
         super(HDUFrame, self).__init__(data=None, label=label, header=header, metadata=metadata, **kwargs)
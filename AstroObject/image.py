@@ -39,14 +39,18 @@ To understand IRAF integration of this module, see the methods provided by :mod:
 """
 # Parent Modules
 from .base import HDUHeaderMixin, BaseFrame, BaseStack
+from .ndarray import NDArrayFrame
 
 # Standard Scipy Toolkits
 import numpy as np
 import pyfits as pf
 import scipy as sp
 
+from numpy.lib.stride_tricks import as_strided
+
 # Python Modules
 import os
+import weakref
 
 # Module Utilites
 from .util import getVersion, npArrayInfo
@@ -73,8 +77,86 @@ class ImageFrame(HDUHeaderMixin,BaseFrame):
         super(ImageFrame, self).__init__(data=None, label=label, header=header, metadata=metadata, **kwargs)
         
     
+    __save_types__ = (np.ndarray,)
+    __read_types__ = (pf.ImageHDU,pf.PrimaryHDU)
+    
     def __call__(self):
-        """Returns the data for this frame, which should be a ``numpy.ndarray``."""
+        """Returns the data for this frame, which should be a ``numpy.ndarray``. This is the accessor for changing the data in place, so it makes the copies needed for copy-on-write: a view frame (see :attr:`isview`) first copies its data into a buffer of its own, and a frame with views first gives each of its views its own copy. As the data may then be changed in place, the frame is marked as changed (see :meth:`~AstroObject.base.BaseFrame.touch`). Use :meth:`__data__`, or :meth:`~AstroObject.base.BaseStack.data`, to read the data without copying."""
+        self._release_views()
+        if self.isview:
+            self.materialize()
+        self.touch()
+        return self.data
+    
+    def __data__(self):
+        """Returns the data for this frame for reading only, without the copies made by :meth:`__call__`."""
+        return self.data
+    
+    def __setattr__(self, name, value):
+        """Replacing the data of a frame detaches it from its views, which keep the old buffer."""
+        if name == 'data':
+            for key in ('_source', '_views'):
+                self.__dict__.pop(key, None)
+        super(ImageFrame, self).__setattr__(name, value)
+    
+    @property
+    def isview(self):
+        """Whether this frame's data is a view into the buffer of another frame (see :meth:`view`). View frames share memory with their source until either frame is written through :meth:`__call__`, or :meth:`materialize` is called."""
+        return self.__dict__.get('_source', None) is not None
+        
+    @property
+    def ismapped(self):
+        """Whether this frame's data is backed by a memory-mapped file (see the *memmap* option to :meth:`~AstroObject.base.BaseStack.read`). Pixels of a mapped frame are only read from disk when they are accessed. The mapping is copy-on-write, so modified pixels are held in memory and the file itself is never changed."""
+        base = self.data
+        while base is not None:
+            if isinstance(base,np.memmap):
+                return True
+            base = getattr(base,'base',None)
+        return False
+        
+    def view(self, index, label):
+        """Return a new frame, labeled *label*, whose data is a read-only view of ``self.data[index]``. No data is copied until one of the two frames is written through :meth:`__call__`: the view copies its own region before its first write, and this frame copies the region out to the view before its first write. This frame's data stays writeable, but changes made directly to :attr:`data`, rather than through :meth:`__call__`, are seen by the view.
+        
+        :param index: A ``numpy`` index, usually a tuple of slices.
+        :param string label: The label for the new frame.
+        :returns: A new frame of the same class as this frame.
+        
+        """
+        Object = self.__class__(self.data[index],label)
+        Object.data.flags.writeable = False
+        self._source_frame()._attach_view(Object)
+        return Object
+        
+    def _source_frame(self):
+        """The frame which owns the buffer behind this frame's data."""
+        source = self.__dict__.get('_source', None)
+        return self if source is None else source
+        
+    def _attach_view(self, Object):
+        """Record *Object* as a view of this frame's buffer."""
+        Object.__dict__['_source'] = self
+        self.__dict__.setdefault('_views', []).append(weakref.ref(Object))
+        
+    def _release_views(self):
+        """Copy the data of every view of this frame into buffers owned by the views."""
+        for ref in self.__dict__.pop('_views', []):
+            Object = ref()
+            if Object is not None and Object.__dict__.get('_source', None) is self:
+                Object.materialize()
+        
+    def copy(self, label=None):
+        """Return a re-labeled copy of this frame. Copies of a view frame, or of a frame with views, are views of the same buffer."""
+        _new_frame = super(ImageFrame, self).copy(label)
+        if self.isview or self.__dict__.get('_views', None):
+            _new_frame.__dict__.pop('_views', None)
+            self._source_frame()._attach_view(_new_frame)
+        return _new_frame
+        
+    def materialize(self):
+        """Copy the data of a view or memory-mapped frame into a new, writeable buffer owned by this frame. Frames which already own writeable data are left alone. Returns the frame data."""
+        if self.isview or not self.data.flags.writeable or self.ismapped:
+            LOG.log(2,"Materializing view data for %s" % self)
+            self.data = np.array(self.data,copy=True)
         return self.data
         
     def __valid__(self):
@@ -87,12 +169,16 @@ class ImageFrame(HDUHeaderMixin,BaseFrame):
     
     def __hdu__(self,primary=False):
         """Retruns an HDU which represents this frame. HDUs are either ``pyfits.PrimaryHDU`` or ``pyfits.ImageHDU`` depending on the *primary* keyword."""
+        data = self.data
+        if not data.flags.writeable:
+            # pyfits byte-swaps output data in place, so read-only views must be copied.
+            data = np.array(data,copy=True)
         if primary:
             LOG.log(5,"Generating a primary HDU for %s" % self)
-            HDU = pf.PrimaryHDU(self())
+            HDU = pf.PrimaryHDU(data)
         else:
             LOG.log(5,"Generating an image HDU for %s" % self)
-            HDU = pf.ImageHDU(self())
+            HDU = pf.ImageHDU(data)
         return HDU
     
     def __show__(self):
@@ -104,7 +190,7 @@ class ImageFrame(HDUHeaderMixin,BaseFrame):
         LOG.log(2,"Plotting %s using matplotlib.pyplot.imshow" % self)
         import matplotlib as mpl
         import matplotlib.pyplot as plt
-        figure = plt.imshow(self(),interpolation="nearest")
+        figure = plt.imshow(self.data,interpolation="nearest")
         plt.title(r'\verb"'+self.label+r'"')
         figure.set_cmap('binary_r')
         plt.colorbar()
@@ -116,7 +202,7 @@ class ImageFrame(HDUHeaderMixin,BaseFrame):
         import ds9
         _ds9 = ds9.ds9()
         _ds9.set("frame new")
-        _ds9.set_np2arr(self())
+        _ds9.set_np2arr(self.data)
         _ds9.set("zoom to fit")
         _ds9.set("scale log")
         _ds9.set("cmap sls")
@@ -142,6 +228,11 @@ class ImageFrame(HDUHeaderMixin,BaseFrame):
         LOG.log(2,"Saved %s with size %d" % (Object,data.size))
         return Object
     
+    @classmethod
+    def __reads__(cls,HDU):
+        """Only image HDUs which contain data can be read."""
+        return HDU.header.get('NAXIS',0) > 0
+    
     @classmethod
     def __read__(cls,HDU,label):
         """Attempts to convert a given HDU into an object of type :class:`ImageFrame`. This method is similar to the :meth:`__save__` method, but instead of taking data as input, it takes a full HDU. The use of a full HDU allows this method to check for the correct type of HDU, and to gather header information from the HDU. When reading data from a FITS file, this is the prefered method to initialize a new frame.
@@ -188,10 +279,10 @@ class ImageStack(BaseStack):
             import matplotlib as mpl
             import matplotlib.pyplot as plt
             from matplotlib import cm            
-            X = np.arange(self.data(framename).shape[0])
-            Y = np.arange(self.data(framename).shape[1])
+            Z = self.data(framename,copy=False)
+            X = np.arange(Z.shape[0])
+            Y = np.arange(Z.shape[1])
             X,Y = np.meshgrid(X,Y)
-            Z = self.data(framename)
             LOG.log(2,"3D Plotting: Axis Size %s %s %s" % (X.size, Y.size, Z.size))
             ax = plt.gca(projection='3d')
             surf = ax.plot_surface(X, Y, Z, rstride=1, cstride=1, cmap=cm.jet, linewidth=0, antialiased=False)
@@ -203,7 +294,13 @@ class ImageStack(BaseStack):
     ##########################
     # Manipulating Functions #
     ##########################
-    def mask(self, left, top, right=None, bottom=None, label=None, clobber=True):
+    def _cutout(self, index, label, view=False):
+        """Slice the current frame without copying the whole frame. With ``view=True`` the result is a view frame (see :meth:`ImageFrame.view`), otherwise only the sliced region is copied."""
+        if view:
+            return self.frame().view(index,label)
+        return self.data(copy=False)[index].copy()
+    
+    def mask(self, left, top, right=None, bottom=None, label=None, clobber=True, view=False):
         """Masks the image by the distances provided. This function masks the current frame. Use :meth:`select` to change which frame this method acts on. Masks cut out the edges of images by the specified width.
         
         :param float left: Size to mask off of the left of the image.
@@ -212,16 +309,17 @@ class ImageStack(BaseStack):
         :param float bottom: Size to mask off the bottom of the image. If no size is given, will use ``right``.
         :keyword label: The label to use for saving this masked image.
         :keyword bool clobber: Whether to overwrite the named frame in this stack.
+        :keyword bool view: Save the masked image as a view frame, which shares the parent frame's data until either frame is changed (see :meth:`ImageFrame.view`).
         
         """
         if not right:
             right = left
         if not bottom:
             bottom = top
-        shape  = self.d.shape
-        masked = self.d[left:shape[0]-right,top:shape[1]-bottom]
         if label == None:
             label = "Masked"
+        shape  = self.data(copy=False).shape
+        masked = self._cutout((slice(left,shape[0]-right),slice(top,shape[1]-bottom)),label,view=view)
         LOG.log(2,"Masked masked and saved image")
         self.save(masked,label,clobber=clobber)
         
@@ -234,16 +332,132 @@ class ImageStack(BaseStack):
         :param int ysize: The size of the y direction. If ``None``, will use ``xsize``.
         :keyword label: The label to use for saving this cropped image.
         :keyword clobber: Whether to overwrite the named frame in this stack.
+        :keyword bool view: Save the cropped image as a view frame, which shares the parent frame's data until either frame is changed (see :meth:`ImageFrame.view`).
+        
+        Only the cropped region is copied, so cutting a small region from a large frame is cheap. With ``view=True`` nothing is copied until one of the frames is changed.
         
         """
         ysize = kwargs.pop("ysize",False)
+        view = kwargs.pop("view",False)
         if not ysize:
             ysize = xsize
-        cropped = self.d[x-xsize:x+xsize,y-ysize:y+ysize]
         if not kwargs.get("clobber",False):
             kwargs.setdefault("framename","Cropped")
+        cropped = self._cutout((slice(x-xsize,x+xsize),slice(y-ysize,y+ysize)),kwargs.get("framename",None),view=view)
         return self.save(cropped,**kwargs)
         
+    def cutouts(self, positions, xsize, ysize=None, fill=0, framename=None, clobber=False, select=True):
+        """Extract postage stamps around many positions in the current frame at once. Each stamp is indexed like :meth:`crop`, as ``[x-xsize:x+xsize,y-ysize:y+ysize]``, and stamps which run off the edge of the frame are padded with *fill*.
+        
+        :param positions: A sequence of ``(x,y)`` positions, or a ``(K,2)`` array. Positions are rounded to the nearest pixel, and must lie within the frame.
+        :param int xsize: The half-size of the stamps in the x direction.
+        :param int ysize: The half-size of the stamps in the y direction. If ``None``, will use ``xsize``.
+        :param fill: The value used for stamp pixels which fall outside the frame.
+        :keyword framename: If given, save the stamps as a single :class:`~.ndarray.NDArrayFrame` with this label.
+        :keyword bool clobber: Whether to overwrite the named frame in this stack.
+        :keyword bool select: Whether to select the saved frame.
+        :returns: An array of stamps with shape ``(K,2*xsize,2*ysize)``. When the stamps are saved, this is the saved frame's data.
+        
+        The stamps are gathered from a strided window view of the frame, so this is much faster than calling :meth:`crop` for each position. Only the stamps which cross the edge are padded, so the frame itself is never copied.
+        
+        """
+        if not ysize:
+            ysize = xsize
+        data = self.data(copy=False)
+        positions = np.round(np.asarray(positions)).astype(np.int).reshape((-1,2))
+        x, y = positions[:,0], positions[:,1]
+        if (x < 0).any() or (x > data.shape[0]).any() or (y < 0).any() or (y > data.shape[1]).any():
+            raise ValueError(u"Cutout positions must lie within the frame, shape %r" % (data.shape,))
+        x, y = x - xsize, y - ysize
+        stamps = np.empty((positions.shape[0], 2 * xsize, 2 * ysize),dtype=data.dtype)
+        inside = (x >= 0) & (x + 2 * xsize <= data.shape[0]) & (y >= 0) & (y + 2 * ysize <= data.shape[1])
+        if inside.any():
+            windows = as_strided(data,
+                shape=(data.shape[0] - 2 * xsize + 1, data.shape[1] - 2 * ysize + 1, 2 * xsize, 2 * ysize),
+                strides=data.strides * 2)
+            stamps[inside] = windows[x[inside],y[inside]]
+        for index in np.flatnonzero(~inside):
+            # Stamps which cross the edge are filled, and only the overlap with the frame is copied.
+            LOG.log(2,"Padding cutout %d, which crosses the edge" % index)
+            left, top = max(x[index],0), max(y[index],0)
+            right, bottom = min(x[index] + 2 * xsize,data.shape[0]), min(y[index] + 2 * ysize,data.shape[1])
+            stamps[index].fill(fill)
+            stamps[index,left-x[index]:right-x[index],top-y[index]:bottom-y[index]] = data[left:right,top:bottom]
+        LOG.log(2,"Extracted %d cutouts of shape %r" % (stamps.shape[0],stamps.shape[1:]))
+        if framename is not None:
+            # Stored directly, so the stack's data classes are left alone.
+            if framename in self and not (clobber or self.clobber):
+                raise KeyError(u"Cannot Duplicate State Name: \'%s\' Use this.remove(\'%s\') or clobber=True" % (framename, framename))
+            self._store(framename,NDArrayFrame(stamps,framename))
+            if select:
+                self._select(framename)
+        return stamps
+        
+    def read_region(self, filename, x, y, xsize, ysize=None, **kwargs):
+        """Read only a region of the image frames in a FITS file. The region is indexed like :meth:`crop`, as ``[x-xsize:x+xsize,y-ysize:y+ysize]``, and is clipped at the edge of the image.
+        
+        :param string filename: The FITS file to read.
+        :param int x: The center of the region in the first axis.
+        :param int y: The center of the region in the second axis.
+        :param int xsize: The half-size of the region in the first axis.
+        :param int ysize: The half-size of the region in the second axis. If ``None``, will use ``xsize``.
+        :keyword memmap: Whether to memory-map the file. Defaults to ``True``, so that only the pixels in the region are read.
+        
+        Other keywords are passed to :meth:`~AstroObject.base.BaseStack.read`. The offset of the region is recorded in the IRAF ``LTV1`` and ``LTV2`` keywords, which :meth:`write_region` uses to write the region back in place.
+        
+        ::
+            
+            >>> stack.read_region("Large.fits", 2048, 2048, 64)
+            >>> stack.data().shape
+            (128, 128)
+            
+        """
+        if not ysize:
+            ysize = xsize
+        kwargs.setdefault("memmap",True)
+        section = (slice(max(x-xsize,0),max(x+xsize,0)),slice(max(y-ysize,0),max(y+ysize,0)))
+        return self.read(filename,section=section,**kwargs)
+        
+    def write_region(self, filename, framename=None):
+        """Write a frame read with :meth:`read_region` (or :meth:`~AstroObject.base.BaseStack.read` with ``section=``) back into the region it came from in *filename*. The file is opened in update mode and memory-mapped, so only the pixels in the region are rewritten.
+        
+        :param string filename: The FITS file to update.
+        :param string framename: The frame to write. Defaults to the selected frame.
+        :raises: :exc:`ValueError` when no HDU matches the frame's ``label``, or the frame does not fit in the HDU.
+        
+        The target HDU is the one whose ``label`` matches the frame's ``label`` header keyword. Frames without a ``label`` keyword are written into the first HDU with data. The region is located from the difference between the IRAF ``LTVn`` keywords in the frame's header and those already in the target HDU, so files which were trimmed by IRAF are handled correctly.
+        
+        """
+        if not framename:
+            framename = self._framename
+        frame = self.frame(framename)
+        data = np.asarray(frame.__data__())
+        header = getattr(frame,"header",None) or {}
+        label = header.get('label',None)
+        HDUList = pf.open(filename,mode='update',memmap=True)
+        try:
+            HDU = None
+            for candidate in HDUList:
+                if candidate.header.get('NAXIS',0) == 0:
+                    continue
+                if label is None or candidate.header.get('label',None) == label:
+                    HDU = candidate
+                    break
+            if HDU is None and label is not None:
+                raise ValueError(u"File %s has no HDU labeled %s to write frame %s into" % (filename,label,framename))
+            if HDU is None:
+                raise ValueError(u"File %s contains no image data to write frame %s into" % (filename,framename))
+            ndim = data.ndim
+            # The frame's LTV includes any LTV the file already had, so only the difference locates the region.
+            starts = [int(round(HDU.header.get('LTV%d' % (ndim - axis),0.0) - header.get('LTV%d' % (ndim - axis),0.0))) for axis in range(ndim)]
+            region = tuple(slice(start,start+length) for start, length in zip(starts,data.shape))
+            if HDU.data.ndim != ndim or any(r.start < 0 or r.stop > n for r, n in zip(region,HDU.data.shape)):
+                raise ValueError(u"Frame %s with shape %r at offset %r does not fit in %s, shape %r" % (framename,data.shape,tuple(starts),filename,HDU.data.shape))
+            HDU.data[region] = data
+            LOG.log(5,u"Wrote frame %s into region %r of %s" % (framename,region,filename))
+        finally:
+            HDUList.close()
+        
     
     def showds9(self,*framenames):
         """Show the frames in DS9.
@@ -29,7 +29,7 @@ There are three types of FITS files provided by :mod:`iraftools`:
     
     :meth:`inpfile <IRAFToolsMixin.iraf.inpfile>` and :meth:`inpatfile <IRAFToolsMixin.iraf.inpatlist>`
     
-    ``in`` files are FITS files which are used as input to an ``iraf`` fucntion. They are created immediately, and will exist untill the :mod:`~AstroObject.iraftools` cleanup stage (:meth:`iraf.done <AstroObject.iraftools.IRAFTools.done>`).
+    ``in`` files are FITS files which are used as input to an ``iraf`` fucntion. They are created immediately in a staging directory which lasts as long as the **stack**, and are named by the content of the **frame**. An unchanged **frame** is only written once, no matter how many times it is used as input. To remove the staged files, call :meth:`iraf.clear <AstroObject.iraftools.IRAFTools.clear>`.
 
 .. describe:: out-file
     
@@ -41,7 +41,7 @@ There are three types of FITS files provided by :mod:`iraftools`:
     
     :meth:`modfile <IRAFToolsMixin.iraf.modfile>` and :meth:`modatfile <IRAFToolsMixin.iraf.modatlist>`
     
-    ``mod`` files are FITS files which will be modified in-place by ``iraf``. These files are created immediately, just like ``in`` files, and are re-loaded automatically during the cleanup stage (:meth:`iraf.done <AstroObject.iraftools.IRAFTools.done>`). To prevent these **frames** from overwriting their original content, use the ``append=`` keyword to append a string to the new **frame** name. You could also make a copy of the original **frame** using
+    ``mod`` files are FITS files which will be modified in-place by ``iraf``. These files are copied from the staged ``in`` file for the **frame**, and are re-loaded automatically during the cleanup stage (:meth:`iraf.done <AstroObject.iraftools.IRAFTools.done>`). To prevent these **frames** from overwriting their original content, use the ``append=`` keyword to append a string to the new **frame** name. You could also make a copy of the original **frame** using
     ::
 	
     	Data["newname"] = Data["oldname"]
@@ -121,6 +121,10 @@ A full examle program can be seen in :ref:`IRAFToolsExample`.
     .. method:: iraf.done()
     
         Cleans up the temporary files, reloading any files which need reloading. Should be called after the IRAF command has completed, before attempting to re-use the stage.
+    
+    .. method:: iraf.clear()
+    
+        Removes the staged input files, and the collected output files. Call this when the **stack** will not be used with IRAF again.
 
 .. _IRAFTools_Shortcuts:
 
@@ -135,6 +139,7 @@ The following shortcuts are bound directly to the **stack** object by the :meth:
 - :meth:`iraf.inatfile <IRAFToolsMixin.iraf.inatfile>` = :meth:`iinat`
 - :meth:`iraf.outatfile <IRAFToolsMixin.iraf.outatfile>` = :meth:`ioutat`
 - :meth:`iraf.modatfile <IRAFToolsMixin.iraf.modatfile>` = :meth:`imodat`
+- :meth:`iraf.clear <IRAFToolsMixin.iraf.clear>` = :meth:`iclear`
 
 :class:`IRAFTools` – API Implementation of IRAF Tools
 -----------------------------------------------------
@@ -159,10 +164,14 @@ from scipy.linalg import norm
 import math, copy, sys, time, logging, os
 import tempfile
 import shutil
+import hashlib
+import collections
+import weakref
 
 # Submodules from this system
 from .util import getVersion
 from .file.fileset import TempFileSet
+from .file.shm import shm_directory
 from .base import BaseStack, Mixin, BaseFrame, NoHDUMixin, NoDataMixin
 from .fits import FITSFrame
 
@@ -181,24 +190,37 @@ class IRAFFrame(NoHDUMixin, NoDataMixin, BaseFrame):
 
 class IRAFTools(object):
     """A class for managing interaction with IRAF"""
+    
+    workers = None
+    """The default number of threads used to stage the files in an "@"-list. See :meth:`_atfile`."""
+    
+    tmpfs = False
+    """Whether to put temporary files in a memory-backed directory (see :func:`~AstroObject.file.shm.shm_directory`) when no :meth:`directory` is set. IRAF then reads and writes them without touching the disk, but they use memory until :meth:`done` or :meth:`clear` removes them."""
+    
     def __init__(self,Object):
         super(IRAFTools, self).__init__()
         if not isinstance(Object,BaseStack):
             raise ValueError("Object must be an instance of %r" % BaseStack.__name__)
-        self.object = Object
+        self._object = weakref.ref(Object)
         self.module = __module__
         self.log = __log__
         self.FileSet = self.module.TempFileSet
         self._directory = None
         self._collect = {}
+        self._staging = None
+        self._staged = {}
+        self._outputs = {}
         if IRAFFrame not in self.object.data_classes:
             self.object.add_data_class(IRAFFrame)
     
     def __del__(self):
-        """Remove the reference to object, to prevent circularity"""
-        del self.object
-        del self.module
-        del self.FileSet
+        """Remove the staged files. The **stack** is only held through a weak reference, so this object is not part of a reference cycle, and is collected with its **stack**."""
+        self.clear()
+    
+    @property
+    def object(self):
+        """The **stack** which uses these tools, or ``None`` once it has been deleted."""
+        return self._object()
     
     @property
     def active(self):
@@ -209,9 +231,32 @@ class IRAFTools(object):
     def set(self):
         """Unique new set stored at the module level."""
         if self.module.IRAFSet is None or (not self.module.IRAFSet.open):
-            self.module.IRAFSet = self.FileSet(base=self._directory)
+            self.module.IRAFSet = self.FileSet(base=self.base)
         return self.module.IRAFSet
     
+    @property
+    def base(self):
+        """The directory which holds the temporary file sets. This is the directory set by :meth:`directory`, or, if :attr:`tmpfs` is enabled, a memory-backed directory. Otherwise it is ``None``, which uses the system temporary directory."""
+        if self._directory is None and self.tmpfs:
+            return shm_directory()
+        return self._directory
+    
+    @property
+    def staging(self):
+        """The staging set for this object, which holds input files named by their content. Unlike :attr:`set`, it is not closed by :meth:`done`."""
+        if self._staging is None or (not self._staging.open):
+            self._staging = self.FileSet(base=self.base,name='stage',autodiscover=False)
+            self._staged = {}
+        return self._staging
+    
+    def clear(self):
+        """Remove the staging set, and all of the files staged in it."""
+        if self._staging is not None and self._staging.open:
+            self._staging.close(check=False)
+        self._staging = None
+        self._staged = {}
+        self._outputs = {}
+    
     def capture_log(self,filename="logfile"):
         """This attempts to capture a file named 'logfile' in the current working directory. If is is found, it is passed to both this module's logger and an IRAF logger."""
         messages = 0
@@ -249,6 +294,8 @@ class IRAFTools(object):
     def inpfile(self,framename=None,extension='.fits',**kwargs):
         """Returns a filename for a ``fits`` file from the given framename which can be used as input for IRAF tasks. This method should be used for files which will not be modified, as modifications will not be captured by the system. For files which are input, but will be modified, use :meth:`modfile`.
         
+        Files are written to the :attr:`staging` set, named by the frame's :attr:`~AstroObject.base.BaseFrame.content_hash`. If the frame is unchanged since an earlier call, and the staged file still exists unmodified, that file is returned rather than writing a new one.
+        
         :param framename: The name of the **frame** to use for input.
         :param extension: The file extension to use.
         :returns: Filename for use with PyRAF
@@ -256,10 +303,45 @@ class IRAFTools(object):
         """
         if framename is None:
             framename = self.object.framename
-        filename = self.set.filename(extension=extension,prefix=framename)
-        self.object.write(frames=[framename],filename=filename,clobber=True)
-        self.log.log(2,"Created infile for frame %s named %s" % (framename,filename))
+        filename = self._stage(framename,extension)
         return os.path.relpath(filename)
+        
+    def _stage(self,framename,extension):
+        """Write a frame to the staging set, unless an unmodified file with the same content is already there, and return the filename."""
+        frame = self.object[framename]
+        content_hash = frame.content_hash
+        if content_hash is None:
+            filename = self.set.filename(extension=extension,prefix=framename)
+            self._write_frame(frame,self.object._setup_file(filename=filename))
+            self.log.log(2,"Created infile for frame %s named %s" % (framename,filename))
+            return filename
+        filename = self._staged_filename(framename,content_hash,extension)
+        if self._unchanged(filename,self._staged.get(filename,None)):
+            self.log.log(2,"Reused infile for unchanged frame %s named %s" % (framename,filename))
+            return filename
+        self._write_frame(frame,self.object._setup_file(filename=filename))
+        self._staged_written(filename)
+        self.log.log(2,"Created infile for frame %s named %s" % (framename,filename))
+        return filename
+        
+    def _write_frame(self,frame,FileObject):
+        """Write a single frame to a scratch file object. The file is written directly, rather than with :meth:`~AstroObject.base.BaseStack.write`, so the frame is not marked as written (see :attr:`~AstroObject.base.BaseFrame.dirty`)."""
+        FileObject.write(pf.HDUList([frame.hdu(primary=True)]),clobber=True)
+        
+    def _staged_filename(self,framename,content_hash,extension):
+        """The filename in the staging set for a frame with the given content."""
+        address = hashlib.sha1("%s\x00%s" % (framename,content_hash)).hexdigest()
+        return os.path.join(self.staging.directory,address + extension)
+        
+    def _staged_written(self,filename):
+        """Record a file which has just been written to the staging set."""
+        self.staging.add(filename)
+        self.staging.updated(filename)
+        self._staged[filename] = os.stat(filename).st_mtime
+        
+    def _unchanged(self,filename,mtime):
+        """Whether a file staged by :meth:`inpfile` still exists, and has not been modified since it was written."""
+        return mtime is not None and os.path.exists(filename) and os.stat(filename).st_mtime == mtime
     
     infile = inpfile
         
@@ -287,7 +369,7 @@ class IRAFTools(object):
         return os.path.relpath(filename)
         
     def modfile(self,framename,newframename=None,append=None,extension='.fits',**kwargs):
-        """Returns a filename for a ``fits`` file from the given framename which can be used as input for IRAF tasks which modify a file in-place. The file will be reloaded when :meth:`done` is called.
+        """Returns a filename for a ``fits`` file from the given framename which can be used as input for IRAF tasks which modify a file in-place. The file will be reloaded when :meth:`done` is called. The file is a copy of the staged input file for the frame (see :meth:`inpfile`), so an unchanged frame is not written again.
         
         :param framename: The name of the **frame** to use for input.
         :param newframename: The name of the **frame** to use fo the output. If ``None``, uses ``framename``
@@ -302,7 +384,8 @@ class IRAFTools(object):
         if framename is None:
             framename = self.object.framename
         filename = self.set.filename(extension=extension,prefix=framename)
-        self.object.write(frames=[framename],filename=filename,clobber=True)
+        shutil.copyfile(self._stage(framename,extension),filename)
+        self.set.updated(filename)
         if newframename not in self.object:
             self.object.save(IRAFFrame(data=None,label=newframename),select=False)
         self.log.log(2,"Created modfile for frame %s named %s" % (framename,filename))
@@ -310,22 +393,61 @@ class IRAFTools(object):
         return filename
         
     def _atfile(self,*framenames,**kwargs):
-        """Generic atfile creation routine"""
+        """Generic atfile creation routine.
+        
+        :param framenames: Names of frames to be included in the "@"-list. Defaults to every frame in the **stack**.
+        :keyword function: The filename creation function to call for each frame, e.g. :meth:`inpfile`.
+        :keyword int workers: The number of threads used to write the staged files for each frame. ``None`` or ``1`` writes each file in turn. Defaults to :attr:`workers`.
+        :returns: The "@"-list filename, starting with ``@``.
+        
+        With several workers, the frames for :meth:`inpfile` and :meth:`modfile` are written to the :attr:`staging` set in parallel first. The filename creation function is then called for each frame in turn, and re-uses the staged files, so the "@"-list and the frames collected by :meth:`done` are the same as without workers. The "@"-list itself is written once, after every file has been created.
+        """
         if len(framenames) < 1:
             framenames = self.object.list()
-        atlist = self.set.filename(extension='.list')
-
+        
         function = kwargs.pop('function',None)
         if function is None:
             raise TypeError("Must provide a filename creation function")
+        workers = kwargs.pop('workers',self.workers)
         
+        if workers is not None and workers > 1 and len(framenames) > 1 and function in (self.inpfile,self.modfile):
+            self._stage_many(framenames,kwargs.get('extension','.fits'),workers)
+        filenames = [ function(framename,**kwargs) for framename in framenames ]
+        atlist = self.set.filename(extension='.list')
         with open(atlist,'w') as stream:
-            for framename in framenames:
-                filename = function(framename,**kwargs)
-                stream.write("%s\n" % filename)
+            stream.write("".join("%s\n" % filename for filename in filenames))
+        self.set.updated(atlist)
         self.log.log(2,"Created atlist for frames %s named %s" % (framenames,atlist))
         return "@" + atlist
-
+        
+    def _stage_many(self,framenames,extension,workers):
+        """Stage several frames, like :meth:`_stage`, using a pool of threads. Frames are resolved, hashed and checked against the staging set in the calling thread, so the **stack** is only used from that thread. The threads only build the HDUs and write the files. Frames which can't be hashed are left for :meth:`_stage`."""
+        from multiprocessing.pool import ThreadPool
+        jobs = []
+        for framename in collections.OrderedDict.fromkeys(framenames):
+            frame = self.object[framename]
+            content_hash = frame.content_hash
+            if content_hash is None:
+                continue
+            filename = self._staged_filename(framename,content_hash,extension)
+            if self._unchanged(filename,self._staged.get(filename,None)):
+                continue
+            jobs += [(framename,frame,filename,self.object._setup_file(filename=filename))]
+        if len(jobs) < 1:
+            return
+        def write(job):
+            framename, frame, filename, FileObject = job
+            self._write_frame(frame,FileObject)
+        pool = ThreadPool(min(workers,len(jobs)))
+        try:
+            pool.map(write,jobs)
+        finally:
+            pool.terminate()
+            pool.join()
+        for framename, frame, filename, FileObject in jobs:
+            self._staged_written(filename)
+            self.log.log(2,"Created infile for frame %s named %s" % (framename,filename))
+        
     def modatlist(self,*framenames,**kwargs):
         """File list for modification"""
         kwargs.pop("function",None)
@@ -348,13 +470,21 @@ class IRAFTools(object):
     outatfile = outatlist
         
     def done(self):
-        """Finish the IRAF framename."""
+        """Finish the IRAF framename.
+        
+        Collected files are memory-mapped, and moved into the :attr:`staging` set, so that their data is only read from disk as it is used. Each file is deleted once its **frame** no longer uses it (see :meth:`_release_outputs`)."""
         if not self.active:
             return
+        self._release_outputs()
         for framename,filename in self._collect.iteritems():
-            frames = self.object.read(filename=filename, framename=framename, clobber=True)
-            self.set.updated(filename)
-            self.log.log(2,"Collected file for frame %s named %s" % (framename, filename))
+            frames = self.object.read(filename=filename, framename=framename, clobber=True, memmap=True)
+            staged = os.path.join(self.staging.directory,os.path.basename(filename))
+            # The staging directory may be on another filesystem, e.g. in memory.
+            shutil.move(filename,staged)
+            self.set.delete(filename)
+            self.staging.add(staged)
+            self._outputs[staged] = [ (label,weakref.ref(self.object._frames[label])) for label in frames ]
+            self.log.log(2,"Collected file for frame %s named %s" % (framename, staged))
             self.log.log(2,"States created: %s" % frames)
         self._collect = {}
         self.capture_log()
@@ -362,6 +492,23 @@ class IRAFTools(object):
             self.log.warning("Files remain modified by IRAF: %r" % self.set.modified)
         self.set.close(check=False)
 
+    def _release_outputs(self):
+        """Delete the collected files whose **frames** have been replaced, removed, or copied into memory with :meth:`~AstroObject.image.ImageFrame.materialize`."""
+        if self._staging is None or not self._staging.open:
+            self._outputs = {}
+            return
+        for filename,frames in self._outputs.items():
+            if any(self._uses_output(label,ref()) for label,ref in frames):
+                continue
+            del self._outputs[filename]
+            if filename in self._staging:
+                self._staging.delete(filename)
+            self.log.log(2,"Released collected file for frames %s named %s" % ([ label for label,ref in frames ],filename))
+        
+    def _uses_output(self,label,frame):
+        """Whether *frame*, read from a collected file, is still in the **stack** as *label* and still maps the file."""
+        return frame is not None and self.object._frames.get(label,None) is frame and getattr(frame,'ismapped',False)
+        
     def set_instance_methods(self):
         """Sets the instance shortcut methods on the object."""
         self.object.iin = self.infile
@@ -372,6 +519,7 @@ class IRAFTools(object):
         self.object.imodat = self.modatfile
         self.object.idone = self.done
         self.object.idir = self.directory
+        self.object.iclear = self.clear
         self.object.i = self.wrap
 
 class IRAFToolsMixin(Mixin):
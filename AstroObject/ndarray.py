@@ -50,7 +50,7 @@ import collections
 from .base import BaseFrame,BaseStack,HDUHeaderMixin
 
 # Submodules from this system
-from .util import getVersion
+from .util import getVersion, monotonic
 
 __all__ = ["BaseStack","BaseFrame","AnalyticMixin","NoHDUMixin","HDUHeaderMixin","NoDataMixin"]
 
@@ -60,6 +60,10 @@ LOG = logging.getLogger(__name__)
 
 class NDArrayFrame(HDUHeaderMixin,BaseFrame,np.ndarray):
     """A frame based on np.ndarray"""
+    
+    __save_types__ = (np.ndarray,)
+    __read_types__ = (pf.ImageHDU,pf.PrimaryHDU)
+    
     def __init__(self,*args, **kwargs):
         super(NDArrayFrame, self).__init__(*args, **kwargs)
         
@@ -78,7 +82,7 @@ class NDArrayFrame(HDUHeaderMixin,BaseFrame,np.ndarray):
         else:
             obj.metadata = {}
         if not hasattr(obj,'time'):
-            obj.time = time.clock()
+            obj.time = monotonic()
             LOG.log(2,"Saving NDArrayFrame at time %r" % obj.time)
         obj.__setlabel__(label)
         try:
@@ -96,7 +100,7 @@ class NDArrayFrame(HDUHeaderMixin,BaseFrame,np.ndarray):
             self._label = getattr(obj,'label',None)
             self.time = getattr(obj,'time',None)
         if not hasattr(self,'time') or self.time is None:
-            self.time = time.clock()
+            self.time = monotonic()
             LOG.log(2,"Setting NDArrayFrame at time %r" % self.time)
         if isinstance(self.header,pf.core.Header):
             #Nothing to do when we are already with the correct header type.
@@ -174,6 +178,11 @@ class NDArrayFrame(HDUHeaderMixin,BaseFrame,np.ndarray):
         LOG.log(2,"Created %s" % Object)
         return Object
         
+    @classmethod
+    def __reads__(cls,HDU):
+        """Only image HDUs which contain data can be read."""
+        return HDU.header.get('NAXIS',0) > 0
+    
     @classmethod
     def __read__(cls,HDU,label):
         """Read some data for this class from a HDU"""
@@ -275,7 +275,7 @@ from .loggers import *
 
 import util.pbar as progressbar
 import util.terminal as terminal
-from util import getVersion, npArrayInfo, func_lineno, make_decorator
+from util import getVersion, npArrayInfo, func_lineno, make_decorator, monotonic
 
 __all__ = ["Simulator","on_collection","help","replaces","excepts","depends","triggers","include","optional","description","collect","ignore","on_instance_collection"]
 
@@ -434,7 +434,7 @@ class Stage(object):
         
     def run(self):
         """Run the stage"""
-        self.startTime = time.clock()
+        self.startTime = monotonic()
         try:
             self.ran = True
             self.do()
@@ -443,7 +443,7 @@ class Stage(object):
         else:
             self.complete = True
         finally:
-            self.endTime = time.clock()
+            self.endTime = monotonic()
             self.durTime = self.endTime - self.startTime
 
 class SimulatorStateError(Exception):
@@ -187,6 +187,12 @@ class SpectraMixin(base.Mixin):
 
 class SpectraFrame(SpectraMixin,base.HDUHeaderMixin,base.BaseFrame):
     """A single frame of a spectrum. This will save the spectrum as an image, with the first row having flux, and second row having the wavelength equivalent. Further rows can accomodate further spectral frames when stored to a FITS image. However, the frame only accepts a single spectrum."""
+    
+    __save_types__ = (np.ndarray,)
+    __save_ndim__ = (2,)
+    __read_types__ = (pf.ImageHDU,pf.PrimaryHDU)
+    __read_naxis__ = (2,)
+    
     def __init__(self, data=None, label=None, header=None, metadata=None, **kwargs):
         self.data = data # The image data
         self.size = data.size # The size of this image
@@ -218,6 +224,16 @@ class SpectraFrame(SpectraMixin,base.HDUHeaderMixin,base.BaseFrame):
         return HDU
     
     
+    @classmethod
+    def __accepts__(cls,data):
+        """Spectra must have two rows, flux and wavelength."""
+        return getattr(data,"ndim",0) == 2 and data.shape[0] == 2
+    
+    @classmethod
+    def __reads__(cls,HDU):
+        """Spectra must have two rows, flux and wavelength."""
+        return HDU.header.get('NAXIS2',0) == 2
+    
     @classmethod
     def __save__(cls,data,label):
         """Attempts to create a :class:`ImageFrame` object from the provided data. This requres some type checking to ensure that the provided data meets the general sense of such an image. If the data does not appear to be correct, this method will raise an :exc:`NotImplementedError` with a message describing why the data did not validate. Generally, this error will be intercepted by the caller, and simply provides an indication that this is not the right class for a particular piece of data.
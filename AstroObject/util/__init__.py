@@ -30,6 +30,9 @@ Provides utilities useful in various places in the module.
 .. automethod::
     AstroObject.util.npArrayInfo
     
+.. automethod::
+    AstroObject.util.monotonic
+    
 .. automodule::
     AstroObject.util.functions
     
@@ -47,6 +50,8 @@ from __future__ import division
 import os
 import collections
 import sys
+import time
+import threading
 
 import numpy as np
 
@@ -54,7 +59,7 @@ from ..version import version as versionstr
 
 from .. import __libdebug__
 
-__all__ = [ "getVersion", "validate_filename", "update", "func_lineno", "make_decorator", "npArrayInfo", "ConfigurationError"]
+__all__ = [ "getVersion", "validate_filename", "update", "func_lineno", "make_decorator", "npArrayInfo", "monotonic", "ConfigurationError"]
 
 __version__ = versionstr
 
@@ -203,6 +208,22 @@ def npArrayInfo(array,name=None):
         MSG = "%(name)s doesn't appear to be a Numpy Array! Type: %(type)s"
     return MSG % fmtr
 
+if hasattr(time, 'monotonic'):
+    monotonic = time.monotonic
+else:
+    _monotonic_lock = threading.Lock()
+    _monotonic_last = [0.0]
+    
+    def monotonic():
+        """Return the value of a clock which never goes backwards, in fractional seconds. This is :func:`time.monotonic` where it is available. Otherwise, :func:`time.time` is used and clamped so that it never decreases within this process.
+        
+        Unlike :func:`time.clock`, this measures elapsed time rather than CPU time, so it is suitable for ordering events.
+        """
+        with _monotonic_lock:
+            now = max(time.time(), _monotonic_last[0])
+            _monotonic_last[0] = now
+        return now
+
 def set_trace_errors(*exceptions):
     """This sets the stack trace for the specified exceptions to this calling method, for user debugging simplicity.
     
@@ -13,12 +13,156 @@ u"""
 .. automethod:: 
     AstroObject.util.images.bin
 
+.. automethod::
+    AstroObject.util.images.block_view
+
 """
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+REDUCERS = {
+    'sum' : np.sum,
+    'mean' : np.mean,
+    'median' : np.median,
+}
+"""Reduction functions which can be used by :func:`bin`."""
+
+def _bin_factors(array, factor, xfactor=None):
+    """Expand the binning factors into a tuple with one integer factor per axis of *array*."""
+    if isinstance(factor, (tuple, list)):
+        factors = tuple(int(f) for f in factor)
+        if xfactor is not None:
+            raise TypeError(u"Cannot specify xfactor=%r with per-axis factors %r" % (xfactor, factor))
+    elif xfactor is not None:
+        factors = (int(factor), int(xfactor)) + (1,) * (array.ndim - 2)
+    else:
+        factors = (int(factor),) * array.ndim
+    if len(factors) != array.ndim:
+        raise ValueError(u"Binning factors %r do not match an array with %d dimensions." % (factors, array.ndim))
+    if min(factors) < 1:
+        raise ValueError(u"Binning factors must be positive integers, got %r" % (factors,))
+    return factors
+
+def _pad_to_factors(array, factors, fill):
+    """Return a copy of *array* padded with *fill* at the end of each axis, so that each axis is a multiple of its factor."""
+    shape = tuple(-(-n // f) * f for n, f in zip(array.shape, factors))
+    if shape == array.shape:
+        return array
+    padded = np.empty(shape, dtype=np.result_type(array.dtype, np.min_scalar_type(fill) if np.isfinite(fill) else np.float64))
+    padded.fill(fill)
+    padded[tuple(slice(0, n) for n in array.shape)] = array
+    return padded
+
+def _bin_counts(shape, factors):
+    """Return the number of pixels of an array with *shape* which fall in each bin, counting partial bins at the end of each axis."""
+    counts = np.ones((), dtype=np.int64)
+    for n, f in zip(shape, factors):
+        counts = np.multiply.outer(counts, np.minimum(f, n - np.arange(-(-n // f)) * f))
+    return counts
+
+def block_view(array, factors):
+    """Return a zero-copy view of *array* with shape ``(n0, f0, n1, f1, ...)``, where each ``f`` is the binning factor for that axis and each ``n`` is the number of whole blocks along that axis. Partial blocks at the end of each axis are ignored.
+
+    The view is built with :func:`numpy.lib.stride_tricks.as_strided`, so no data is read or copied. This makes it safe to use on memory-mapped arrays.
+
+    :param array: The array to view as blocks.
+    :param tuple factors: One integer block size per axis.
+    :returns: A strided view of the array.
+    """
+    array = np.asanyarray(array)
+    shape, strides = (), ()
+    for n, f, s in zip(array.shape, factors, array.strides):
+        shape += (n // f, f)
+        strides += (s * f, s)
+    return as_strided(array, shape=shape, strides=strides)
+
+def _reduce_blocks(blocks, func, dtype=None):
+    """Reduce a block view (from :func:`block_view`) over its block axes using the named reduction *func*."""
+    ndim = blocks.ndim // 2
+    if func in ('median', 'nanmedian'):
+        # Median can't be applied one axis at a time, so gather each block into a single trailing axis.
+        order = tuple(range(0, 2 * ndim, 2)) + tuple(range(1, 2 * ndim, 2))
+        outshape = blocks.shape[0::2]
+        gathered = blocks.transpose(order).reshape(outshape + (-1,))
+        return getattr(np, func)(gathered, axis=-1)
+    result = blocks
+    for axis in range(2 * ndim - 1, 0, -2):
+        result = result.sum(axis=axis, dtype=dtype)
+    if func == 'mean':
+        result = result / float(np.prod(blocks.shape[1::2]))
+    return result
+
+def _accumulator(dtype):
+    """Return a wide ``dtype`` to accumulate sums of *dtype* in, so that sums of small integer and float types do not overflow."""
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'bi':
+        return np.dtype(np.int64)
+    elif dtype.kind == 'u':
+        return np.dtype(np.uint64)
+    elif dtype.kind == 'f':
+        return np.result_type(dtype, np.float64)
+    elif dtype.kind == 'c':
+        return np.result_type(dtype, np.complex128)
+    return None
+
+def bin(array, factor, xfactor=None, func='sum', remainder='trim', fill=0, chunksize=None):
+    """Bins an array by the given factor in each axis.
+
+    :param array: The array to bin. This can be a :class:`numpy.memmap`, in which case the array is binned in chunks.
+    :param factor: An integer factor to use on every axis, or a tuple with a factor for each axis, in ``numpy`` axis order. When *xfactor* is given, *factor* is the factor for the first ``numpy`` axis (rows, or y).
+    :param int xfactor: The binning factor for the second ``numpy`` axis (columns, or x).
+    :param string func: The reduction to apply within each bin, one of ``sum``, ``mean`` or ``median``. Sums are accumulated in a 64-bit type, so they don't overflow for small integer types.
+    :param string remainder: How to handle axes which are not a multiple of their factor. ``trim`` drops the partial bins, ``pad`` keeps them. Only the partial bins are padded, so memory-mapped arrays are still binned in chunks.
+    :param fill: The value used to pad partial bins of a ``sum`` when ``remainder='pad'``. The ``mean`` and ``median`` of a partial bin only use the pixels which are in the array.
+    :param int chunksize: The number of output rows to compute at once. Defaults to the whole array, except for memory-mapped arrays, which are binned a few rows at a time so that they are never loaded in full.
+    :returns: The binned array.
+
+    ::
+
+        >>> bin(np.ones((4,6)), 2)
+        array([[ 4.,  4.,  4.],
+               [ 4.,  4.,  4.]])
+        >>> bin(np.ones((4,6)), 2, 3, func='mean')
+        array([[ 1.,  1.],
+               [ 1.,  1.]])
+
+    """
+    array = np.asanyarray(array)
+    factors = _bin_factors(array, factor, xfactor)
+    if func not in REDUCERS:
+        raise ValueError(u"Unknown binning function %r, use one of %r" % (func, sorted(REDUCERS.keys())))
+    if remainder == 'pad':
+        rows = -(-array.shape[0] // factors[0])
+    elif remainder == 'trim':
+        rows = array.shape[0] // factors[0]
+    else:
+        raise ValueError(u"Unknown remainder mode %r, use 'trim' or 'pad'" % remainder)
+    dtype = _accumulator(array.dtype) if func != 'median' else None
+
+    def reduce_rows(start, stop):
+        """Bin the output rows from *start* to *stop*, padding the input rows only if they hold partial bins."""
+        piece = array[start * factors[0]:stop * factors[0]]
+        if remainder == 'pad' and func == 'median':
+            padded = _pad_to_factors(piece, factors, np.nan)
+            if padded is not piece:
+                return np.asarray(_reduce_blocks(block_view(padded, factors), 'nanmedian'))
+        elif remainder == 'pad' and func == 'mean':
+            padded = _pad_to_factors(piece, factors, 0)
+            if padded is not piece:
+                return np.asarray(_reduce_blocks(block_view(padded, factors), 'sum', dtype) / _bin_counts(piece.shape, factors))
+        elif remainder == 'pad':
+            piece = _pad_to_factors(piece, factors, fill)
+        return np.asarray(_reduce_blocks(block_view(piece, factors), func, dtype))
+
+    if chunksize is None and isinstance(array, np.memmap):
+        chunksize = max(1, (2 ** 24) // max(1, array[:factors[0]].nbytes))
+    if chunksize is None or chunksize >= rows:
+        return reduce_rows(0, rows)
 
-def bin(array,factor):
-    """Bins an array by the given factor in each axis."""
-    Aout = np.zeros(tuple((np.array(array.shape) / factor).astype(np.int)), dtype=array.dtype)
-    for i in range(factor):
-        Aout += array[i::factor,i::factor]
-    return Aout
+    result = None
+    for start in range(0, rows, chunksize):
+        chunk = reduce_rows(start, min(start + chunksize, rows))
+        if result is None:
+            result = np.empty((rows,) + chunk.shape[1:], dtype=chunk.dtype)
+        result[start:start+chunksize] = chunk
+    return result
@@ -14,7 +14,7 @@ import time
 
 import nose.tools as nt
 
-from AstroObject.file.fileset import FileSet
+from AstroObject.file.fileset import FileSet, YAMLDatabase, LEGACY_DBFILEBASE, DEFAULT_DBFILEBASE
 
 class BaseFileSetTests(object):
     """Base fileset testing API"""
@@ -281,6 +281,67 @@ class BaseFileSetTests(object):
         self.FsInstance.delete(self.STATIC_FILE_PATH)
         
         
+    def test_persist_reload(self):
+        """persistant filesets reload their files"""
+        self.FsInstance = self.FsClass(self.BASE,self.NAME,autodiscover=False,persist=True)
+        self.FsInstance.register(self.STATIC_FILE,self.MISSING_FILE)
+        self.FsInstance.delete(self.MISSING_FILE)
+        self.FsInstance.close(check=False,clean=False)
+        self.FsInstance = self.FsClass(self.BASE,self.NAME,autodiscover=False,persist=True)
+        assert self.FsInstance.files == [ self.STATIC_FILE ], "Unexpected .files == %r" % self.FsInstance.files
+        
+    def test_persist_reload_yaml(self):
+        """persistant filesets reload their files from YAML databases"""
+        self.FsInstance = self.FsClass(self.BASE,self.NAME,autodiscover=False,persist=True,dbfilebase=self.ALT_DBFILENAME)
+        self.FsInstance.register(self.STATIC_FILE)
+        assert os.path.exists(os.path.join(self.FsInstance.directory,self.ALT_DBFILENAME))
+        self.FsInstance.close(check=False,clean=False)
+        self.FsInstance = self.FsClass(self.BASE,self.NAME,autodiscover=False,persist=True,dbfilebase=self.ALT_DBFILENAME)
+        assert self.FsInstance.files == [ self.STATIC_FILE ]
+        
+    def test_persist_legacy(self):
+        """persistant filesets load databases left by earlier versions"""
+        legacy = os.path.join(self.BASE,self.NAME,LEGACY_DBFILEBASE)
+        YAMLDatabase(legacy).save({self.STATIC_FILE:1.0},None,datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),False)
+        self.FsInstance = self.FsClass(self.BASE,self.NAME,autodiscover=False,persist=True)
+        assert self.FsInstance.files == [ self.STATIC_FILE ]
+        assert not os.path.exists(legacy)
+        
+    def test_batch_method(self):
+        """.batch() writes the database once"""
+        self.FsInstance = self.FsClass(self.BASE,self.NAME,autodiscover=False,persist=True)
+        dbfilename = os.path.join(self.FsInstance.directory,DEFAULT_DBFILEBASE)
+        with self.FsInstance.batch():
+            self.FsInstance.register(self.STATIC_FILE)
+            with self.FsInstance.batch():
+                self.FsInstance.register(self.MISSING_FILE)
+            assert not os.path.exists(dbfilename), "Database should not be written inside a batch"
+        assert os.path.exists(dbfilename)
+        self.FsInstance.close(check=False,clean=False)
+        self.FsInstance = self.FsClass(self.BASE,self.NAME,autodiscover=False,persist=True)
+        assert sorted(self.FsInstance.files) == sorted([ self.STATIC_FILE, self.MISSING_FILE ])
+        
+    @nt.raises(KeyError)
+    def test_batch_error(self):
+        """.batch() raises the error from inside the batch, even if the database can't be written"""
+        self.FsInstance = self.FsClass(self.BASE,self.NAME,autodiscover=False,persist=True)
+        def save(*args):
+            raise IOError("Database is not writable")
+        self.FsInstance._db.save = save
+        try:
+            with self.FsInstance.batch():
+                self.FsInstance.register(self.STATIC_FILE)
+                raise KeyError(self.STATIC_FILE)
+        finally:
+            del self.FsInstance._db.save
+        
+    def test_database_fallback(self):
+        """unknown database extensions use YAML databases"""
+        self.FsInstance = self.FsClass(self.BASE,self.NAME,autodiscover=False,persist=True,dbfilebase=".AOFSdb")
+        self.FsInstance.register(self.STATIC_FILE)
+        assert isinstance(self.FsInstance._db,YAMLDatabase)
+        
+        
 class test_FileSet(BaseFileSetTests):
     """AstroObject.file.fileset.FileSet"""
     FsClass = FileSet
@@ -13,6 +13,10 @@ from tests.apitests import *
 
 # Parent Object Imports
 import AstroObject.image
+import AstroObject.spectra
+import AstroObject.file.npy
+import AstroObject.file.plaintext
+import AstroObject.fits
 
 # Testing Imports
 import nose.tools as nt
@@ -27,7 +31,7 @@ import matplotlib.pyplot as plt
 import matplotlib.image as mpimage
 
 # Python Imports
-import math, copy, sys, time, logging, os
+import math, copy, sys, time, logging, os, shutil, tempfile, threading
 
 class equality_ImageFrame(equality_Base):
     """Equality methods for FITSFrames"""
@@ -88,7 +92,7 @@ class test_ImageStack(equality_ImageFrame,API_BaseStack):
         """Fixture for setting up a basic image frame"""
         self.testJPG = "Data/Hong-Kong.jpg"
         self.data = [self.testJPG]
-        self.files = ["TestFile.fits","TestFile.dat","TestFile.npy"]
+        self.files = ["TestFile.fits","TestFile.dat","TestFile.npy","TestFile.npz","TestFile.h5","TestFile.aotxt","TestFile.gz","TestFile.dump"]
         if not os.access(self.testJPG,os.R_OK):
             self.image = np.zeros((1000,1000))
             self.image[450:550,450:550] = np.ones((100,100))
@@ -128,7 +132,767 @@ class test_ImageStack(equality_ImageFrame,API_BaseStack):
         AObject = self.OBJECT()
         AObject.save(self.frame())
         AObject.crop(500,500,40)
-    
+        assert AObject.d.shape == (80,80)
+        assert self.data_eq_data(AObject.d,self.image[460:540,460:540])
+        assert not AObject.frame().isview
+
+    def test_crop_view(self):
+        """crop(view=True) shares the parent frame's data"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.crop(500,500,40,view=True)
+        cropped = AObject.frame()
+        assert cropped.isview
+        assert np.may_share_memory(AObject.data(copy=False),AObject.data(self.FLABEL,copy=False))
+        assert self.data_eq_data(AObject.d,self.image[460:540,460:540])
+        cropped.materialize()
+        assert not cropped.isview
+        cropped()[0,0] = -1.0
+        assert AObject.frame(self.FLABEL)()[460,460] != -1.0
+
+    def test_crop_view_child_write(self):
+        """Writing to a view frame copies its data first"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.crop(500,500,40,framename="Cropped",view=True)
+        cropped = AObject.frame("Cropped")
+        cropped()[0,0] = -1.0
+        assert not cropped.isview
+        assert AObject.data("Cropped")[0,0] == -1.0
+        assert AObject.data(self.FLABEL)[460,460] == self.image[460,460]
+        assert not np.may_share_memory(AObject.data("Cropped",copy=False),AObject.data(self.FLABEL,copy=False))
+
+    def test_crop_view_parent_write(self):
+        """Writing to the parent frame detaches its views first"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.crop(500,500,40,framename="Cropped",view=True)
+        original = AObject.data("Cropped")
+        parent = AObject.frame(self.FLABEL)
+        parent()[460,460] = -1.0
+        assert AObject.data(self.FLABEL)[460,460] == -1.0
+        assert not AObject.frame("Cropped").isview
+        assert self.data_eq_data(AObject.d,original)
+        parent()[461,461] = -2.0
+        assert AObject.data("Cropped")[1,1] == original[1,1]
+
+    def test_crop_view_parent_writeable(self):
+        """Frames with views keep writeable data"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.mask(10,10,view=True)
+        parent = AObject.frame(self.FLABEL)
+        assert parent.data.flags.writeable
+        parent.data[0,0] = -1.0
+        assert AObject.data(self.FLABEL)[0,0] == -1.0
+
+    def test_cutouts(self):
+        """cutouts() matches crop() around each position"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        positions = [(500,500),(460,530),(100,900)]
+        stamps = AObject.cutouts(positions,20,ysize=10)
+        assert stamps.shape == (3,40,20)
+        for stamp,(x,y) in zip(stamps,positions):
+            AObject.select(self.FLABEL)
+            AObject.crop(x,y,20,ysize=10,framename="Stamp",clobber=True)
+            assert self.data_eq_data(stamp,AObject.d)
+
+    def test_cutouts_edge_padding(self):
+        """cutouts() pads stamps which cross the frame edge"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        stamps = AObject.cutouts([(0,0),(1000,1000)],10,fill=-1)
+        assert stamps.shape == (2,20,20)
+        assert (stamps[0,:10,:] == -1).all()
+        assert self.data_eq_data(stamps[0,10:,10:],self.image[:10,:10])
+        assert (stamps[1,10:,:] == -1).all()
+
+    def test_cutouts_edge_and_interior(self):
+        """cutouts() pads edge stamps without changing interior stamps"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        stamps = AObject.cutouts([(500,500),(5,995)],10,fill=-1)
+        assert self.data_eq_data(stamps[0],self.image[490:510,490:510])
+        assert (stamps[1,:5,:] == -1).all() and (stamps[1,:,15:] == -1).all()
+        assert self.data_eq_data(stamps[1,5:,:15],self.image[0:15,985:1000])
+
+    def test_cutouts_saved_as_one_frame(self):
+        """cutouts(framename=...) saves a single NDArrayFrame"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        stamps = AObject.cutouts([(500,500),(450,450)],5,framename="Stamps")
+        assert AObject.framename == "Stamps"
+        assert isinstance(AObject.frame(),AstroObject.ndarray.NDArrayFrame)
+        assert AstroObject.ndarray.NDArrayFrame not in AObject.data_classes
+        assert self.data_eq_data(AObject.d,stamps)
+
+    def test_mask_view(self):
+        """mask(view=True) shares the parent frame's data and can be written"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.mask(10,10,view=True)
+        assert AObject.frame().isview
+        assert AObject.d.shape == (self.image.shape[0]-20,self.image.shape[1]-20)
+        AObject.write("TestFile.fits",clobber=True)
+        BObject = self.OBJECT()
+        BObject.read("TestFile.fits")
+        assert self.data_eq_data(BObject.data("Masked"),self.image[10:-10,10:-10])
+
+    def test_read_memmap(self):
+        """read(memmap=True) keeps frame data backed by the file"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.write("TestFile.fits",clobber=True)
+        BObject = self.OBJECT()
+        BObject.read("TestFile.fits",memmap=True)
+        frame = BObject.frame()
+        assert frame.ismapped
+        assert self.data_eq_data(frame(),self.image)
+        frame()[0,0] = -1.0
+        CObject = self.OBJECT()
+        CObject.read("TestFile.fits",memmap=False)
+        assert not CObject.frame().ismapped
+        assert CObject.d[0,0] != -1.0
+        frame.materialize()
+        assert not frame.ismapped
+        assert frame()[0,0] == -1.0
+        
+    def test_read_section(self):
+        """read(section=...) reads only part of each image"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.write("TestFile.fits",clobber=True)
+        BObject = self.OBJECT()
+        BObject.read("TestFile.fits",section=(slice(10,20),slice(5,25)))
+        assert self.data_eq_data(BObject.d,self.image[10:20,5:25])
+        assert BObject.frame().header["LTV2"] == -10
+        assert BObject.frame().header["LTV1"] == -5
+        CObject = self.OBJECT()
+        CObject.read("TestFile.fits",section=(slice(10,20),),lazy=True)
+        assert self.data_eq_data(CObject.d,self.image[10:20])
+        
+    def test_read_write_region(self):
+        """read_region() and write_region() update a region in place"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.write("TestFile.fits",clobber=True)
+        BObject = self.OBJECT()
+        BObject.read_region("TestFile.fits",30,40,5,8)
+        assert self.data_eq_data(BObject.d,self.image[25:35,32:48])
+        BObject.frame()()[...] += 1
+        BObject.write_region("TestFile.fits")
+        expected = self.image.copy()
+        expected[25:35,32:48] += 1.0
+        CObject = self.OBJECT()
+        CObject.read("TestFile.fits")
+        assert self.data_eq_data(CObject.d,expected)
+        
+    def test_write_region_existing_ltv(self):
+        """write_region() allows for LTV keywords already in the file"""
+        HDU = pf.PrimaryHDU(self.image)
+        HDU.header.update('LTV1',-10.0)
+        HDU.header.update('LTV2',-10.0)
+        HDU.writeto("TestFile.fits",clobber=True)
+        BObject = self.OBJECT()
+        BObject.read_region("TestFile.fits",50,50,5)
+        assert BObject.frame().header["LTV1"] == -55
+        assert self.data_eq_data(BObject.d,self.image[45:55,45:55])
+        BObject.frame()()[...] += 1
+        BObject.write_region("TestFile.fits")
+        expected = self.image.copy()
+        expected[45:55,45:55] += 1.0
+        assert self.data_eq_data(pf.getdata("TestFile.fits"),expected)
+        
+    @nt.raises(ValueError)
+    def test_write_region_unknown_label(self):
+        """write_region() refuses a frame whose label matches no HDU"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.write("TestFile.fits",clobber=True)
+        BObject = self.OBJECT()
+        BObject.read_region("TestFile.fits",30,40,5,8)
+        BObject.frame().header["label"] = "Missing"
+        BObject.write_region("TestFile.fits")
+        
+    def test_read_lazy(self):
+        """read(lazy=True) decodes frame data on first access"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.save(self.image * 2.0,"Double")
+        AObject.write("TestFile.fits",clobber=True)
+        BObject = self.OBJECT()
+        labels = BObject.read("TestFile.fits",lazy=True)
+        assert set(labels) == set([self.FLABEL,"Double"])
+        assert isinstance(BObject._frames["Double"],AstroObject.base.LazyFrame)
+        assert BObject._frames["Double"].header["label"] == "Double"
+        assert self.data_eq_data(BObject.data("Double"),self.image * 2.0)
+        assert isinstance(BObject._frames["Double"],self.FRAME)
+        assert isinstance(BObject._frames[self.FLABEL],AstroObject.base.LazyFrame)
+        
+    def test_read_frames_filter(self):
+        """read(frames=[...]) skips unrequested HDUs"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.save(self.image * 2.0,"Double")
+        AObject.write("TestFile.fits",clobber=True)
+        BObject = self.OBJECT()
+        labels = BObject.read("TestFile.fits",frames=["Double"])
+        assert labels == ["Double"]
+        assert BObject.list() == ["Double"]
+        assert self.data_eq_data(BObject.d,self.image * 2.0)
+        
+    def test_save_dispatch(self):
+        """save() only tries data classes which accept the data"""
+        AObject = self.OBJECT(dataClasses=[AstroObject.spectra.SpectraFrame,self.FRAME])
+        AObject.save(self.image,"Image")
+        assert isinstance(AObject.frame(),self.FRAME)
+        AObject.save(np.ones((2,10)),"Spectrum")
+        assert isinstance(AObject.frame(),AstroObject.spectra.SpectraFrame)
+        assert AObject._save_classes(self.image) == [self.FRAME]
+        assert AObject._save_classes(np.ones((3,))) == [self.FRAME]
+        assert AObject._save_classes(self.INVALID) == []
+        
+    def test_read_dispatch(self):
+        """read() classifies HDUs from their headers"""
+        HDUs = pf.HDUList([pf.PrimaryHDU()] + [pf.ImageHDU(self.image) for i in range(3)])
+        HDUs.writeto("TestFile.fits",clobber=True)
+        AObject = self.OBJECT(dataClasses=[AstroObject.spectra.SpectraFrame,self.FRAME])
+        assert AObject._read_classes(HDUs[0]) == []
+        assert AObject._read_classes(HDUs[1]) == [self.FRAME]
+        assert AObject._read_classes(pf.ImageHDU(np.ones((2,10)))) == [AstroObject.spectra.SpectraFrame,self.FRAME]
+        assert AObject._read_classes(pf.ImageHDU(np.ones((2,10)))) == [AstroObject.spectra.SpectraFrame,self.FRAME]
+        labels = AObject.read("TestFile.fits",framename="Extension")
+        assert len(labels) == 3
+        assert all(isinstance(AObject.frame(label),self.FRAME) for label in labels)
+        AObject.add_data_class(AstroObject.fits.FITSFrame)
+        assert AObject._read_classes(HDUs[0]) == [AstroObject.fits.FITSFrame]
+        
+    def test_default_frame_tracks_newest(self):
+        """framename falls back to the newest remaining frame"""
+        AObject = self.OBJECT()
+        labels = [ "Frame%d" % i for i in range(50) ]
+        for label in labels:
+            AObject.save(self.image,label,select=False)
+        assert AObject.framename == labels[-1]
+        AObject.remove(labels[-1])
+        assert AObject.framename == labels[-2]
+        AObject.keep(*labels[10:20])
+        assert AObject.framename == labels[19]
+        assert AObject._default_frame(labels[10:15]) == labels[14]
+        
+    def test_data_without_copy(self):
+        """data(copy=False) returns a read-only view of the frame data"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        view = AObject.data(copy=False)
+        assert np.may_share_memory(view,AObject.frame()())
+        assert not view.flags.writeable
+        assert AObject.frame()().flags.writeable
+        assert not np.may_share_memory(AObject.data(),AObject.frame()())
+        
+    def test_save_many(self):
+        """save_many() saves every frame and selects the last"""
+        AObject = self.OBJECT()
+        labels = AObject.save_many([("A",self.image),("B",self.image * 2.0),self.frame()])
+        assert labels == ["A","B",self.FLABEL]
+        assert AObject.framename == self.FLABEL
+        assert self.data_eq_data(AObject.data("B"),self.image * 2.0)
+        
+    @nt.raises(KeyError)
+    def test_save_many_checks_before_saving(self):
+        """save_many() saves nothing if one frame would be overwritten"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        try:
+            AObject.save_many([("A",self.image),self.frame()])
+        finally:
+            assert AObject.list() == [self.FLABEL]
+        
+    def test_remove_many(self):
+        """remove_many() removes frames and updates the default frame"""
+        AObject = self.OBJECT()
+        AObject.save_many(("Frame%d" % i,self.image) for i in range(5))
+        remaining = AObject.remove_many(["Frame4","Frame3","Bogus"],clobber=True)
+        assert remaining == ["Frame0","Frame1","Frame2"]
+        assert AObject.framename == "Frame2"
+        
+    def test_map_frames(self):
+        """map_frames() applies a function to frames in parallel and saves the results"""
+        AObject = self.OBJECT()
+        AObject.save_many(("Frame%d" % i,self.image * i) for i in range(4))
+        sums = AObject.map_frames(lambda frame: frame().sum(),workers=2)
+        assert sums.keys() == AObject.list()
+        assert np.allclose(sums["Frame3"],self.image.sum() * 3)
+        AObject.map_frames(lambda frame: frame() + 1.0,framenames=["Frame1"],save=True)
+        assert self.data_eq_data(AObject.data("Frame1"),self.image + 1.0)
+        
+    def test_read_at_file_workers(self):
+        """readAtFile(workers=N) matches a sequential read"""
+        directory = tempfile.mkdtemp()
+        try:
+            atfile = os.path.join(directory,"files.txt")
+            with open(atfile,'w') as stream:
+                for i in range(6):
+                    filename = os.path.join(directory,"Image%d.fits" % i)
+                    pf.PrimaryHDU(self.image * i).writeto(filename)
+                    stream.write(filename + "\n")
+            AObject = self.OBJECT()
+            labels = AObject.readAtFile("@" + atfile)
+            BObject = self.OBJECT.fromAtFile(atfile,workers=3)
+            assert labels == ["Image%d.fits" % i for i in range(6)]
+            assert BObject.list() == labels
+            assert BObject.framename == AObject.framename
+            assert self.data_eq_data(BObject.data("Image4.fits"),self.image * 4)
+        finally:
+            shutil.rmtree(directory)
+        
+    def test_write_workers(self):
+        """write(workers=N) streams every frame to the file in order"""
+        AObject = self.OBJECT()
+        AObject.save_many(("Frame%d" % i,self.image * i) for i in range(7))
+        primary, frames, filename = AObject.write("TestFile.fits",clobber=True,workers=3)
+        assert primary == "Frame6"
+        HDUs = pf.open("TestFile.fits")
+        assert [HDU.header["label"] for HDU in HDUs] == [primary] + frames
+        BObject = self.OBJECT()
+        BObject.read("TestFile.fits")
+        for i in range(7):
+            assert self.data_eq_data(BObject.data("Frame%d" % i),self.image * i)
+        
+    @nt.raises(IOError)
+    def test_write_workers_does_not_clobber(self):
+        """write(workers=N) does not overwrite an existing file"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.write("TestFile.fits",clobber=True)
+        AObject.write("TestFile.fits",workers=2)
+        
+    def test_writer(self):
+        """writer() appends frames to a file as they are written"""
+        AObject = self.OBJECT()
+        with AObject.writer("TestFile.fits",clobber=True,fsync=True) as writer:
+            for i in range(3):
+                AObject.save(self.image * i,"Frame%d" % i)
+                writer.write()
+                AObject.remove("Frame%d" % i)
+                assert len(pf.open("TestFile.fits")) == i + 1
+        assert writer.closed
+        assert writer.frames == ["Frame0","Frame1","Frame2"]
+        BObject = self.OBJECT()
+        BObject.read("TestFile.fits")
+        assert sorted(BObject.list()) == writer.frames
+        assert self.data_eq_data(BObject.data("Frame2"),self.image * 2)
+        
+    def test_writer_buffers_other_files(self):
+        """writer() buffers frames for files which cannot append"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        with AObject.writer("TestFile.npy",clobber=True) as writer:
+            writer.write(self.FLABEL)
+            assert not os.path.exists("TestFile.npy")
+        assert self.data_eq_data(np.load("TestFile.npy"),self.image)
+        
+    def test_read_npy_memmap(self):
+        """read(memmap=True) memory-maps numpy files"""
+        np.save("TestFile.npy",self.image)
+        AObject = self.OBJECT()
+        AObject.read("TestFile.npy",memmap=True)
+        frame = AObject.frame()
+        assert frame.ismapped
+        assert self.data_eq_data(frame(),self.image)
+        frame()[0,0] = -1.0
+        assert np.load("TestFile.npy")[0,0] != -1.0
+        BObject = self.OBJECT()
+        BObject.read("TestFile.npy")
+        assert not BObject.frame().ismapped
+        
+    def test_read_npz_frames(self):
+        """read(frames=...) only decompresses the requested members of numpy zip files"""
+        np.savez("TestFile.npz",Valid=self.image,Double=self.image * 2.0)
+        AObject = self.OBJECT()
+        AObject.read("TestFile.npz",frames=["Double"])
+        assert AObject.list() == ["Double"]
+        assert self.data_eq_data(AObject.data("Double"),self.image * 2.0)
+        arrays = AstroObject.file.npy.NumpyZipFile("TestFile.npz").open_arrays(frames=["Double"])
+        assert [ label for label, data, header in arrays ] == ["Double"]
+        BObject = self.OBJECT()
+        BObject.read("TestFile.npz",section=(slice(10,20),))
+        assert self.data_eq_data(BObject.data("Valid"),self.image[10:20])
+        assert BObject.frame("Valid").header["LTV2"] == -10
+        
+    def test_write_arrays(self):
+        """write() exports frames directly to numpy and text files"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.frame().header.update("EXPTIME",30.0)
+        data, header = AObject.frame().__export__()
+        assert self.data_eq_data(data,self.image)
+        assert header["LABEL"] == self.FLABEL
+        assert header["EXPTIME"] == 30.0
+        assert "NAXIS" not in header
+        AObject.save(self.image * 2.0,"Double")
+        AObject.write("TestFile.npz",frames=[self.FLABEL,"Double"],clobber=True)
+        BObject = self.OBJECT()
+        BObject.read("TestFile.npz")
+        assert set(BObject.list()) == set([self.FLABEL,"Double"])
+        assert self.data_eq_data(BObject.data("Double"),self.image * 2.0)
+        AObject.write("TestFile.npy",frames=[self.FLABEL],clobber=True)
+        assert self.data_eq_data(np.load("TestFile.npy"),self.image)
+        
+    def test_text_files(self):
+        """write() and read() text files, keeping header cards"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.frame().header.update("EXPTIME",30.0)
+        AObject.frame().header.update("OBSERVER","O'Brien")
+        AObject.frame().header.update("FLAT",True)
+        AObject.write("TestFile.aotxt",clobber=True)
+        BObject = self.OBJECT()
+        BObject.read("TestFile.aotxt")
+        assert BObject.list() == [self.FLABEL]
+        assert self.data_eq_data(BObject.d,self.image)
+        assert BObject.frame().header["EXPTIME"] == 30.0
+        assert BObject.frame().header["OBSERVER"] == "O'Brien"
+        assert BObject.frame().header["FLAT"] is True
+        writer = AstroObject.file.plaintext.NumpyTextFile("TestFile.gz")
+        writer.write_arrays([(self.FLABEL,self.image,{})],clobber=True,workers=2)
+        assert self.data_eq_data(np.loadtxt("TestFile.gz").T,self.image)
+        CObject = self.OBJECT()
+        CObject.read("TestFile.gz")
+        assert self.data_eq_data(CObject.d,self.image)
+        AObject.write("TestFile.gz",clobber=True,workers=2)
+        CObject = self.OBJECT()
+        CObject.read("TestFile.gz")
+        assert self.data_eq_data(CObject.d,self.image)
+        
+    def test_write_read_async(self):
+        """write_async() writes a snapshot, and read_async() saves frames on result()"""
+        AObject = self.OBJECT()
+        AObject.save(self.image.copy(),self.FLABEL)
+        future = AObject.write_async("TestFile.fits",clobber=True)
+        AObject.frame()()[...] = -1
+        assert future.result() == (self.FLABEL,[],"TestFile.fits")
+        BObject = self.OBJECT()
+        future = BObject.read_async("TestFile.fits")
+        future.wait()
+        assert BObject.list() == []
+        assert future.result() == [self.FLABEL]
+        assert self.data_eq_data(BObject.d,self.image)
+        CObject = self.OBJECT()
+        CObject.read_async("TestFile.fits",framename="First")
+        CObject.read_async("TestFile.fits",framename="Second")
+        CObject.flush()
+        assert sorted(CObject.list()) == ["First","Second"]
+        
+    def test_write_async_dirty(self):
+        """write_async() marks written frames clean unless they changed, and every stack shares one I/O thread"""
+        AObject = self.OBJECT()
+        AObject.save(self.image.copy(),self.FLABEL)
+        AObject.save(self.image * 2.0,"Double")
+        future = AObject.write_async("TestFile.fits",clobber=True)
+        AObject.frame("Double").data = self.image * 3.0
+        future.result()
+        assert not AObject.frame(self.FLABEL).dirty
+        assert AObject.frame("Double").dirty
+        AObject.close()
+        BObject = self.OBJECT()
+        BObject.save(self.image.copy(),self.FLABEL)
+        threads = threading.active_count()
+        for i in range(5):
+            BObject.write_async("TestFile.fits",clobber=True)
+        BObject.close()
+        assert threading.active_count() == threads
+        assert not BObject.frame().dirty
+        BObject.write_async("TestFile.fits",clobber=True,incremental=True,workers=2).result()
+        assert len(BObject._written) == 1
+        
+    @nt.raises(IOError)
+    def test_write_async_errors(self):
+        """write_async() errors are raised by flush()"""
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.write("TestFile.fits",clobber=True)
+        AObject.write_async("TestFile.fits",clobber=False)
+        AObject.flush()
+        
+    def test_content_hash(self):
+        """content_hash is cached until the frame changes"""
+        AObject = self.OBJECT()
+        AObject.save(self.image.copy(),self.FLABEL)
+        frame = AObject.frame()
+        digest = frame.content_hash
+        assert frame.dirty
+        assert frame.content_hash == digest
+        frame.header.update("EXPTIME",30.0)
+        assert frame.content_hash != digest
+        digest = frame.content_hash
+        frame()[0,0] += 1
+        assert frame.content_hash != digest
+        digest = frame.content_hash
+        frame.__data__()[0,0] += 1
+        frame.touch()
+        assert frame.content_hash != digest
+        AObject.write("TestFile.fits",clobber=True)
+        assert not frame.dirty
+        frame.data = self.image.copy()
+        assert frame.dirty
+        
+    def test_write_incremental(self):
+        """write(incremental=True) appends only new frames to an unchanged file"""
+        AObject = self.OBJECT()
+        AObject.save(self.image.copy(),"First")
+        AObject.write("TestFile.fits",frames=["First"],primaryFrame="First",clobber=True,incremental=True)
+        state = os.stat("TestFile.fits").st_size
+        with open("TestFile.fits","rb") as stream:
+            primary = stream.read()
+        AObject.save(self.image * 2.0,"Second")
+        AObject.write("TestFile.fits",frames=["First","Second"],primaryFrame="First",clobber=True,incremental=True)
+        assert len(pf.open("TestFile.fits")) == 2
+        assert os.stat("TestFile.fits").st_size > state
+        with open("TestFile.fits","rb") as stream:
+            assert stream.read(state) == primary
+        stat = os.stat("TestFile.fits")
+        AObject.write("TestFile.fits",frames=["First","Second"],primaryFrame="First",clobber=True,incremental=True)
+        restat = os.stat("TestFile.fits")
+        assert (restat.st_ino,restat.st_mtime,restat.st_size) == (stat.st_ino,stat.st_mtime,stat.st_size)
+        assert len(pf.open("TestFile.fits")) == 2
+        AObject.frame("First").header.update("EXPTIME",30.0)
+        AObject.write("TestFile.fits",frames=["First","Second"],primaryFrame="First",clobber=True,incremental=True)
+        BObject = self.OBJECT()
+        BObject.read("TestFile.fits")
+        assert sorted(BObject.list()) == ["First","Second"]
+        assert BObject.frame("First").header["EXPTIME"] == 30.0
+        assert self.data_eq_data(BObject.data("Second"),self.image * 2.0)
+        
+    def test_write_incremental_in_place(self):
+        """write(incremental=True) rewrites frames changed in place through the frame"""
+        AObject = self.OBJECT()
+        AObject.save(self.image.copy(),"First")
+        AObject.save(self.image * 2.0,"Second")
+        AObject.write("TestFile.fits",frames=["First","Second"],primaryFrame="First",clobber=True,incremental=True)
+        AObject.frame("Second")()[0,0] = 99
+        assert AObject.frame("Second").dirty
+        AObject.write("TestFile.fits",frames=["First","Second"],primaryFrame="First",clobber=True,incremental=True)
+        BObject = self.OBJECT()
+        BObject.read("TestFile.fits")
+        assert BObject.data("Second")[0,0] == 99
+        
+    def test_iraf_inpfile_reuse(self):
+        """iraf.inpfile() reuses the file for an unchanged frame, without marking it written"""
+        import AstroObject.iraftools
+        AObject = self.OBJECT()
+        AObject.save(self.image.copy(),self.FLABEL)
+        tools = AstroObject.iraftools.IRAFTools(AObject)
+        try:
+            first = tools.inpfile(self.FLABEL)
+            assert AObject.frame().dirty
+            assert tools.inpfile(self.FLABEL) == first
+            AObject.frame().header.update("EXPTIME",30.0)
+            assert tools.inpfile(self.FLABEL) != first
+            tools.done()
+            assert os.path.exists(tools.inpfile(self.FLABEL))
+        finally:
+            tools.clear()
+            if tools.active and tools.set.open:
+                tools.set.close(check=False)
+        
+    def test_iraf_collect(self):
+        """iraf.done() collects modified and output files"""
+        import AstroObject.iraftools
+        AObject = self.OBJECT()
+        AObject.save(self.image.copy(),self.FLABEL)
+        tools = AstroObject.iraftools.IRAFTools(AObject)
+        try:
+            modname = tools.modfile(self.FLABEL,append="-mod")
+            assert modname != tools.inpfile(self.FLABEL)
+            HDUList = pf.open(modname,mode='update')
+            HDUList[0].data *= 2.0
+            HDUList.close()
+            outname = tools.outfile(self.FLABEL,append="-out")
+            pf.writeto(outname,self.image * 3.0)
+            tools.done()
+            assert self.data_eq_data(AObject[self.FLABEL + "-mod"](),self.image * 2.0)
+            assert self.data_eq_data(AObject[self.FLABEL + "-out"](),self.image * 3.0)
+        finally:
+            tools.clear()
+        
+    def test_iraf_release_outputs(self):
+        """iraf.done() deletes collected files once their frames stop using them"""
+        import AstroObject.iraftools
+        AObject = self.OBJECT()
+        AObject.save(self.image.copy(),self.FLABEL)
+        tools = AstroObject.iraftools.IRAFTools(AObject)
+        try:
+            for append in ("-a","-b"):
+                pf.writeto(tools.outfile(self.FLABEL,append=append),self.image)
+            tools.done()
+            collected = sorted(tools._outputs)
+            assert len(collected) == 2 and all(os.path.exists(filename) for filename in collected)
+            AObject.remove(self.FLABEL + "-a")
+            AObject.frame(self.FLABEL + "-b").materialize()
+            pf.writeto(tools.outfile(self.FLABEL,append="-c"),self.image)
+            tools.done()
+            assert not any(os.path.exists(filename) for filename in collected)
+            assert self.data_eq_data(AObject.data(self.FLABEL + "-b"),self.image)
+        finally:
+            tools.clear()
+        
+    def test_iraf_no_cycle(self):
+        """iraf tools do not keep their stack alive"""
+        import weakref
+        import AstroObject.iraftools
+        AObject = self.OBJECT()
+        tools = AstroObject.iraftools.IRAFTools(AObject)
+        tools.set_instance_methods()
+        ref = weakref.ref(AObject)
+        del AObject
+        assert ref() is None
+        assert tools.object is None
+        
+    def test_iraf_atlist_workers(self):
+        """iraf.inpatlist() stages frames with several workers"""
+        import AstroObject.iraftools
+        AObject = self.OBJECT()
+        for i in range(4):
+            AObject.save(self.image * i,"%s%d" % (self.FLABEL,i))
+        tools = AstroObject.iraftools.IRAFTools(AObject)
+        try:
+            with open(tools.inpatlist(workers=2).lstrip("@")) as stream:
+                parallel = stream.read()
+            with open(tools.inpatlist().lstrip("@")) as stream:
+                assert stream.read() == parallel
+            filenames = parallel.split()
+            assert len(filenames) == 4
+            BObject = self.OBJECT()
+            BObject.read(filenames[3])
+            assert self.data_eq_data(BObject.d,self.image * 3)
+        finally:
+            tools.clear()
+            tools.set.close(check=False)
+        
+    def test_iraf_atlist_in_place(self):
+        """iraf.inpatlist() restages frames changed in place through the frame"""
+        import AstroObject.iraftools
+        AObject = self.OBJECT()
+        for i in range(4):
+            AObject.save(self.image * i,"%s%d" % (self.FLABEL,i))
+        tools = AstroObject.iraftools.IRAFTools(AObject)
+        try:
+            with open(tools.inpatlist(workers=2).lstrip("@")) as stream:
+                first = stream.read().split()
+            AObject.frame("%s3" % self.FLABEL)()[0,0] = 99
+            with open(tools.inpatlist(workers=2).lstrip("@")) as stream:
+                second = stream.read().split()
+            assert second[:3] == first[:3]
+            assert second[3] != first[3]
+            assert pf.getdata(second[3])[0,0] == 99
+            assert all(AObject.frame(label).dirty for label in AObject.list())
+        finally:
+            tools.clear()
+            tools.set.close(check=False)
+        
+    def test_file_sniffing(self):
+        """read() recognizes files by extension, or by content"""
+        AObject = self.OBJECT()
+        assert AObject._setup_file("TestFile.FITS").__class__ is AstroObject.file.FITSFile
+        assert AObject._setup_file("TestFile.npz").__class__ is AstroObject.file.npy.NumpyZipFile
+        AObject.save(self.frame())
+        AObject.write("TestFile.fits",clobber=True)
+        shutil.copy("TestFile.fits","TestFile.dump")
+        BObject = self.OBJECT()
+        BObject.read("TestFile.dump")
+        assert self.data_eq_data(BObject.d,self.image)
+        np.save("TestFile.npy",self.image)
+        with open("TestFile.npy","rb") as stream:
+            assert AObject._setup_file(stream).__class__ is AstroObject.file.npy.NumpyFile
+            assert stream.tell() == 0
+        
+    def test_hdf5(self):
+        """write() and read() HDF5 files with headers, frame selection and sections"""
+        try:
+            import h5py
+        except ImportError:
+            raise SkipTest("h5py is not installed")
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.save(self.image * 2.0,"Double")
+        AObject.frame("Double").header.update("EXPTIME",30.0)
+        AObject.write("TestFile.h5",frames=[self.FLABEL,"Double"],clobber=True)
+        BObject = self.OBJECT()
+        BObject.read("TestFile.h5")
+        assert set(BObject.list()) == set([self.FLABEL,"Double"])
+        assert self.data_eq_data(BObject.data("Double"),self.image * 2.0)
+        assert BObject.frame("Double").header["EXPTIME"] == 30.0
+        CObject = self.OBJECT()
+        CObject.read("TestFile.h5",frames=["Double"],section=(slice(10,20),slice(5,25)))
+        assert CObject.list() == ["Double"]
+        assert self.data_eq_data(CObject.d,self.image[10:20,5:25] * 2.0)
+        assert CObject.frame().header["LTV2"] == -10
+        
+    def test_hdf5_node_order(self):
+        """read() HDF5 nodes in numeric order past HDU9999"""
+        try:
+            import h5py
+        except ImportError:
+            raise SkipTest("h5py is not installed")
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.save(self.image * 2.0,"Double")
+        AObject.write("TestFile.h5",frames=[self.FLABEL,"Double"],clobber=True)
+        BObject = self.OBJECT()
+        BObject.read("TestFile.h5")
+        with h5py.File("TestFile.h5","a") as stream:
+            stream.move("HDU0000","HDU9999")
+            stream.move("HDU0001","HDU10000")
+            assert list(stream.keys()) == ["HDU10000","HDU9999"]
+        CObject = self.OBJECT()
+        CObject.read("TestFile.h5")
+        assert CObject.list() == BObject.list()
+        
+    def test_share_attach(self):
+        """share() and attach() hand frames over through shared memory"""
+        import AstroObject.file.shm
+        AObject = self.OBJECT()
+        AObject.save(self.frame())
+        AObject.save(self.image * 2.0,"Double")
+        AObject.frame("Double").header.update("EXPTIME",30.0)
+        descriptor = AObject.share([self.FLABEL,"Double"])
+        try:
+            assert AObject._setup_file(descriptor).__class__ is AstroObject.file.shm.SharedMemoryFile
+            BObject = self.OBJECT()
+            BObject.attach(descriptor)
+            assert set(BObject.list()) == set([self.FLABEL,"Double"])
+            assert BObject.frame("Double").ismapped
+            assert self.data_eq_data(BObject.data("Double"),self.image * 2.0)
+            assert BObject.frame("Double").header["EXPTIME"] == 30.0
+            CObject = self.OBJECT()
+            CObject.read(descriptor,frames=["Double"],section=(slice(10,20),slice(5,25)))
+            assert self.data_eq_data(CObject.d,self.image[10:20,5:25] * 2.0)
+        finally:
+            AstroObject.file.shm.release(descriptor)
+        assert not os.path.exists(descriptor)
+        
+    def test_share_commentary_cards(self):
+        """Shared-memory files keep repeated COMMENT and HISTORY cards"""
+        import AstroObject.file.shm
+        HDU = pf.PrimaryHDU(self.image)
+        HDU.header.update("label",self.FLABEL)
+        for card in ("first","second"):
+            HDU.header.add_history(card)
+            HDU.header.add_comment("comment " + card)
+        descriptor = os.path.abspath("TestFile.shm")
+        AstroObject.file.shm.SharedMemoryFile(descriptor).write(pf.HDUList([HDU]),clobber=True)
+        try:
+            header = AstroObject.file.shm.SharedMemoryFile(descriptor).open()[0].header
+            assert [ str(card) for card in header["HISTORY"] ] == ["first","second"]
+            assert [ str(card) for card in header["COMMENT"] ] == ["comment first","comment second"]
+            BObject = self.OBJECT()
+            BObject.read(descriptor)
+            assert [ str(card) for card in BObject.frame().header["HISTORY"] ] == ["first","second"]
+        finally:
+            AstroObject.file.shm.release(descriptor)
+        
     @nt.raises(IOError)
     def test_read_from_nonexistant_file(self):
         """loadFromFile() fails for a non-existant image file"""
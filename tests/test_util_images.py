@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+#
+#  test_util_images.py
+#  AstroObject
+#
+#  Created by Alexander Rudy on 2012-05-08.
+#  Copyright 2012 Alexander Rudy. All rights reserved.
+#
+
+import os
+import tempfile
+
+import nose.tools as nt
+import numpy as np
+
+from AstroObject.util.images import bin, block_view
+
+class test_bin(object):
+    """util.images.bin"""
+
+    def setup(self):
+        """Set up a simple ramp image."""
+        self.image = np.arange(6 * 8, dtype=np.float).reshape((6,8))
+
+    def test_bin_sum(self):
+        """bin() sums every pixel in each block"""
+        binned = bin(self.image,2)
+        assert binned.shape == (3,4)
+        assert binned[0,0] == self.image[0:2,0:2].sum()
+        assert binned[2,3] == self.image[4:6,6:8].sum()
+        assert np.allclose(binned.sum(),self.image.sum())
+
+    def test_bin_xy_factors(self):
+        """bin() accepts separate x and y factors"""
+        binned = bin(self.image,3,4,func='mean')
+        assert binned.shape == (2,2)
+        assert np.allclose(binned[1,0],self.image[3:6,0:4].mean())
+        assert bin(self.image,factor=3,xfactor=4).shape == (2,2)
+
+    def test_bin_pad_mean_median(self):
+        """bin() takes the mean and median of partial bins over real pixels only"""
+        ones = np.ones((3,3))
+        assert np.allclose(bin(ones,2,remainder='pad',func='mean'),1.0)
+        assert np.allclose(bin(ones,2,remainder='pad',func='median'),1.0)
+        binned = bin(self.image[:5,:7],2,3,remainder='pad',func='mean',chunksize=1)
+        assert np.allclose(binned[2,2],self.image[4:5,6:7].mean())
+        assert np.allclose(binned[0,2],self.image[0:2,6:7].mean())
+        assert np.allclose(binned[2,1],self.image[4:5,3:6].mean())
+
+    def test_bin_median(self):
+        """bin() can use a median reducer"""
+        binned = bin(self.image,2,func='median')
+        assert np.allclose(binned[1,1],np.median(self.image[2:4,2:4]))
+
+    def test_bin_nd(self):
+        """bin() works on N-dimensional arrays"""
+        cube = np.ones((4,6,8))
+        binned = bin(cube,(2,3,4))
+        assert binned.shape == (2,2,2)
+        assert np.allclose(binned,24.0)
+
+    def test_bin_trim_and_pad(self):
+        """bin() trims or pads partial blocks"""
+        assert bin(self.image,4).shape == (1,2)
+        padded = bin(self.image,4,remainder='pad')
+        assert padded.shape == (2,2)
+        assert np.allclose(padded.sum(),self.image.sum())
+
+    @nt.raises(ValueError)
+    def test_bin_unknown_func(self):
+        """bin() rejects unknown reducers"""
+        bin(self.image,2,func='mode')
+
+    def test_bin_chunked(self):
+        """bin() in chunks matches a single pass"""
+        assert np.allclose(bin(self.image,2,chunksize=1),bin(self.image,2))
+
+    def test_bin_memmap(self):
+        """bin() works on memory-mapped arrays"""
+        fd, filename = tempfile.mkstemp(suffix='.npy')
+        os.close(fd)
+        try:
+            np.save(filename,self.image)
+            mapped = np.load(filename,mmap_mode='r')
+            assert np.allclose(bin(mapped,2),bin(self.image,2))
+            del mapped
+        finally:
+            os.remove(filename)
+
+    def test_bin_small_integers(self):
+        """bin() sums small integer types without overflow"""
+        image = np.ones((4,4),dtype=np.uint8) * 200
+        assert bin(image,2)[0,0] == 800
+        
+    def test_bin_pad_chunked(self):
+        """bin() pads partial bins when binning in chunks"""
+        image = np.arange(7 * 5, dtype=np.float).reshape((7,5))
+        padded = bin(image,2,remainder='pad')
+        assert padded.shape == (4,3)
+        assert np.allclose(bin(image,2,remainder='pad',chunksize=1),padded)
+        assert np.allclose(padded[3,2],image[6,4])
+        
+    def test_bin_pad_memmap(self):
+        """bin() pads memory-mapped arrays in chunks"""
+        image = np.arange(7 * 5, dtype=np.float).reshape((7,5))
+        fd, filename = tempfile.mkstemp(suffix='.npy')
+        os.close(fd)
+        try:
+            np.save(filename,image)
+            mapped = np.load(filename,mmap_mode='r')
+            assert np.allclose(bin(mapped,2,remainder='pad',chunksize=2),bin(image,2,remainder='pad'))
+            del mapped
+        finally:
+            os.remove(filename)
+        
+    def test_block_view_is_a_view(self):
+        """block_view() does not copy data"""
+        blocks = block_view(self.image,(2,2))
+        assert blocks.shape == (3,2,4,2)
+        assert np.may_share_memory(blocks,self.image)
+